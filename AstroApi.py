@@ -0,0 +1,549 @@
+"""Conversion of Astroneer saves without any prompt, for tools embedding the converter.
+
+Functions take explicit paths, selections and conflict policies, and return
+records of what was written. Nothing is displayed: progress is reported to
+``on_progress`` and messages only go to the log file.
+
+Example:
+    >>> saves = AstroApi.list_saves(microsoft_folder)
+    >>> result = AstroApi.export_to_steam(saves[0].path, [saves[0].index], steam_folder)
+    >>> result.exported[0].paths
+    ['.../SAVE$2020.06.14-17.40.07.savegame']
+"""
+
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+import utils
+from cogs import AstroLogging as Logger
+from cogs import AstroProfiler
+from cogs import AstroProgress
+from cogs import AstroVerify
+from cogs.AstroConflictPolicy import AstroConflictPolicy
+from cogs.AstroSave import AstroSave, XBOX_CHUNK_SIZE, get_xbox_chunk_count
+from cogs.AstroSaveContainer import AstroSaveContainer as Container
+from cogs.AstroSaveContainer import AstroSaveContainerWriter as ContainerWriter
+from cogs.AstroSaveContainer import encode_chunk_name
+
+MAX_SAVE_NAME_LENGTH = 30  # Same limit as AstroSave.rename
+MICROSOFT_PLATFORM = 'microsoft'
+STEAM_PLATFORM = 'steam'
+
+
+class SaveInfo:
+    """A save found by ``list_saves``."""
+
+    def __init__(self, name: str, platform: str, path: str, index: Optional[int],
+                 chunks_names: List[str], size: Optional[int]) -> None:
+        """Describe a save.
+
+        Args:
+            name: Full name of the save, e.g. ``SAVE$2020.06.14-17.40.07``.
+            platform: ``'microsoft'`` or ``'steam'``.
+            path: Container of a Microsoft save, file of a Steam save.
+            index: Position of a Microsoft save in its container, ``None``
+                for a Steam save.
+            chunks_names: Chunk files of a Microsoft save, empty for a Steam save.
+            size: Size of the save in bytes, ``None`` if a chunk is missing.
+        """
+        self.name = name
+        self.platform = platform
+        self.path = path
+        self.index = index
+        self.chunks_names = chunks_names
+        self.size = size
+
+
+class ExportTask:
+    """A save to export along with where to read it from."""
+
+    def __init__(self, save: AstroSave, source: str, replaced_save: AstroSave = None,
+                 renamed_from: str = None) -> None:
+        """Create an export task.
+
+        Args:
+            save: Save to export, possibly renamed to avoid a conflict.
+            source: Chunks folder of a Microsoft save, or path of a Steam save file.
+            replaced_save: Existing Microsoft save to remove once the
+                export succeeded (``overwrite`` policy).
+            renamed_from: Name of the save before it was renamed to avoid a
+                conflict (``rename`` policy).
+        """
+        self.save = save
+        self.source = source
+        self.replaced_save = replaced_save
+        self.renamed_from = renamed_from
+
+
+class ExportedSave:
+    """A save written by an export."""
+
+    def __init__(self, name: str, source: str, paths: List[str], size: int, duration: float,
+                 renamed_from: str = None) -> None:
+        """Describe an exported save.
+
+        Args:
+            name: Name of the save as written.
+            source: Chunks folder of a Microsoft save, or path of a Steam save file.
+            paths: Files written: the Steam save file, or the Microsoft chunk files.
+            size: Bytes converted.
+            duration: Seconds spent converting the save.
+            renamed_from: See ``ExportTask``.
+        """
+        self.name = name
+        self.source = source
+        self.paths = paths
+        self.size = size
+        self.duration = duration
+        self.renamed_from = renamed_from
+
+
+class ExportResult:
+    """Outcome of an export of several saves."""
+
+    def __init__(self) -> None:
+        self.exported: List[ExportedSave] = []
+        self.skipped: List[str] = []  # Names of the saves left out by the ``skip`` policy
+        self.failed: Dict[str, Exception] = {}  # Error of each save that could not be exported
+        self.container_path: Optional[str] = None  # Microsoft container updated, if any
+        self.duration = 0.0
+
+    @property
+    def size(self) -> int:
+        """Bytes converted by the exports that succeeded."""
+        return sum(exported.size for exported in self.exported)
+
+
+def list_saves(folder: str) -> List[SaveInfo]:
+    """List the saves of every container of a Microsoft save folder, or of a Steam save folder.
+
+    Args:
+        folder: Microsoft save folder (containers and chunks) or Steam save folder.
+
+    Returns:
+        List[SaveInfo]: Saves in the order of their containers, or of the
+        Steam save files.
+
+    Raises:
+        FileNotFoundError: If ``folder`` holds neither a container nor a Steam save.
+    """
+    try:
+        containers_names = Container.get_containers_list(folder)
+    except FileNotFoundError:
+        steamsaves_names = AstroSave.get_steamsaves_list(folder)
+        return [
+            SaveInfo(save.name, STEAM_PLATFORM, utils.join_paths(folder, file_name), None, [],
+                     os.path.getsize(utils.join_paths(folder, file_name)))
+            for file_name, save in zip(steamsaves_names, AstroSave.init_saves_list_from(steamsaves_names))
+        ]
+
+    saves = []
+    for container_name in containers_names:
+        container_path = utils.join_paths(folder, container_name)
+        container = Container(container_path)
+        for index, save in enumerate(container.iter_saves()):
+            chunks_sizes = container.get_chunks_sizes(index)
+            saves.append(SaveInfo(save.name, MICROSOFT_PLATFORM, container_path, index, list(save.chunks_names),
+                                  None if -1 in chunks_sizes else sum(chunks_sizes)))
+    return saves
+
+
+def export_to_steam(container_path: str, save_ids: Optional[Sequence[Union[int, str]]], dest: str,
+                    conflict_policy: AstroConflictPolicy = AstroConflictPolicy.SKIP,
+                    new_names: Dict[str, str] = None, jobs: int = 1,
+                    on_progress: Callable[[int], None] = None) -> ExportResult:
+    """Export saves of a Microsoft container to the Steam format.
+
+    Args:
+        container_path: Container of the saves, next to their chunks.
+        save_ids: Indexes in the container or full names of the saves to
+            export, ``None`` for all of them.
+        dest: Folder where the Steam save files are written, created if needed.
+        conflict_policy: What to do with saves already present in ``dest``.
+        new_names: New name (without the date) of some saves, by full name.
+        jobs: Number of saves exported concurrently.
+        on_progress: Called with the number of bytes of each step of the exports.
+
+    Returns:
+        ExportResult: Saves exported, skipped and failed.
+
+    Raises:
+        ValueError: If a save of ``save_ids`` is not in the container, or a
+            new name is not valid (see ``AstroSave.rename``).
+    """
+    container = Container(container_path)
+    saves = select_container_saves(container, save_ids)
+    rename_saves(saves, new_names)
+
+    utils.make_dir_if_doesnt_exists(dest)
+    from_path = os.path.dirname(container_path)
+    tasks, skipped = plan_steam_tasks([(save, from_path) for save in saves], dest, conflict_policy)
+
+    result = run_exports(tasks, partial(convert_to_steam, to_path=dest), jobs, on_progress)
+    result.skipped = [save.name for save in skipped]
+    return result
+
+
+def export_to_xbox(savegame_paths: Sequence[str], dest_folder: str,
+                   conflict_policy: AstroConflictPolicy = AstroConflictPolicy.SKIP,
+                   new_names: Dict[str, str] = None, jobs: int = 1,
+                   on_progress: Callable[[int], None] = None) -> ExportResult:
+    """Export Steam save files to a Microsoft save folder.
+
+    The container of ``dest_folder`` is rewritten once, with every save
+    exported successfully. Astroneer must not be running: callers wait for
+    it (see ``AstroQuiescence``) and back the folder up beforehand.
+
+    Args:
+        savegame_paths: Steam ``.savegame`` files to export.
+        dest_folder: Microsoft save folder, created if needed.
+        conflict_policy: What to do with saves already present in ``dest_folder``.
+        new_names: New name (without the date) of some saves, by full name.
+        jobs: Number of saves exported concurrently.
+        on_progress: Called with the number of bytes of each step of the exports.
+
+    Returns:
+        ExportResult: Saves exported, skipped and failed, and the path of
+        the container if it was updated.
+
+    Raises:
+        ValueError: If a new name is not valid (see ``AstroSave.rename``).
+    """
+    saves = AstroSave.init_saves_list_from([os.path.basename(path) for path in savegame_paths])
+    rename_saves(saves, new_names)
+
+    utils.make_dir_if_doesnt_exists(dest_folder)
+    tasks, skipped = plan_xbox_tasks(list(zip(saves, savegame_paths)), dest_folder, conflict_policy)
+
+    # Every save is added to the container with a single rewrite at the end
+    container_writer = ContainerWriter(dest_folder)
+    result = run_exports(tasks, partial(convert_to_xbox, to_path=dest_folder, container_writer=container_writer),
+                         jobs, on_progress)
+    result.skipped = [save.name for save in skipped]
+    if container_writer.has_changes():
+        result.container_path = container_writer.commit()
+    return result
+
+
+def select_container_saves(container: Container, save_ids: Optional[Sequence[Union[int, str]]]) -> List[AstroSave]:
+    """Return the saves of ``container`` designated by their index or full name, all of them if ``None``.
+
+    Raises:
+        ValueError: If a save is not in the container.
+    """
+    if save_ids is None:
+        return list(container.iter_saves())
+
+    saves_by_name = None
+    saves = []
+    for save_id in save_ids:
+        if isinstance(save_id, str):
+            if saves_by_name is None:
+                saves_by_name = {save.name: save for save in container.iter_saves()}
+            save = saves_by_name.get(save_id)
+        else:
+            try:
+                save = container.get_save(save_id) if save_id >= 0 else None
+            except IndexError:
+                save = None
+        if save is None:
+            raise ValueError(f'No save {save_id!r} in {container.full_path}')
+        if save not in saves:
+            saves.append(save)
+    return saves
+
+
+def rename_saves(saves: Iterable[AstroSave], new_names: Optional[Dict[str, str]]) -> None:
+    """Rename the saves listed in ``new_names`` (new name without the date, by full name)."""
+    if not new_names:
+        return
+    for save in saves:
+        new_name = new_names.get(save.name)
+        if new_name is not None:
+            save.rename(new_name)
+
+
+def plan_steam_tasks(saves: Iterable[Tuple[AstroSave, str]], to_path: str,
+                     conflict_policy: AstroConflictPolicy) -> Tuple[List[ExportTask], List[AstroSave]]:
+    """Resolve the conflicts of Microsoft saves with the Steam saves of ``to_path``.
+
+    Conflicts are resolved before any export starts so that concurrent
+    exports never target the same file.
+
+    Args:
+        saves: Each save along with the folder of its chunks.
+        to_path: Destination folder.
+        conflict_policy: What to do with saves already present in ``to_path``.
+
+    Returns:
+        tuple[list[ExportTask], list[AstroSave]]: Saves to export, and saves skipped.
+    """
+    taken_names = {file_name.lower() for file_name in utils.list_folder_content(to_path)}
+    planned_names: Set[str] = set()
+    tasks = []
+    skipped = []
+
+    for save, from_path in saves:
+        renamed_from = None
+        file_name = save.get_file_name().lower()
+        if file_name in taken_names or file_name in planned_names:
+            if conflict_policy == AstroConflictPolicy.SKIP or \
+                    (conflict_policy == AstroConflictPolicy.OVERWRITE and file_name in planned_names):
+                Logger.logPrint('%s: already exists in %s, skipped', 'debug', save.name, to_path)
+                skipped.append(save)
+                continue
+            if conflict_policy == AstroConflictPolicy.RENAME:
+                renamed_from = save.name
+                rename_to_free_name(save, lambda s: s.get_file_name().lower() in taken_names | planned_names)
+
+        planned_names.add(save.get_file_name().lower())
+        tasks.append(ExportTask(save, from_path, renamed_from=renamed_from))
+
+    return (tasks, skipped)
+
+
+def plan_xbox_tasks(saves: Iterable[Tuple[AstroSave, str]], to_path: str,
+                    conflict_policy: AstroConflictPolicy) -> Tuple[List[ExportTask], List[AstroSave]]:
+    """Resolve the conflicts of Steam saves with the Microsoft saves of ``to_path``.
+
+    Args:
+        saves: Each save along with the path of its Steam save file.
+        to_path: Destination Microsoft save folder.
+        conflict_policy: What to do with saves already present in ``to_path``.
+
+    Returns:
+        tuple[list[ExportTask], list[AstroSave]]: Saves to export, and saves skipped.
+    """
+    existing_saves = {}
+    try:
+        for container_name in Container.get_containers_list(to_path):
+            for save in Container(utils.join_paths(to_path, container_name)).iter_saves():
+                existing_saves[save.name] = save
+    except FileNotFoundError:
+        pass
+
+    planned_names: Set[str] = set()
+    tasks = []
+    skipped = []
+    for save, source in saves:
+        replaced_save = None
+        renamed_from = None
+
+        if save.name in existing_saves or save.name in planned_names:
+            if conflict_policy == AstroConflictPolicy.SKIP or \
+                    (conflict_policy == AstroConflictPolicy.OVERWRITE and save.name in planned_names):
+                Logger.logPrint('%s: already exists in %s, skipped', 'debug', save.name, to_path)
+                skipped.append(save)
+                continue
+            if conflict_policy == AstroConflictPolicy.RENAME:
+                renamed_from = save.name
+                rename_to_free_name(save, lambda s: s.name in existing_saves or s.name in planned_names)
+            else:
+                replaced_save = existing_saves[save.name]
+
+        planned_names.add(save.name)
+        tasks.append(ExportTask(save, source, replaced_save, renamed_from))
+
+    return (tasks, skipped)
+
+
+def rename_to_free_name(save: AstroSave, is_taken) -> None:
+    """Rename ``save`` by appending a number until ``is_taken(save)`` is False.
+
+    Characters not supported by ``AstroSave.rename`` are dropped from the name.
+    """
+    base_name = re.sub(r'[^a-zA-Z0-9]', '', save.name.split('$')[0]) or 'SAVE'
+    original_name = save.name
+    suffix = 1
+    while True:
+        suffix_text = str(suffix)
+        save.rename(base_name[:MAX_SAVE_NAME_LENGTH - len(suffix_text)] + suffix_text)
+        if not is_taken(save):
+            break
+        suffix += 1
+    Logger.logPrint('%s: already exists, renamed to %s', 'debug', original_name, save.name)
+
+
+def run_exports(tasks: List[ExportTask], convert: Callable, jobs: int = 1,
+                on_progress: Callable[[int], None] = None) -> ExportResult:
+    """Run ``convert`` on every task, ``jobs`` at a time.
+
+    A task that fails does not stop the others, its error is kept in
+    ``ExportResult.failed``.
+
+    Args:
+        tasks: Planned exports, see ``plan_steam_tasks`` and ``plan_xbox_tasks``.
+        convert: ``convert_to_steam`` or ``convert_to_xbox`` with their
+            destination bound.
+        jobs: Number of tasks run concurrently.
+        on_progress: Called with the number of bytes of each step of the exports.
+
+    Returns:
+        ExportResult: Saves exported and failed.
+    """
+    if on_progress is None:
+        # Without it the exports would draw their own progress bar
+        on_progress = _ignore_progress
+
+    result = ExportResult()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [(task, executor.submit(_timed_export, convert, task, on_progress)) for task in tasks]
+        for task, future in futures:
+            try:
+                result.exported.append(future.result())
+            except Exception as e:
+                Logger.logPrint('%s: export failed', 'exception', task.save.name)
+                result.failed[task.save.name] = e
+    result.duration = time.perf_counter() - start
+    return result
+
+
+def _timed_export(convert: Callable, task: ExportTask, on_progress: Callable[[int], None]) -> ExportedSave:
+    """Run ``convert`` on ``task`` and measure it."""
+    start = time.perf_counter()
+    paths, size = convert(task, on_progress=on_progress)
+    return ExportedSave(task.save.name, task.source, paths, size, time.perf_counter() - start, task.renamed_from)
+
+
+def _ignore_progress(_: int) -> None:
+    pass
+
+
+def export_save_to_steam(save: AstroSave, from_path: str, to_path: str,
+                         on_progress: Callable[[int], None] = None) -> str:
+    """Export a Microsoft/Xbox save to the Steam format.
+
+    Args:
+        save: ``AstroSave`` instance to export.
+        from_path: Directory where the chunk files are located.
+        to_path: Destination directory for the Steam save.
+        on_progress: Called with the number of bytes of each step of the
+            export. If omitted the progress of the save is displayed.
+
+    Returns:
+        str: Full path to the exported save file.
+
+    Raises:
+        ExportVerificationError: If verification is enabled (see
+            ``AstroVerify.configure_verification``) and the bytes written
+            differ from those read. The save file is left untouched.
+    """
+    target_full_path = utils.join_paths(to_path, save.get_file_name())
+    digests = None
+    if AstroVerify.is_verification_enabled():
+        file_digest = AstroVerify.AstroDigest()
+        digests = [AstroVerify.AstroDigest(file_digest) for _ in save.chunks_names]
+
+    if on_progress is not None:
+        save.convert_to_steam_file(from_path, target_full_path, on_progress, digests)
+    else:
+        save_size = sum(os.path.getsize(utils.join_paths(from_path, chunk_name))
+                        for chunk_name in save.chunks_names)
+        with AstroProgress.AstroProgress(save.name, save_size) as progress:
+            save.convert_to_steam_file(from_path, target_full_path, progress.advance, digests)
+
+    if digests is not None:
+        manifest_path = AstroVerify.write_manifest(
+            to_path, save.name, 'steam', list(zip(save.chunks_names, digests)), file_digest)
+        Logger.logPrint(f'{save.name}: export verified, manifest written to {manifest_path}', 'debug')
+    return target_full_path
+
+
+def export_save_to_xbox(save: AstroSave, from_file: str, to_path: str,
+                        container_writer: ContainerWriter = None,
+                        on_progress: Callable[[int], None] = None,
+                        chunk_size: int = XBOX_CHUNK_SIZE) -> str:
+    """Export a Steam save into multiple Xbox chunk files.
+
+    Chunks are streamed from the save file, so memory use does not depend
+    on the size of the save nor on its number of chunks.
+
+    Args:
+        save: ``AstroSave`` instance to convert.
+        from_file: Path to the Steam ``.savegame`` file.
+        to_path: Destination directory for the Xbox chunks.
+        container_writer: Collects the container changes of several exports
+            to commit them at once. If omitted the container is updated
+            right away.
+        on_progress: Called with the number of bytes of each step of the
+            export. If omitted the progress of the save is displayed.
+        chunk_size: Maximum size of a chunk file.
+
+    Returns:
+        str: Directory where the chunks and container are written.
+
+    Raises:
+        ValueError: If the name of the save is too long for its number of
+            chunks (see ``encode_chunk_name``). Nothing is written then.
+        OSError: If a chunk cannot be written. The chunks of the save already
+            written are deleted and the container is left untouched.
+        ExportVerificationError: If verification is enabled (see
+            ``AstroVerify.configure_verification``) and the bytes written to
+            a chunk differ from those read. Same as a chunk that cannot be written.
+    """
+    save_size = os.path.getsize(from_file)
+    chunk_count = get_xbox_chunk_count(save_size, chunk_size)
+    # The last chunk has the longest name, checked before writing anything
+    encode_chunk_name(save.name, chunk_count - 1, chunk_count)
+
+    utils.make_dir_if_doesnt_exists(to_path)
+    digests = None
+    if AstroVerify.is_verification_enabled():
+        digests = [AstroVerify.AstroDigest() for _ in range(chunk_count)]
+
+    # Chunks are all written, or none of them if one fails
+    if on_progress is not None:
+        chunk_uuids = save.write_xbox_chunks(from_file, to_path, chunk_size=chunk_size, on_progress=on_progress,
+                                             digests=digests)
+    else:
+        with AstroProgress.AstroProgress(save.name, save_size) as progress:
+            chunk_uuids = save.write_xbox_chunks(from_file, to_path, chunk_size=chunk_size,
+                                                 on_progress=progress.advance, digests=digests)
+
+    # Container is updated only after all the chunks of the save have been written successfully
+    with AstroProfiler.span('container_update'):
+        if container_writer is None:
+            container_writer = ContainerWriter(to_path)
+            container_writer.add_save(save.name, chunk_uuids)
+            container_writer.commit()
+        else:
+            container_writer.add_save(save.name, chunk_uuids)
+
+    if digests is not None:
+        manifest_path = AstroVerify.write_manifest(
+            to_path, save.name, 'microsoft', list(zip(save.chunks_names, digests)))
+        Logger.logPrint(f'{save.name}: export verified, manifest written to {manifest_path}', 'debug')
+    return to_path
+
+
+@AstroProfiler.timed('convert_to_steam', count_bytes=lambda written: written[1])
+def convert_to_steam(task: ExportTask, to_path: str, on_progress=None) -> Tuple[List[str], int]:
+    """Export a Microsoft save to ``to_path``.
+
+    Returns:
+        tuple[list[str], int]: Path of the Steam save file and its size.
+    """
+    export_path = export_save_to_steam(task.save, task.source, to_path, on_progress)
+    return ([export_path], os.path.getsize(export_path))
+
+
+@AstroProfiler.timed('convert_to_xbox', count_bytes=lambda written: written[1])
+def convert_to_xbox(task: ExportTask, to_path: str, container_writer: ContainerWriter,
+                    on_progress=None) -> Tuple[List[str], int]:
+    """Export a Steam save to ``to_path``.
+
+    The container changes are only collected in ``container_writer``.
+
+    Returns:
+        tuple[list[str], int]: Paths of the chunk files and size of the save.
+    """
+    export_save_to_xbox(task.save, task.source, to_path, container_writer, on_progress)
+    if task.replaced_save is not None:
+        container_writer.remove_save(task.replaced_save)
+    return ([utils.join_paths(to_path, chunk_name) for chunk_name in task.save.chunks_names],
+            os.path.getsize(task.source))
@@ -0,0 +1,175 @@
+"""Non-interactive conversion of every save found in a folder."""
+
+import os
+import time
+from functools import partial
+from typing import List, Tuple
+
+import utils
+import AstroApi
+from AstroApi import ExportTask
+from cogs import AstroBackup
+from cogs import AstroLogging as Logger
+from cogs import AstroProgress
+from cogs import AstroQuiescence
+from cogs.AstroConflictPolicy import AstroConflictPolicy
+from cogs.AstroConvType import AstroConvType
+from cogs.AstroSave import AstroSave
+from cogs.AstroSaveContainer import AstroSaveContainer as Container
+from cogs.AstroSaveContainer import AstroSaveContainerWriter as ContainerWriter
+
+MEGABYTE = 1024 * 1024
+
+
+def run_batch_conversion(conversion_type: AstroConvType, from_path: str, to_path: str,
+                         jobs: int, conflict_policy: AstroConflictPolicy, wait_mode: str = 'auto',
+                         quiet_period: float = AstroQuiescence.QUIET_PERIOD) -> Tuple[int, int]:
+    """Convert every save of ``from_path`` into ``to_path`` without prompting.
+
+    Args:
+        conversion_type: Conversion direction.
+        from_path: Microsoft save folder (containers and chunks) or Steam save folder.
+        to_path: Destination folder.
+        jobs: Number of saves converted concurrently.
+        conflict_policy: What to do with saves already present in ``to_path``.
+        wait_mode: How to wait for Astroneer to stop writing to ``to_path``
+            before a Steam to Microsoft conversion, see ``AstroQuiescence.wait_until_idle``.
+        quiet_period: Seconds without write required by the ``auto`` wait mode.
+
+    Returns:
+        tuple[int, int]: Number of saves converted and number of failures.
+    """
+    utils.make_dir_if_doesnt_exists(to_path)
+
+    if conversion_type == AstroConvType.WIN2STEAM:
+        tasks = plan_steam_export(from_path, to_path, conflict_policy)
+    else:
+        prepare_xbox_folder(to_path, wait_mode, quiet_period)
+        tasks = plan_xbox_export(from_path, to_path, conflict_policy)
+
+    result = convert_tasks(conversion_type, tasks, to_path, jobs)
+    failures = len(result.failed)
+    if failures:
+        Logger.logPrint(f'{failures} saves could not be converted, see the logs for details')
+
+    return (len(result.exported), failures)
+
+
+def convert_tasks(conversion_type: AstroConvType, tasks: List[ExportTask], to_path: str,
+                  jobs: int) -> AstroApi.ExportResult:
+    """Convert planned saves into ``to_path`` and log how each one went.
+
+    Args:
+        conversion_type: Conversion direction.
+        tasks: Saves to convert, see ``plan_steam_export`` and ``plan_xbox_export``.
+        to_path: Destination folder, prepared with ``prepare_xbox_folder``
+            for a Steam to Microsoft conversion.
+        jobs: Number of saves converted concurrently.
+
+    Returns:
+        AstroApi.ExportResult: Saves converted and failed, and the path of
+        the container if it was updated.
+    """
+    if conversion_type == AstroConvType.WIN2STEAM:
+        container_writer = None
+        convert = partial(AstroApi.convert_to_steam, to_path=to_path)
+    else:
+        # Every save is added to the container with a single rewrite at the end
+        container_writer = ContainerWriter(to_path)
+        convert = partial(AstroApi.convert_to_xbox, to_path=to_path, container_writer=container_writer)
+
+    Logger.logPrint(f'\n{len(tasks)} saves to convert with {jobs} workers')
+
+    start = time.perf_counter()
+    total_size = sum(get_task_size(task, conversion_type) for task in tasks)
+    with AstroProgress.AstroProgress('Converting', total_size) as progress:
+        result = AstroApi.run_exports(tasks, convert, jobs, progress.advance)
+
+    for exported in result.exported:
+        Logger.logPrint(f'{exported.name}: {exported.size / MEGABYTE:.1f} MB in {exported.duration:.2f}s')
+    for save_name, error in result.failed.items():
+        # The traceback is logged by run_exports
+        Logger.logPrint(f'{save_name}: conversion failed ({error})')
+
+    if container_writer is not None and container_writer.has_changes():
+        result.container_path = container_writer.commit()
+        Logger.logPrint(f'Container updated: {result.container_path}')
+    elapsed = time.perf_counter() - start
+
+    print_throughput_summary(len(result.exported), result.size, elapsed)
+    return result
+
+
+def get_task_size(task: ExportTask, conversion_type: AstroConvType) -> int:
+    """Return the number of bytes to convert for ``task``, ``0`` if unknown."""
+    try:
+        if conversion_type == AstroConvType.WIN2STEAM:
+            return sum(os.path.getsize(utils.join_paths(task.source, chunk_name))
+                       for chunk_name in task.save.chunks_names)
+        return os.path.getsize(task.source)
+    except OSError:
+        # The conversion of the task reports the error
+        return 0
+
+
+def print_throughput_summary(save_count: int, total_size: int, elapsed: float) -> None:
+    """Log the number of converted saves and the overall throughput."""
+    elapsed = max(elapsed, 1e-9)
+    Logger.logPrint(
+        f'\n{save_count} saves ({total_size / MEGABYTE:.1f} MB) converted in {elapsed:.2f}s: '
+        f'{save_count / elapsed:.2f} saves/s, {total_size / MEGABYTE / elapsed:.1f} MB/s')
+
+
+def plan_steam_export(from_path: str, to_path: str,
+                      conflict_policy: AstroConflictPolicy) -> List[ExportTask]:
+    """List the saves of every container of ``from_path`` and resolve conflicts.
+
+    Conflicts are resolved before any conversion starts so that concurrent
+    exports never target the same file.
+    """
+    saves = ((save, from_path)
+             for container_name in Container.get_containers_list(from_path)
+             for save in Container(utils.join_paths(from_path, container_name)).iter_saves())
+    tasks, skipped = AstroApi.plan_steam_tasks(saves, to_path, conflict_policy)
+    log_conflicts(tasks, skipped, to_path)
+    return tasks
+
+
+def plan_xbox_export(from_path: str, to_path: str,
+                     conflict_policy: AstroConflictPolicy) -> List[ExportTask]:
+    """List the Steam saves of ``from_path`` and resolve conflicts with ``to_path``."""
+    saves_files_names = AstroSave.get_steamsaves_list(from_path)
+    saves = zip(AstroSave.init_saves_list_from(saves_files_names),
+                [utils.join_paths(from_path, file_name) for file_name in saves_files_names])
+    tasks, skipped = AstroApi.plan_xbox_tasks(saves, to_path, conflict_policy)
+    log_conflicts(tasks, skipped, to_path)
+    return tasks
+
+
+def log_conflicts(tasks: List[ExportTask], skipped: List[AstroSave], to_path: str) -> None:
+    """Log the saves skipped or renamed because they already exist in ``to_path``."""
+    for save in skipped:
+        Logger.logPrint(f'{save.name}: already exists in {to_path}, skipped')
+    for task in tasks:
+        if task.renamed_from is not None:
+            Logger.logPrint(f'{task.renamed_from}: already exists, renamed to {task.save.name}')
+
+
+def prepare_xbox_folder(to_path: str, wait_mode: str = 'auto',
+                        quiet_period: float = AstroQuiescence.QUIET_PERIOD) -> None:
+    """Wait for Astroneer to stop writing to the Microsoft save folder ``to_path``, then back it up."""
+    Logger.logPrint('Astroneer needs to be closed longer than 20 seconds before we can start exporting your saves')
+    AstroQuiescence.wait_until_idle([to_path], wait_mode, quiet_period)
+    backup_xbox_folder(to_path)
+
+
+def backup_xbox_folder(to_path: str) -> None:
+    """Copy the Microsoft save folder ``to_path`` in the working directory before editing it."""
+    try:
+        Container.get_containers_list(to_path)
+    except FileNotFoundError:
+        return
+
+    backup_path = utils.join_paths(os.getcwd(), utils.create_folder_name('MicrosoftAstroneerSaveBackup'))
+    backup_path = AstroBackup.save_backup(to_path, backup_path)
+    Logger.logPrint(f'Save files copied to: {backup_path}')
@@ -1,10 +1,9 @@
 """Interactive workflow for selecting and converting Astroneer saves."""
 
 import os
-import glob
 import utils
-from io import BytesIO
-from typing import List
+from typing import List, Sequence
+from cogs import AstroBackup
 from cogs import AstroLogging as Logger
 from cogs import AstroMicrosoftSaveFolder
 from cogs import AstroSteamSaveFolder
@@ -12,6 +11,8 @@ from cogs.AstroSaveContainer import AstroSaveContainer as Container
 from cogs.AstroSave import AstroSave
 from cogs.AstroConvType import AstroConvType
 
+SAVES_PAGE_SIZE = 50  # Number of saves listed before asking to show more
+
 
 def ask_for_containers_to_convert(containers: List[str]) -> str:
     """Ask the user which container to convert.
@@ -118,7 +119,7 @@ def ask_for_save_folder(conversion_type: AstroConvType) -> str:
                         while True:
                             save_path = ask_copy_target('MicrosoftAstroneerSavesBackup', 'Microsoft')
                             try:
-                                utils.copy_files(astroneer_save_folder, save_path)
+                                AstroBackup.backup_folder(astroneer_save_folder, save_path)
                                 Logger.logPrint(f'Save files copied to: {save_path}')
                                 break
                             except (OSError, FileNotFoundError):
@@ -133,7 +134,7 @@ def ask_for_save_folder(conversion_type: AstroConvType) -> str:
                     while True:
                         save_path = ask_copy_target('SteamAstroSaveBackup', 'Steam')
                         try:
-                            utils.copy_files(astroneer_save_folder, save_path)
+                            AstroBackup.backup_folder(astroneer_save_folder, save_path)
                             Logger.logPrint(f'Save files copied to: {save_path}')
                             break
                         except (OSError, FileNotFoundError):
@@ -213,21 +214,30 @@ def ask_custom_folder_path() -> str:
         Logger.logPrint('\nWrong path for save folder, please enter a valid path : ', 'error')
 
 
-def print_save_from_container(save_list: List[AstroSave]) -> None:
+def print_save_from_container(save_list: Sequence[AstroSave]) -> None:
     """Display saves contained in a container.
 
+    Saves are listed by pages of ``SAVES_PAGE_SIZE``, the user can stop
+    listing after any page.
+
     Args:
-        save_list: List of ``AstroSave`` objects to print.
+        save_list: ``AstroSave`` objects to print, e.g. an ``AstroSaveContainer``.
     """
     for i, save in enumerate(save_list):
+        if i and i % SAVES_PAGE_SIZE == 0:
+            Logger.logPrint(f'Press ENTER to list more saves, or type "s" to stop listing')
+            choice = input().lower()
+            Logger.logPrint(f"User choice: {choice}", "debug")
+            if choice == 's':
+                break
         Logger.logPrint(f'\t {str(i+1)}) {save.name}')
 
 
-def ask_saves_to_export(save_list: List[AstroSave], platform_label: str) -> List[int]:
+def ask_saves_to_export(save_list: Sequence[AstroSave], platform_label: str) -> List[int]:
     """Prompt the user to select saves for export.
 
     Args:
-        save_list: List of available saves.
+        save_list: Available saves, e.g. an ``AstroSaveContainer``.
         platform_label: Label for the originating platform.
 
     Returns:
@@ -308,12 +318,12 @@ def verify_choices_input(choices: List[int], max_value: int) -> None:
             raise ValueError
 
 
-def ask_rename_saves(saves_indexes: List[int], save_list: List[AstroSave]) -> None:
+def ask_rename_saves(saves_indexes: List[int], save_list: Sequence[AstroSave]) -> None:
     """Guide the user through optional save renaming.
 
     Args:
         saves_indexes: Indexes of saves in ``save_list`` to consider.
-        save_list: Available saves.
+        save_list: Available saves, e.g. an ``AstroSaveContainer``.
     """
     do_rename = None
     while do_rename not in ('y', 'n'):
@@ -373,115 +383,6 @@ def ask_overwrite_if_file_exists(filename: str, target: str) -> bool:
     return True
 
 
-def export_save_to_steam(save: AstroSave, from_path: str, to_path: str) -> str:
-    """Export a Microsoft/Xbox save to the Steam format.
-
-    Args:
-        save: ``AstroSave`` instance to export.
-        from_path: Directory where the chunk files are located.
-        to_path: Destination directory for the Steam save.
-
-    Returns:
-        str: Full path to the exported save file.
-    """
-    target_full_path = utils.join_paths(to_path, save.get_file_name())
-    converted_save = save.convert_to_steam(from_path)
-    utils.write_buffer_to_file(target_full_path, converted_save)
-    return target_full_path
-
-
-def export_save_to_xbox(save: AstroSave, from_file: str, to_path: str) -> str:
-    """Export a Steam save into multiple Xbox chunk files.
-
-    Args:
-        save: ``AstroSave`` instance to convert.
-        from_file: Path to the Steam ``.savegame`` file.
-        to_path: Destination directory for the Xbox chunks.
-
-    Returns:
-        str: Directory where the chunks and container are written.
-
-    Raises:
-        FileExistsError: If generated chunk names already exist and cannot be
-            regenerated.
-    """
-    chunk_uuids, converted_chunks = save.convert_to_xbox(from_file)
-
-    chunk_count = len(chunk_uuids)
-
-    utils.make_dir_if_doesnt_exists(to_path)
-
-    if chunk_count >= 10:
-        Logger.logPrint(
-            f'The selected save contains {chunk_count} which is over the 9 chunks limit AstroSaveconverter can handle yet')
-        Logger.logPrint(f'Congrats for having such a huge save, please open an issue on the GitHub :D')
-
-    for i in range(chunk_count):
-
-        # The file name is the HEX upper form of the uuid
-        chunk_name = save.chunks_names[i]
-        Logger.logPrint(f'UUID as file name: {chunk_name}', "debug")
-
-        target_full_path = utils.join_paths(to_path, chunk_name)
-        Logger.logPrint(f'Chunk file written to: {target_full_path}', "debug")
-
-        # Regenerating chunk name if it already exists. Very, very unlikely
-        while utils.is_path_exists(target_full_path):
-            Logger.logPrint(f'UUID: {chunk_name} already exists ! (omg)', "debug")
-
-            chunk_uuids[i] = save.regenerate_uuid(i)
-            chunk_name = save.chunks_names[i]
-
-            Logger.logPrint(f'Regenerated UUID: {chunk_name}', "debug")
-            target_full_path = utils.join_paths(to_path, chunk_name)
-
-        # TODO [enhance] raise exception if can't write, catch it then delete all the chunks already written and exit
-        utils.write_buffer_to_file(target_full_path, converted_chunks[i])
-
-    # Container is updated only after all the chunks of the save have been written successfully
-    try:
-        container_file_name = Container.get_containers_list(to_path)[0]
-    except FileNotFoundError:
-        Container.create_empty_container(to_path)
-        container_file_name = 'container.1'
-
-    container_full_path = utils.join_paths(to_path, container_file_name)
-
-    with open(container_full_path, "r+b") as container:
-        container.read(4)
-
-        current_container_chunk_count = int.from_bytes(container.read(4), byteorder='little')
-
-        new_container_chunk_count = current_container_chunk_count + chunk_count
-
-        container.seek(-4, 1)
-        container.write(new_container_chunk_count.to_bytes(4, byteorder='little'))
-
-    chunks_buffer = BytesIO()
-    for i in range(chunk_count):
-
-        total_written_len = 0
-
-        encoded_save_name = save.name.encode('utf-16le', errors='ignore')
-        total_written_len += chunks_buffer.write(encoded_save_name)
-
-        if chunk_count > 1:
-            # Multi-chunks save. Adding metadata, format: '$${i}${chunk_count}$1'
-            chunk_metadata = f'$${i}${chunk_count}$1'
-
-            encoded_metadata = chunk_metadata.encode('utf-16le', errors='ignore')
-            total_written_len += chunks_buffer.write(encoded_metadata)
-
-        chunks_buffer.write(b"\00" * (144 - total_written_len))
-
-        chunks_buffer.write(chunk_uuids[i].bytes_le)
-
-    Logger.logPrint(f'Editing container: {container_full_path}', "debug")
-    utils.append_buffer_to_file(container_full_path, chunks_buffer)
-
-    return to_path
-
-
 def ask_overwrite_save_while_file_exists(save: AstroSave, target: str) -> None:
     """Prompt to overwrite a save file, renaming if necessary.
 
@@ -565,16 +466,12 @@ def ask_microsoft_target_folder() -> str:
     Raises:
         FileNotFoundError: If no Microsoft save folders are found.
     """
-    save_folders: List[str] = []
-    try:
-        target = os.environ['LOCALAPPDATA'] + '\\Packages\\SystemEraSoftworks*\\SystemAppData\\wgs'
-    except KeyError:
+    if 'LOCALAPPDATA' not in os.environ:
         Logger.logPrint("Local Appdata are missing, maybe you're on linux ?")
         Logger.logPrint("Press any key to exit")
         utils.wait_and_exit(1)
 
-    for path in glob.iglob(target):
-        save_folders.extend(AstroMicrosoftSaveFolder.get_save_folders_from_path(path))
+    save_folders = AstroMicrosoftSaveFolder.get_save_folders_from_paths(AstroMicrosoftSaveFolder.get_wgs_folders())
 
     if not save_folders:
         raise FileNotFoundError
@@ -589,8 +486,8 @@ def ask_microsoft_target_folder() -> str:
         Logger.logPrint('\tFolder content:')
         details = AstroMicrosoftSaveFolder.get_save_details(folder)
         if details:
-            for name, date in details:
-                Logger.logPrint(f"\t\t{name} - {date}")
+            for save_details in details:
+                Logger.logPrint(f"\t\t{save_details.name} - {save_details.date_string}")
         else:
             Logger.logPrint("\t\t<vide>")
 
@@ -0,0 +1,193 @@
+"""Conversion of the saves of a folder each time they change (watch mode)."""
+
+import os
+import threading
+from typing import List, Tuple
+
+import utils
+import AstroApi
+import AstroBatchScenario
+from cogs import AstroFolderWatcher
+from cogs import AstroLogging as Logger
+from cogs import AstroMicrosoftSaveFolder
+from cogs import AstroQuiescence
+from cogs.AstroConflictPolicy import AstroConflictPolicy
+from cogs.AstroConvType import AstroConvType
+from cogs.AstroSave import AstroSave
+from cogs.AstroSaveContainer import AstroSaveContainer as Container
+
+STOP_CHECK_PERIOD = 1  # Seconds between two checks of the stop event of ``AstroSaveWatcher.run``
+
+
+class AstroSaveWatcher:
+    """Converts the saves of a folder that are new or changed since they were last converted.
+
+    A Microsoft save changes when Astroneer writes it to new chunks, a
+    Steam save when the size or date of its file changes. A save converted
+    before is converted again under the same name, replacing its previous
+    conversion, while new saves follow the conflict policy.
+    """
+
+    def __init__(self, conversion_type: AstroConvType, from_path: str, to_path: str, jobs: int = 1,
+                 conflict_policy: AstroConflictPolicy = AstroConflictPolicy.SKIP, wait_mode: str = 'auto',
+                 quiet_period: float = AstroQuiescence.QUIET_PERIOD) -> None:
+        """Prepare the watch of ``from_path``, nothing is converted yet.
+
+        Args:
+            conversion_type: Conversion direction.
+            from_path: Steam save folder, or Microsoft save folder (or a
+                ``wgs`` folder holding several of them).
+            to_path: Destination folder.
+            jobs: Number of saves converted concurrently.
+            conflict_policy: What to do with new saves already present in ``to_path``.
+            wait_mode: How to wait for Astroneer to stop writing to ``to_path``
+                before a Steam to Microsoft conversion, see ``AstroQuiescence.wait_until_idle``.
+            quiet_period: Seconds without write required by the ``auto`` wait mode.
+        """
+        self.conversion_type = conversion_type
+        self.from_path = from_path
+        self.to_path = to_path
+        self.jobs = jobs
+        self.conflict_policy = conflict_policy
+        self.wait_mode = wait_mode
+        self.quiet_period = quiet_period
+        # Version of each save when it was last converted or skipped, and
+        # name of its conversion, by (source, save name)
+        self._versions = {}
+        self._exported_names = {}
+
+    def run(self, debounce: float = AstroFolderWatcher.WATCH_DEBOUNCE, backend: str = 'auto',
+            poll_period: float = AstroFolderWatcher.POLL_PERIOD, stop_event: threading.Event = None) -> None:
+        """Convert every save, then the saves that change, until interrupted.
+
+        Args:
+            debounce: Seconds without change in ``from_path`` to wait for
+                before converting, so that saves being written are not read.
+            backend: How to watch ``from_path``, see ``AstroFolderWatcher.create_watcher``.
+            poll_period: Seconds between two listings of the polling backend.
+            stop_event: Stops the watch once set, otherwise it runs until
+                ``KeyboardInterrupt``.
+        """
+        watcher = AstroFolderWatcher.create_watcher([self.from_path], backend, poll_period)
+        # Without stop event, the watcher sleeps until something changes
+        timeout = None if stop_event is None else STOP_CHECK_PERIOD
+        try:
+            self._convert_changes_logging_errors()
+            Logger.logPrint(f'\nWatching {self.from_path}, press Ctrl+C to stop')
+            while stop_event is None or not stop_event.is_set():
+                if not watcher.wait_for_change(timeout):
+                    continue
+                while watcher.wait_for_change(debounce):
+                    Logger.logPrint('%s still changing, conversion delayed', 'debug', self.from_path)
+                self._convert_changes_logging_errors()
+        except KeyboardInterrupt:
+            Logger.logPrint('\nWatch stopped')
+        finally:
+            watcher.close()
+
+    def _convert_changes_logging_errors(self) -> None:
+        """Run ``convert_changes``, an error is logged and the watch goes on."""
+        try:
+            self.convert_changes()
+        except Exception as e:
+            Logger.logPrint(f'Conversion of the changes of {self.from_path} failed: {e}')
+            Logger.logPrint('', 'exception')
+
+    def convert_changes(self) -> AstroApi.ExportResult:
+        """Convert the saves new or changed since the previous call.
+
+        Saves that could not be converted are tried again on the next call.
+
+        Returns:
+            AstroApi.ExportResult: Saves converted and failed, ``None`` if
+            no save changed.
+        """
+        changed_saves = [(save, source, version) for save, source, version in self.list_saves()
+                         if self._versions.get((source, save.name)) != version]
+        if not changed_saves:
+            Logger.logPrint('No save changed in %s', 'debug', self.from_path)
+            return None
+
+        Logger.logPrint(f'\n{len(changed_saves)} new or changed saves in {self.from_path}')
+        utils.make_dir_if_doesnt_exists(self.to_path)
+        if self.conversion_type == AstroConvType.STEAM2WIN:
+            AstroBatchScenario.prepare_xbox_folder(self.to_path, self.wait_mode, self.quiet_period)
+
+        # Key and version of each save, kept before the saves are renamed
+        saves_keys = {save: (source, save.name) for save, source, _ in changed_saves}
+        versions = {saves_keys[save]: version for save, _, version in changed_saves}
+        updated_saves = []
+        new_saves = []
+        for save, source, _ in changed_saves:
+            exported_name = self._exported_names.get(saves_keys[save])
+            if exported_name is None:
+                new_saves.append((save, source))
+                continue
+            if exported_name != save.name:
+                save.rename(exported_name.split('$')[0])
+            updated_saves.append((save, source))
+
+        plan = AstroApi.plan_steam_tasks if self.conversion_type == AstroConvType.WIN2STEAM \
+            else AstroApi.plan_xbox_tasks
+        tasks, skipped = plan(updated_saves, self.to_path, AstroConflictPolicy.OVERWRITE)
+        new_tasks, new_skipped = plan(new_saves, self.to_path, self.conflict_policy)
+        AstroBatchScenario.log_conflicts(new_tasks, new_skipped, self.to_path)
+
+        tasks += new_tasks
+        result = AstroBatchScenario.convert_tasks(self.conversion_type, tasks, self.to_path, self.jobs)
+
+        exported_names = {exported.name for exported in result.exported}
+        for save in [task.save for task in tasks if task.save.name in exported_names] + skipped + new_skipped:
+            save_key = saves_keys[save]
+            self._versions[save_key] = versions[save_key]
+            self._exported_names[save_key] = save.name
+        if result.failed:
+            Logger.logPrint(f'{len(result.failed)} saves could not be converted, they will be converted '
+                            f'again on their next change')
+        return result
+
+    def list_saves(self) -> List[Tuple[AstroSave, str, object]]:
+        """List the saves of ``from_path``.
+
+        Returns:
+            list[tuple[AstroSave, str, object]]: Each save, where to read
+            it from (chunks folder or Steam save file), and its version.
+        """
+        if self.conversion_type == AstroConvType.WIN2STEAM:
+            return self._list_microsoft_saves()
+        return self._list_steam_saves()
+
+    def _list_microsoft_saves(self) -> List[Tuple[AstroSave, str, bytes]]:
+        """List the saves of every container, versioned by the GUIDs of their chunks."""
+        saves = []
+        for folder in AstroMicrosoftSaveFolder.get_save_folders_from_path(self.from_path):
+            try:
+                containers_names = Container.get_containers_list(folder)
+            except FileNotFoundError:
+                continue
+            for container_name in containers_names:
+                container_path = utils.join_paths(folder, container_name)
+                try:
+                    saves.extend((save, folder, save.chunks_guids)
+                                 for save in Container(container_path).iter_saves())
+                except Exception as e:
+                    # Being written, it is read again on its next change
+                    Logger.logPrint('Cannot read the saves of %s: %s', 'debug', container_path, e)
+        return saves
+
+    def _list_steam_saves(self) -> List[Tuple[AstroSave, str, Tuple[int, int]]]:
+        """List the Steam saves, versioned by the size and date of their file."""
+        try:
+            files_names = AstroSave.get_steamsaves_list(self.from_path)
+        except FileNotFoundError:
+            return []
+
+        saves = []
+        for file_name, save in zip(files_names, AstroSave.init_saves_list_from(files_names)):
+            save_path = utils.join_paths(self.from_path, file_name)
+            try:
+                save_stat = os.stat(save_path)
+            except OSError:
+                continue
+            saves.append((save, save_path, (save_stat.st_size, save_stat.st_mtime_ns)))
+        return saves
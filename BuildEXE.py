@@ -1,12 +1,22 @@
 """Helper script to build the standalone executable using PyInstaller."""
 
-import PyInstaller.__main__
+import argparse
 import os
 import shutil
 
+import PyInstaller.__main__
+
+parser = argparse.ArgumentParser(description="Build the standalone executable")
+parser.add_argument(
+    "--onedir",
+    action="store_true",
+    help="Build a folder instead of a single file, which starts faster as nothing is unpacked at launch",
+)
+build_args = parser.parse_args()
+
 args = [
     '--name=AstroSaveConverter',
-    '--onefile',
+    '--onedir' if build_args.onedir else '--onefile',
     '--clean',
     '--noconfirm',
     '--add-data=assets/*;.',
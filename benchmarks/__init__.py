@@ -0,0 +1,5 @@
+"""Performance benchmarks for AstroSaveConverter.
+
+Each module can be run from the project root, e.g.
+``python -m benchmarks.bench_container_parser``.
+"""
@@ -0,0 +1,134 @@
+"""Compare the container parser with the former record-by-record parser."""
+
+import os
+import re
+import sys
+import tempfile
+import time
+import uuid
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cogs import AstroLogging as Logger
+from cogs.AstroSave import AstroSave
+from cogs.AstroSaveContainer import AstroSaveContainer as Container, CHUNK_METADATA_SIZE, build_chunks_metadata
+
+
+def write_container(path: str, record_count: int, chunks_per_save: int = 3) -> None:
+    """Write a container of ``record_count`` chunks grouped in multi-chunk saves."""
+    with open(path, 'wb') as container:
+        container.write(b'\x04\x00\x00\x00' + record_count.to_bytes(4, byteorder='little'))
+        for save_index, first_chunk in enumerate(range(0, record_count, chunks_per_save)):
+            chunk_count = min(chunks_per_save, record_count - first_chunk)
+            container.write(build_chunks_metadata(f'SAVE{save_index}$2021.01.01-00.00.00',
+                                                  [uuid.uuid4() for _ in range(chunk_count)]))
+
+
+def extract_name_from_chunk(chunk: bytes) -> str:
+    """Extract the save name stored in a chunk record, with a regular expression."""
+    # Reading the whole UTF-16 string in the chunk
+    utf_16_encoded_text = chunk[0:CHUNK_METADATA_SIZE - 32].decode('utf-16le', errors='ignore')
+
+    # The seperator is either '$$' in case of multi-chunk save
+    # or '\x00' if only one chunk
+    return re.split('[$]{2}|[\\x00]', utf_16_encoded_text)[0]
+
+
+def extract_chunk_file_name_from_chunk(chunk: bytes) -> str:
+    """Extract the file name of a chunk from its record, one character at a time."""
+    i = CHUNK_METADATA_SIZE - 16
+
+    (partial_name, i) = chunk_grab_bytes_to_string(chunk, i, 4)
+    chunk_file_name = convert_chunk_name_to_file_name(partial_name)
+
+    (partial_name, i) = chunk_grab_bytes_to_string(chunk, i, 2)
+    chunk_file_name += convert_chunk_name_to_file_name(partial_name)
+
+    (partial_name, i) = chunk_grab_bytes_to_string(chunk, i, 2)
+    chunk_file_name += convert_chunk_name_to_file_name(partial_name)
+
+    (partial_name, i) = chunk_grab_bytes_to_string(chunk, i, 8)
+    chunk_file_name += string_to_hex(partial_name)
+
+    return chunk_file_name
+
+
+def chunk_grab_bytes_to_string(chunk: bytes, index: int, n: int):
+    """Read ``n`` bytes of ``chunk`` from ``index`` as a string, return it with the next index."""
+    extracted_string = ''
+    for _ in range(n):
+        extracted_string += chr(chunk[index])
+        index += 1
+
+    return (extracted_string, index)
+
+
+def convert_chunk_name_to_file_name(string: str) -> str:
+    """Convert a little-endian GUID field to its part of the chunk file name."""
+    return string_to_hex(string[::-1])
+
+
+def string_to_hex(string: str) -> str:
+    """Convert ``string`` to uppercase hexadecimal using Latin-1 encoding."""
+    return string.encode('latin1').hex().upper()
+
+
+def legacy_parse(container_file_path: str) -> list:
+    """Parse a container the way ``AstroSaveContainer`` did before mmap/struct."""
+    save_list = []
+    with open(container_file_path, 'rb') as container:
+        container.read(4)
+        chunk_count = int.from_bytes(container.read(4), byteorder='little')
+        current_save_name = None
+        for _ in range(chunk_count):
+            current_chunk = container.read(CHUNK_METADATA_SIZE)
+            current_chunk_name = extract_name_from_chunk(current_chunk)
+            if current_chunk_name != current_save_name:
+                if current_save_name is not None:
+                    save_list.append(AstroSave(current_save_name, current_chunks_names))
+                current_chunks_names = []
+                current_save_name = current_chunk_name
+            current_chunks_names.append(extract_chunk_file_name_from_chunk(current_chunk))
+        save_list.append(AstroSave(current_save_name, current_chunks_names))
+    return save_list
+
+
+def best_time(function, repeat: int) -> float:
+    """Return the best wall-clock time of ``repeat`` calls to ``function``."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--records', type=int, default=12000, help='Number of chunk records')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per parser, best is kept')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        container_path = os.path.join(folder, 'container.1')
+        write_container(container_path, args.records)
+
+        # Both parsers log each save, keep the comparison about parsing
+        Logger.logPrint = lambda *_args, **_kwargs: None
+
+        legacy_saves = legacy_parse(container_path)
+        saves = Container(container_path).save_list
+        assert [(s.name, s.chunks_names) for s in saves] == \
+            [(s.name, s.chunks_names) for s in legacy_saves]
+
+        legacy_time = best_time(lambda: legacy_parse(container_path), args.repeat)
+        new_time = best_time(lambda: Container(container_path).save_list, args.repeat)
+
+    print(f'{args.records} records, {len(saves)} saves')
+    print(f'legacy parser: {legacy_time * 1000:8.2f} ms')
+    print(f'mmap parser:   {new_time * 1000:8.2f} ms')
+    print(f'speedup:       {legacy_time / new_time:8.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Compare the parallel copy engine of ``utils.copy_files`` with ``shutil.copytree``.
+
+The default folder holds many small chunks, like the backup of a Microsoft
+save folder. Parallel copies only pay off with several cores or storage
+with a high latency per file (network shares, hard drives), and reflinks
+only on filesystems sharing data between files (btrfs, XFS). On a single
+core with a local SSD the engine is not faster than ``shutil.copytree``,
+the single worker run tells the thread overhead from the copy itself.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import uuid
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import utils
+from benchmarks.bench_container_parser import best_time
+
+KILOBYTE = 1024
+
+
+def write_save_folder(path: str, chunk_count: int, chunk_size: int) -> None:
+    """Write a Microsoft save folder of ``chunk_count`` random chunk files."""
+    os.makedirs(path)
+    with open(os.path.join(path, 'container.1'), 'wb') as container:
+        container.write(b'\x04\x00\x00\x00' + chunk_count.to_bytes(4, byteorder='little'))
+        container.write(os.urandom(chunk_count * 160))
+    for _ in range(chunk_count):
+        with open(os.path.join(path, uuid.uuid4().hex.upper()), 'wb') as chunk:
+            chunk.write(os.urandom(chunk_size))
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--chunks', type=int, default=400, help='Number of chunk files')
+    parser.add_argument('--chunk-size', type=int, default=64, help='Size of a chunk file in KB')
+    parser.add_argument('--workers', type=int, default=utils.COPY_WORKERS, help='Files copied at the same time')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per method, best is kept')
+    parser.add_argument('--dir', help='Folder to work in (defaults to a temporary folder)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as folder:
+        source = os.path.join(folder, 'source')
+        target = os.path.join(folder, 'target')
+        write_save_folder(source, args.chunks, args.chunk_size * KILOBYTE)
+        total_size = args.chunks * args.chunk_size * KILOBYTE
+
+        def copytree():
+            if os.path.isdir(target):
+                shutil.rmtree(target)
+            shutil.copytree(source, target)
+
+        methods = utils.copy_files(source, target, args.workers)
+        copytree_time = best_time(copytree, args.repeat)
+        engine_time = best_time(lambda: utils.copy_files(source, target, args.workers), args.repeat)
+        single_worker_time = best_time(lambda: utils.copy_files(source, target, 1), args.repeat)
+
+    methods_count = {}
+    for method in methods.values():
+        methods_count[method] = methods_count.get(method, 0) + 1
+
+    print(f'{args.chunks} chunks of {args.chunk_size} KB ({total_size / KILOBYTE / KILOBYTE:.0f} MB)')
+    print(f'copy methods:      {methods_count}')
+    print(f'shutil.copytree:   {copytree_time * 1000:8.2f} ms')
+    print(f'utils.copy_files:  {engine_time * 1000:8.2f} ms ({args.workers} workers)')
+    print(f'utils.copy_files:  {single_worker_time * 1000:8.2f} ms (1 worker)')
+    print(f'speedup:           {copytree_time / engine_time:8.2f}x')
+    if engine_time >= copytree_time:
+        print(f'no speedup with {os.cpu_count()} CPU and these copy methods, see the module docstring')
+
+
+if __name__ == '__main__':
+    main()
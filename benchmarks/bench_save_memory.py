@@ -0,0 +1,55 @@
+"""Measure the memory taken by the saves of a parsed container."""
+
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.bench_container_parser import write_container
+from cogs import AstroLogging as Logger
+from cogs.AstroSaveContainer import AstroSaveContainer as Container
+
+
+def measure_saves_memory(container_path: str) -> tuple:
+    """Return the saves of a container and the bytes still allocated once they are decoded.
+
+    Only the memory kept after the parsing is counted, by the saves and by
+    the index of the container.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        container = Container(container_path)
+        saves = container.save_list
+        gc.collect()
+        allocated, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return saves, allocated
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--saves', type=int, default=2000, help='Number of saves')
+    parser.add_argument('--chunks', type=int, default=3, help='Chunks per save')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        container_path = os.path.join(folder, 'container.1')
+        write_container(container_path, args.saves * args.chunks, args.chunks)
+
+        # Logged arguments would be kept by tracemalloc until printed
+        Logger.logPrint = lambda *_args, **_kwargs: None
+
+        saves, allocated = measure_saves_memory(container_path)
+
+    print(f'{len(saves)} saves of {args.chunks} chunks')
+    print(f'total:    {allocated / 1024:10.1f} KB')
+    print(f'per save: {allocated / len(saves):10.1f} bytes')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""Time the main operations of the converter on generated save folders.
+
+Container parsing, save folder discovery, save details listing, Microsoft
+to Steam and Steam to Microsoft conversions and backups are timed on each
+size tier. Results are written as JSON so that two versions can be compared
+with ``--compare``, e.g.::
+
+    python -m benchmarks.bench_suite --output before.json
+    python -m benchmarks.bench_suite --output after.json --compare before.json
+"""
+
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import AstroApi
+from benchmarks import generator
+from cogs import AstroBackup
+from cogs import AstroContainerCache
+from cogs import AstroLogging as Logger
+from cogs import AstroMicrosoftSaveFolder
+from cogs import AstroProgress
+from cogs.AstroSave import AstroSave, XBOX_CHUNK_SIZE
+from cogs.AstroSaveContainer import AstroSaveContainer as Container
+from cogs.AstroSaveContainer import AstroSaveContainerWriter as ContainerWriter
+
+MEGABYTE = 1024 * 1024
+RESULTS_VERSION = 1
+# Saves of each tier, the largest ones span many chunks of XBOX_CHUNK_SIZE
+TIERS = {
+    'small': {'saves': 8, 'save_size': 512 * 1024, 'containers': 1},
+    'medium': {'saves': 16, 'save_size': 40 * MEGABYTE, 'containers': 2},
+    'large': {'saves': 4, 'save_size': 256 * MEGABYTE, 'containers': 1},
+    'huge': {'saves': 1, 'save_size': 1024 * MEGABYTE, 'containers': 1},
+    'fifty_chunks': {'saves': 2, 'save_size': 50 * XBOX_CHUNK_SIZE, 'containers': 1},
+}
+DEFAULT_TIERS = ('small', 'medium')
+DISCOVERY_USERS = 4  # User folders in the generated wgs folder
+DISCOVERY_FOLDERS = 8  # Save folders per user
+REGRESSION_THRESHOLD = 1.10  # Slowdown reported by --compare
+
+
+def measure(run, repeat: int, setup=None, processed_bytes: int = 0) -> dict:
+    """Time ``repeat`` calls to ``run``, each preceded by an untimed ``setup``.
+
+    Returns:
+        dict: ``best``, ``median`` and ``mean`` seconds, the ``runs`` and,
+        if ``processed_bytes`` is given, the best throughput in MB/s.
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+
+    result = {
+        'best': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.fmean(timings),
+        'runs': timings,
+    }
+    if processed_bytes:
+        result['bytes'] = processed_bytes
+        result['mb_per_second'] = processed_bytes / MEGABYTE / max(min(timings), 1e-9)
+    return result
+
+
+def run_tier(folder: str, tier: dict, repeat: int, fill: str) -> dict:
+    """Generate the save folders of a tier in ``folder`` and time every operation.
+
+    Returns:
+        dict: Timings of each operation, see ``measure``.
+    """
+    microsoft_path = os.path.join(folder, 'microsoft')
+    steam_path = os.path.join(folder, 'steam')
+    output_path = os.path.join(folder, 'output')
+    total_size = tier['saves'] * tier['save_size']
+
+    saves = generator.write_microsoft_save_folder(microsoft_path, tier['saves'], tier['save_size'],
+                                                  tier['containers'], fill=fill)
+    steam_saves = generator.write_steam_save_folder(steam_path, tier['saves'], tier['save_size'], fill=fill)
+    wgs_path = os.path.join(folder, 'wgs')
+    generator.write_wgs_folder(wgs_path, DISCOVERY_USERS, DISCOVERY_FOLDERS, tier['saves'], tier['save_size'])
+    containers_paths = sorted({container_path for container_path, _ in saves})
+
+    def reset_output():
+        if os.path.isdir(output_path):
+            shutil.rmtree(output_path)
+        os.makedirs(output_path)
+
+    def parse_containers():
+        for container_path in containers_paths:
+            Container(container_path).save_list
+
+    def convert_to_steam():
+        for _, save in saves:
+            AstroApi.export_save_to_steam(save, microsoft_path, output_path, on_progress=_ignore_progress)
+
+    def convert_to_xbox():
+        container_writer = ContainerWriter(output_path)
+        for save_path in steam_saves:
+            save = AstroSave(os.path.basename(save_path)[:-len('.savegame')], [])
+            AstroApi.export_save_to_xbox(save, save_path, output_path, container_writer, _ignore_progress)
+        container_writer.commit()
+
+    snapshots = [os.path.join(folder, 'backups', f'Backup_2021.01.01-00.0{i}') for i in range(2)]
+
+    def reset_backups():
+        shutil.rmtree(os.path.join(folder, 'backups'), ignore_errors=True)
+
+    def backup_incremental():
+        AstroBackup.create_snapshot(microsoft_path, snapshots[1], snapshots[0])
+
+    results = {
+        'container_parsing': measure(parse_containers, repeat),
+        'discovery': measure(lambda: AstroMicrosoftSaveFolder.get_save_folders_from_path(wgs_path), repeat),
+        'save_details': measure(lambda: AstroMicrosoftSaveFolder.get_save_details(microsoft_path), repeat),
+        'xbox_to_steam': measure(convert_to_steam, repeat, reset_output, total_size),
+        'steam_to_xbox': measure(convert_to_xbox, repeat, reset_output, total_size),
+        'backup_full': measure(lambda: AstroBackup.create_snapshot(microsoft_path, snapshots[0]),
+                               repeat, reset_backups, total_size),
+    }
+    results['backup_incremental'] = measure(backup_incremental, repeat)
+
+    cache = AstroContainerCache.setup_cache(os.path.join(folder, 'astro'))
+    try:
+        parse_containers()
+        results['container_parsing_cached'] = measure(parse_containers, repeat)
+        results['save_details_cached'] = measure(
+            lambda: AstroMicrosoftSaveFolder.get_save_details(microsoft_path), repeat)
+    finally:
+        if cache is not None:
+            AstroContainerCache.disable_cache()
+    return results
+
+
+def get_environment() -> dict:
+    """Describe the version of the code and the machine the benchmarks run on."""
+    try:
+        revision = subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+
+    return {
+        'revision': revision,
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare_results(results: dict, reference: dict) -> list:
+    """Return a line per operation timed in both results, with the speedup of ``results``.
+
+    Operations more than ``REGRESSION_THRESHOLD`` times slower are flagged.
+    """
+    lines = []
+    for tier_name, tier in results['tiers'].items():
+        reference_tier = reference.get('tiers', {}).get(tier_name)
+        if reference_tier is None or reference_tier['spec'] != tier['spec']:
+            continue
+        for operation, timing in tier['results'].items():
+            reference_timing = reference_tier['results'].get(operation)
+            if reference_timing is None:
+                continue
+            ratio = reference_timing['best'] / max(timing['best'], 1e-9)
+            flag = '  REGRESSION' if ratio * REGRESSION_THRESHOLD < 1 else ''
+            lines.append(f'{tier_name:8} {operation:26} {reference_timing["best"] * 1000:10.2f} ms '
+                         f'-> {timing["best"] * 1000:10.2f} ms {ratio:6.2f}x{flag}')
+    return lines
+
+
+def print_results(results: dict) -> None:
+    """Print the best time of each operation, and its throughput if known."""
+    for tier_name, tier in results['tiers'].items():
+        spec = tier['spec']
+        print(f'{tier_name}: {spec["saves"]} saves of {spec["save_size"] / MEGABYTE:.1f} MB '
+              f'in {spec["containers"]} containers')
+        for operation, timing in tier['results'].items():
+            throughput = f' {timing["mb_per_second"]:8.1f} MB/s' if 'mb_per_second' in timing else ''
+            print(f'  {operation:26} {timing["best"] * 1000:10.2f} ms{throughput}')
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--tiers', nargs='+', choices=list(TIERS), default=list(DEFAULT_TIERS),
+                        help='Size tiers to run')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per operation')
+    parser.add_argument('--fill', choices=generator.FILL_MODES, default='random',
+                        help='Content of the generated saves, sparse files are faster to generate')
+    parser.add_argument('--output', help='JSON file where the results are written')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare with')
+    parser.add_argument('--dir', help='Folder to work in (defaults to a temporary folder)')
+    args = parser.parse_args()
+
+    # Operations log each save and draw progress bars, keep the timings about the work
+    Logger.logPrint = lambda *_args, **_kwargs: None
+    AstroProgress.configure_progress('none')
+
+    results = {'version': RESULTS_VERSION, 'environment': get_environment(), 'tiers': {}}
+    for tier_name in args.tiers:
+        with tempfile.TemporaryDirectory(dir=args.dir) as folder:
+            tier = TIERS[tier_name]
+            results['tiers'][tier_name] = {
+                'spec': tier,
+                'results': run_tier(folder, tier, args.repeat, args.fill),
+            }
+
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+    if args.compare:
+        with open(args.compare) as reference:
+            print('\n'.join(compare_results(results, json.load(reference))))
+
+
+def _ignore_progress(_byte_count: int) -> None:
+    """Progress callback of the conversions, their progress is not displayed."""
+
+
+if __name__ == '__main__':
+    main()
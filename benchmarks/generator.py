@@ -0,0 +1,143 @@
+"""Generation of synthetic Microsoft and Steam save folders.
+
+The folders follow the layout written by the game: a Microsoft save folder
+holds ``container.N`` files whose 160 bytes records reference chunk files
+named after their GUID, a save larger than ``chunk_size`` being split into
+several chunks tagged ``$${i}${chunk_count}$1``. A Steam save folder holds
+one ``.savegame`` file per save. Contents are pseudo-random, the same for a
+given seed, so that runs can be compared.
+"""
+
+import os
+import random
+import uuid
+from typing import List, Tuple
+
+from cogs.AstroSave import AstroSave, XBOX_CHUNK_SIZE
+from cogs.AstroSaveContainer import CONTAINER_HEADER, build_chunks_metadata
+
+MEGABYTE = 1024 * 1024
+FILL_MODES = ('random', 'sparse')
+WRITE_BLOCK_SIZE = MEGABYTE
+# Containers dated in the past, like those of a closed game (and cacheable)
+GENERATED_MTIME = 1609459200  # 2021-01-01 00:00:00 UTC
+
+
+def write_microsoft_save_folder(path: str, save_count: int, save_size: int, container_count: int = 1,
+                                chunk_size: int = XBOX_CHUNK_SIZE, fill: str = 'random',
+                                seed: int = 0) -> List[Tuple[str, AstroSave]]:
+    """Write a Microsoft save folder.
+
+    Saves are spread over the containers in turn.
+
+    Args:
+        path: Folder to create.
+        save_count: Number of saves.
+        save_size: Size of each save in bytes, split in chunks of ``chunk_size``.
+        container_count: Number of ``container.N`` files.
+        chunk_size: Maximum size of a chunk file.
+        fill: ``'random'`` for pseudo-random chunks, ``'sparse'`` for
+            chunks full of zeros that take no disk space.
+        seed: Seed of the names, GUIDs and contents.
+
+    Returns:
+        list: ``(container_path, save)`` for each save, in container order.
+    """
+    generator = random.Random(seed)
+    os.makedirs(path, exist_ok=True)
+
+    containers_saves = [[] for _ in range(container_count)]
+    for save_index in range(save_count):
+        chunk_uuids = [uuid.UUID(int=generator.getrandbits(128), version=4)
+                       for _ in range(max(-(-save_size // chunk_size), 1))]
+        save = AstroSave(get_save_name(save_index), [chunk_uuid.hex.upper() for chunk_uuid in chunk_uuids])
+        containers_saves[save_index % container_count].append((save, chunk_uuids))
+
+        for chunk_index, chunk_name in enumerate(save.chunks_names):
+            length = min(chunk_size, save_size - chunk_index * chunk_size)
+            write_payload(os.path.join(path, chunk_name), length, fill, generator)
+
+    saves = []
+    for container_index, container_saves in enumerate(containers_saves, 1):
+        container_path = os.path.join(path, f'container.{container_index}')
+        chunk_count = sum(len(chunk_uuids) for _, chunk_uuids in container_saves)
+        with open(container_path, 'wb') as container:
+            container.write(CONTAINER_HEADER.pack(b'\x04\x00', chunk_count))
+            for save, chunk_uuids in container_saves:
+                container.write(build_chunks_metadata(save.name, chunk_uuids))
+        os.utime(container_path, (GENERATED_MTIME, GENERATED_MTIME))
+        saves.extend((container_path, save) for save, _ in container_saves)
+    return saves
+
+
+def write_steam_save_folder(path: str, save_count: int, save_size: int, fill: str = 'random',
+                            seed: int = 0) -> List[str]:
+    """Write a Steam save folder of ``save_count`` saves of ``save_size`` bytes.
+
+    Returns:
+        list: Paths of the ``.savegame`` files.
+    """
+    generator = random.Random(seed)
+    os.makedirs(path, exist_ok=True)
+
+    save_paths = []
+    for save_index in range(save_count):
+        save_path = os.path.join(path, f'{get_save_name(save_index)}.savegame')
+        write_payload(save_path, save_size, fill, generator)
+        save_paths.append(save_path)
+    return save_paths
+
+
+def write_wgs_folder(path: str, user_count: int, folders_per_user: int, save_count: int, save_size: int,
+                     seed: int = 0) -> List[str]:
+    """Write a ``wgs`` folder like the one of the Microsoft Store version.
+
+    Each user folder holds a ``containers.index``, save folders and as many
+    folders of another game (whose container holds no dated save), which
+    discovery must skip.
+
+    Returns:
+        list: Paths of the Astroneer save folders.
+    """
+    save_folders = []
+    for user_index in range(user_count):
+        user_path = os.path.join(path, f'{user_index:016X}_{seed:032X}')
+        os.makedirs(user_path, exist_ok=True)
+        with open(os.path.join(user_path, 'containers.index'), 'wb') as index:
+            index.write(os.urandom(64))
+
+        for folder_index in range(folders_per_user):
+            folder_seed = seed + user_index * folders_per_user + folder_index
+            folder_path = os.path.join(user_path, uuid.UUID(int=folder_seed).hex.upper())
+            write_microsoft_save_folder(folder_path, save_count, save_size, fill='sparse', seed=folder_seed)
+            save_folders.append(folder_path)
+
+            other_path = os.path.join(user_path, uuid.UUID(int=folder_seed, version=1).hex.upper())
+            os.makedirs(other_path, exist_ok=True)
+            with open(os.path.join(other_path, 'container.1'), 'wb') as container:
+                container.write(CONTAINER_HEADER.pack(b'\x04\x00', 1))
+                container.write(build_chunks_metadata('settings', [uuid.UUID(int=folder_seed)]))
+    return save_folders
+
+
+def get_save_name(save_index: int) -> str:
+    """Return the name of the save ``save_index``, dated one minute after the previous one."""
+    hours, minutes = divmod(save_index, 60)
+    return f'SAVE_{save_index}$2021.01.{1 + hours // 24:02}-{hours % 24:02}.{minutes:02}.00'
+
+
+def write_payload(path: str, size: int, fill: str, generator: random.Random) -> None:
+    """Write a file of ``size`` bytes, see ``write_microsoft_save_folder`` for ``fill``.
+
+    Raises:
+        ValueError: If ``fill`` is unknown.
+    """
+    if fill not in FILL_MODES:
+        raise ValueError(f'Unknown fill mode: {fill}')
+
+    with open(path, 'wb') as payload:
+        if fill == 'sparse':
+            payload.truncate(size)
+            return
+        for offset in range(0, size, WRITE_BLOCK_SIZE):
+            payload.write(generator.randbytes(min(WRITE_BLOCK_SIZE, size - offset)))
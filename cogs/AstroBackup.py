@@ -0,0 +1,432 @@
+"""Incremental backups of save folders.
+
+Each backup is a new timestamped folder (see ``utils.create_folder_name``).
+Files that did not change since the previous backup of the same folder are
+hard-linked from it instead of being copied again, so a backup only costs
+the size of what changed.
+
+Backups can also be compressed archives (see ``configure_backups``), each
+file being streamed through the compressor one block at a time.
+"""
+
+import io
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+import utils
+from cogs import AstroLogging as Logger
+from cogs import AstroProfiler
+from cogs import AstroProgress
+
+MEGABYTE = 1024 * 1024
+HASH_BUFFER_SIZE = 1024 * 1024
+ARCHIVE_BLOCK_SIZE = 1024 * 1024  # Bytes passed to the compressor at once
+# Extension of the backups of each format, 'dir' backups are plain folders
+BACKUP_FORMATS = {'dir': '', 'zip': '.zip', 'tar.gz': '.tar.gz', 'tar.xz': '.tar.xz'}
+# Suffix added to backup folder names by ``utils.create_folder_name``
+SNAPSHOT_DATE_SUFFIX = re.compile(r'_\d{4}\.\d{2}\.\d{2}-\d{2}\.\d{2}$')
+
+_settings = {'compare_hash': False, 'backup_format': 'dir'}
+
+
+class AstroBackupResult:
+    """What a backup reused from the previous one and what it copied."""
+
+    def __init__(self, snapshot_path: str, previous_snapshot: Optional[str]) -> None:
+        """Create an empty result.
+
+        Args:
+            snapshot_path: Folder of the new backup.
+            previous_snapshot: Backup files were compared to, ``None`` if there was none.
+        """
+        self.snapshot_path = snapshot_path
+        self.previous_snapshot = previous_snapshot
+        self.linked_files = 0
+        self.linked_bytes = 0
+        self.copied_files = 0
+        self.copied_bytes = 0
+        self.copy_methods = {}  # Method used for each copied file (see utils.copy_file), by path
+
+    def __str__(self) -> str:
+        methods = {}
+        for method in self.copy_methods.values():
+            methods[method] = methods.get(method, 0) + 1
+        methods_text = ', '.join(f'{count} {method}' for method, count in sorted(methods.items()))
+        return (f'{self.copied_files} files copied ({self.copied_bytes / MEGABYTE:.1f} MB'
+                + (f': {methods_text}' if methods_text else '') + '), '
+                f'{self.linked_files} unchanged files linked ({self.linked_bytes / MEGABYTE:.1f} MB)')
+
+
+class AstroArchiveResult:
+    """Size and speed of a compressed backup."""
+
+    def __init__(self, archive_path: str, source_bytes: int, archive_bytes: int, duration: float) -> None:
+        """Describe a written archive.
+
+        Args:
+            archive_path: Path of the archive.
+            source_bytes: Size of the archived files.
+            archive_bytes: Size of the archive.
+            duration: Time spent writing the archive, in seconds.
+        """
+        self.archive_path = archive_path
+        self.source_bytes = source_bytes
+        self.archive_bytes = archive_bytes
+        self.duration = duration
+
+    @property
+    def ratio(self) -> float:
+        """Size of the archive relative to the archived files."""
+        return self.archive_bytes / self.source_bytes if self.source_bytes else 1.0
+
+    @property
+    def throughput(self) -> float:
+        """Archived megabytes per second."""
+        return self.source_bytes / MEGABYTE / max(self.duration, 1e-9)
+
+    def __str__(self) -> str:
+        return (f'{self.source_bytes / MEGABYTE:.1f} MB -> {self.archive_bytes / MEGABYTE:.1f} MB '
+                f'({self.ratio:.1%}) in {self.duration:.2f}s, {self.throughput:.1f} MB/s')
+
+
+def configure_backups(compare_hash: bool = False, backup_format: str = 'dir') -> None:
+    """Set how the backups made from now on are written.
+
+    Args:
+        compare_hash: Also compare the content of files having the same size
+            and modification date, instead of trusting those.
+        backup_format: ``'dir'`` for incremental folders, or an archive
+            format of ``BACKUP_FORMATS``.
+
+    Raises:
+        ValueError: If ``backup_format`` is unknown.
+    """
+    if backup_format not in BACKUP_FORMATS:
+        raise ValueError(f'Unknown backup format: {backup_format}')
+    _settings['compare_hash'] = compare_hash
+    _settings['backup_format'] = backup_format
+
+
+def get_backup_format() -> str:
+    """Return the format of the backups, see ``configure_backups``."""
+    return _settings['backup_format']
+
+
+def save_backup(source: str, target: str) -> str:
+    """Back ``source`` up to ``target`` in the configured format.
+
+    Args:
+        source: Folder to back up.
+        target: Timestamped path of the backup, without archive extension.
+
+    Returns:
+        str: Path of the backup folder or archive.
+    """
+    if get_backup_format() == 'dir':
+        return backup_folder(source, target).snapshot_path
+    return archive_folders([(source, target)])[0].archive_path
+
+
+def backup_folder(source: str, target: str) -> AstroBackupResult:
+    """Back ``source`` up to ``target``, reusing the latest backup next to ``target``.
+
+    Args:
+        source: Folder to back up.
+        target: Timestamped folder of the new backup, replaced if it exists.
+
+    Returns:
+        AstroBackupResult: Files linked and copied.
+    """
+    return create_snapshot(source, target, find_previous_snapshot(target))
+
+
+def find_previous_snapshot(snapshot_path: str) -> Optional[str]:
+    """Return the latest other backup sharing the name prefix of ``snapshot_path``.
+
+    Backups named ``<prefix>_YYYY.MM.dd-HH.MM`` in the same parent folder are
+    considered, their names sort by date.
+
+    Args:
+        snapshot_path: Folder of the new backup.
+
+    Returns:
+        str: Path of the previous backup, ``None`` if there is none.
+    """
+    parent_path, snapshot_name = os.path.split(os.path.normpath(snapshot_path))
+    prefix = SNAPSHOT_DATE_SUFFIX.sub('', snapshot_name)
+    if prefix == snapshot_name:
+        return None
+
+    try:
+        with os.scandir(parent_path or '.') as entries:
+            candidates = [
+                entry.name for entry in entries
+                if entry.name != snapshot_name and entry.is_dir(follow_symlinks=False)
+                and SNAPSHOT_DATE_SUFFIX.sub('', entry.name) == prefix
+                and SNAPSHOT_DATE_SUFFIX.search(entry.name)
+            ]
+    except OSError:
+        return None
+
+    if not candidates:
+        return None
+    return utils.join_paths(parent_path, max(candidates))
+
+
+@AstroProfiler.timed('backup', count_bytes=lambda result: result.copied_bytes)
+def create_snapshot(source: str, target: str, previous_snapshot: Optional[str] = None) -> AstroBackupResult:
+    """Copy ``source`` to ``target``, hard-linking files unchanged in ``previous_snapshot``.
+
+    A file is unchanged if the file at the same place in ``previous_snapshot``
+    has the same size and modification date (and content, see
+    ``configure_backups``). Other files are copied in parallel with
+    ``utils.copy_file_list``, keeping the modification date of the source
+    so that the next backup can compare against them. Files are also
+    copied whenever a hard link cannot be created (other drive, filesystem
+    without hard links...).
+
+    Args:
+        source: Folder to back up.
+        target: Folder of the new backup, replaced if it exists.
+        previous_snapshot: Earlier backup of ``source``, may be ``None``.
+
+    Returns:
+        AstroBackupResult: Files linked and copied.
+    """
+    if previous_snapshot is not None and not os.path.isdir(previous_snapshot):
+        previous_snapshot = None
+    result = AstroBackupResult(target, previous_snapshot)
+
+    if os.path.isdir(target):
+        shutil.rmtree(target)
+
+    copies = []
+    folders = []
+    _snapshot_folder(source, target, previous_snapshot, result, copies, folders)
+    if copies:
+        with AstroProgress.AstroProgress('Backup', result.copied_bytes) as progress:
+            result.copy_methods = utils.copy_file_list(copies, on_progress=progress.advance)
+    # Adding files changed the folders dates, they are copied last
+    for folder, target_folder in folders:
+        shutil.copystat(folder, target_folder)
+
+    Logger.logPrint('Backup of %s to %s: %s, previous backup: %s', 'debug',
+                    source, target, result, previous_snapshot or 'none')
+    return result
+
+
+def _snapshot_folder(source: str, target: str, previous: Optional[str], result: AstroBackupResult,
+                     copies: list, folders: list) -> None:
+    """Recursively link the unchanged files of ``source`` into ``target``.
+
+    The ``(source, target)`` paths of files to copy are added to ``copies``
+    and those of folders to ``folders``, see ``create_snapshot``.
+    """
+    os.makedirs(target)
+    folders.append((source, target))
+    with os.scandir(source) as entries:
+        for entry in entries:
+            target_path = utils.join_paths(target, entry.name)
+            previous_path = utils.join_paths(previous, entry.name) if previous is not None else None
+
+            if entry.is_dir():
+                _snapshot_folder(entry.path, target_path,
+                                 previous_path if previous_path and os.path.isdir(previous_path) else None,
+                                 result, copies, folders)
+                continue
+
+            source_stat = entry.stat()
+            if previous_path is not None and _is_unchanged(entry.path, source_stat, previous_path):
+                try:
+                    os.link(previous_path, target_path)
+                    result.linked_files += 1
+                    result.linked_bytes += source_stat.st_size
+                    continue
+                except OSError as e:
+                    Logger.logPrint('Cannot link %s, copying it: %s', 'debug', previous_path, e)
+
+            copies.append((entry.path, target_path))
+            result.copied_files += 1
+            result.copied_bytes += source_stat.st_size
+
+
+def archive_folders(folders: List[Tuple[str, str]], backup_format: str = None) -> List[AstroArchiveResult]:
+    """Write one compressed archive per folder, several archives at a time.
+
+    Each archive is only renamed to its final name once complete, and holds
+    the folder content under a root folder named like the archive.
+
+    Args:
+        folders: ``(source, target)`` of each folder to archive, ``target``
+            being the archive path without its extension.
+        backup_format: Archive format of ``BACKUP_FORMATS``, the configured
+            one if ``None``.
+
+    Returns:
+        List[AstroArchiveResult]: Result of each archive, in order.
+
+    Raises:
+        ValueError: If the format is not an archive format.
+    """
+    backup_format = backup_format or get_backup_format()
+    if not BACKUP_FORMATS.get(backup_format):
+        raise ValueError(f'Not an archive format: {backup_format}')
+
+    start = time.perf_counter()
+    folders_entries = [_list_archive_entries(source, target) for source, target in folders]
+    total_size = sum(size for entries in folders_entries for _, _, size in entries)
+    # zlib and lzma release the GIL while compressing
+    with AstroProgress.AstroProgress('Backup', total_size) as progress, \
+            ThreadPoolExecutor(max_workers=max(1, min(len(folders), os.cpu_count() or 1))) as executor:
+        futures = [executor.submit(archive_folder, source, target, backup_format, progress.advance, entries)
+                   for (source, target), entries in zip(folders, folders_entries)]
+    results = [future.result() for future in futures]
+
+    for result in results:
+        Logger.logPrint('Backup archive %s: %s', 'info', result.archive_path, result)
+    if len(results) > 1:
+        total = AstroArchiveResult('', sum(result.source_bytes for result in results),
+                                   sum(result.archive_bytes for result in results), time.perf_counter() - start)
+        Logger.logPrint('%d backup archives: %s', 'info', len(results), total)
+    return results
+
+
+@AstroProfiler.timed('backup_archive', count_bytes=lambda result: result.source_bytes)
+def archive_folder(source: str, target: str, backup_format: str, on_progress: Callable[[int], None] = None,
+                   entries: List[Tuple[str, str, int]] = None) -> AstroArchiveResult:
+    """Write ``source`` to a compressed archive, see ``archive_folders``.
+
+    Args:
+        source: Folder to archive.
+        target: Path of the archive, without its extension.
+        backup_format: Archive format of ``BACKUP_FORMATS``.
+        on_progress: Called with the number of bytes of each block archived.
+        entries: Content of ``source`` listed by ``_list_archive_entries``,
+            listed again if ``None``.
+
+    Returns:
+        AstroArchiveResult: Size and speed of the archive.
+    """
+    archive_path = target + BACKUP_FORMATS[backup_format]
+    if entries is None:
+        entries = _list_archive_entries(source, target)
+    on_progress = on_progress or (lambda byte_count: None)
+
+    start = time.perf_counter()
+    source_bytes = 0
+    with utils.atomic_write(archive_path) as raw_archive:
+        archive_file = io.BufferedWriter(raw_archive, ARCHIVE_BLOCK_SIZE)
+        if backup_format == 'zip':
+            source_bytes = _write_zip(archive_file, entries, on_progress)
+        else:
+            source_bytes = _write_tar(archive_file, entries, backup_format.split('.')[1], on_progress)
+        archive_file.flush()
+        archive_file.detach()
+
+    return AstroArchiveResult(archive_path, source_bytes, os.path.getsize(archive_path),
+                              time.perf_counter() - start)
+
+
+def _list_archive_entries(source: str, target: str) -> List[Tuple[str, str, int]]:
+    """Return ``(path, arcname, size)`` of ``source`` and of everything it contains.
+
+    Archive names are rooted in a folder named like the archive ``target``.
+    """
+    root_name = os.path.basename(os.path.normpath(target))
+    entries = [(source, root_name, 0)]
+    for folder, folder_names, file_names in os.walk(source):
+        folder_arcname = os.path.join(root_name, os.path.relpath(folder, source))
+        for name in sorted(folder_names) + sorted(file_names):
+            path = os.path.join(folder, name)
+            size = 0 if name in folder_names else os.path.getsize(path)
+            entries.append((path, os.path.normpath(os.path.join(folder_arcname, name)), size))
+    return entries
+
+
+def _write_zip(archive_file, entries: List[Tuple[str, str, int]], on_progress: Callable[[int], None]) -> int:
+    """Write ``(path, arcname, size)`` entries to a zip archive, return the bytes archived."""
+    # Imported on first archive, most runs never write one
+    import zipfile
+    source_bytes = 0
+    buffer = bytearray(ARCHIVE_BLOCK_SIZE)
+    view = memoryview(buffer)
+    with zipfile.ZipFile(archive_file, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+        for path, arcname, _ in entries:
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            if info.is_dir():
+                archive.writestr(info, b'')
+                continue
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with open(path, 'rb', buffering=0) as source_file, \
+                    archive.open(info, 'w', force_zip64=info.file_size > zipfile.ZIP64_LIMIT) as archived_file:
+                while True:
+                    len_read = source_file.readinto(view)
+                    if not len_read:
+                        break
+                    archived_file.write(view[:len_read])
+                    source_bytes += len_read
+                    on_progress(len_read)
+    return source_bytes
+
+
+def _write_tar(archive_file, entries: List[Tuple[str, str, int]], compression: str,
+               on_progress: Callable[[int], None]) -> int:
+    """Write ``(path, arcname, size)`` entries to a compressed tar archive, return the bytes archived."""
+    import tarfile
+    source_bytes = 0
+    with tarfile.open(fileobj=archive_file, mode=f'w:{compression}', copybufsize=ARCHIVE_BLOCK_SIZE) as archive:
+        for path, arcname, _ in entries:
+            info = archive.gettarinfo(path, arcname)
+            if not info.isreg():
+                archive.addfile(info)
+                continue
+            with open(path, 'rb') as source_file:
+                archive.addfile(info, _ProgressReader(source_file, on_progress))
+            source_bytes += info.size
+    return source_bytes
+
+
+class _ProgressReader:
+    """Readable file reporting the number of bytes read to ``on_progress``."""
+
+    def __init__(self, file, on_progress: Callable[[int], None]) -> None:
+        self._file = file
+        self._on_progress = on_progress
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._file.read(size)
+        self._on_progress(len(data))
+        return data
+
+
+def _is_unchanged(source_path: str, source_stat: os.stat_result, previous_path: str) -> bool:
+    """Return ``True`` if the backed up ``previous_path`` is the same as ``source_path``."""
+    try:
+        previous_stat = os.stat(previous_path)
+    except OSError:
+        return False
+
+    if (previous_stat.st_size, previous_stat.st_mtime_ns) != (source_stat.st_size, source_stat.st_mtime_ns):
+        return False
+    if _settings['compare_hash']:
+        return _hash_file(source_path) == _hash_file(previous_path)
+    return True
+
+
+def _hash_file(path: str) -> bytes:
+    """Return the BLAKE2 digest of a file, read one buffer at a time."""
+    import hashlib
+    digest = hashlib.blake2b()
+    buffer = bytearray(HASH_BUFFER_SIZE)
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as file:
+        while True:
+            len_read = file.readinto(view)
+            if not len_read:
+                break
+            digest.update(view[:len_read])
+    return digest.digest()
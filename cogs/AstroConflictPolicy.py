@@ -0,0 +1,11 @@
+"""Enumeration describing what to do when an exported save already exists."""
+
+from enum import Enum
+
+
+class AstroConflictPolicy(Enum):
+    """Possible behaviours when a save with the same name exists in the target."""
+
+    SKIP = 'skip'
+    OVERWRITE = 'overwrite'
+    RENAME = 'rename'
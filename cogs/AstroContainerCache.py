@@ -0,0 +1,258 @@
+"""Persistent cache of parsed save containers.
+
+The saves found in a container (names and chunk GUIDs) are stored in a
+SQLite database, keyed by the container path, size and modification time.
+An entry is dropped as soon as any of those change, so that a container is
+parsed again only after it has been edited. Chunk sizes are not cached: a
+chunk file can be rewritten without its container changing.
+
+``sqlite3`` is imported once a cache is set up, containers parsed without
+cache do not load it.
+"""
+
+import atexit
+import os
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from cogs import AstroLogging as Logger
+
+CACHE_FOLDER_NAME = 'cache'
+CACHE_FILE_NAME = 'container_index.sqlite3'
+SCHEMA_VERSION = 2
+# A container modified less than this ago may be modified again without its
+# size nor mtime changing (coarse filesystem timestamps), it is not cached yet
+RACY_MTIME_WINDOW_NS = 2 * 1000 * 1000 * 1000
+STATS_NAMES = ('hits', 'misses', 'invalidations')
+
+_cache = None
+
+
+class AstroContainerCache:
+    """SQLite index of the saves of the containers parsed so far.
+
+    Connections are shared between threads, every access goes through a lock.
+    Hits and misses are counted for the session and added to the totals kept
+    in the database when the cache is closed.
+    """
+
+    def __init__(self, database_path: str) -> None:
+        """Open (or create) the cache database.
+
+        Args:
+            database_path: Path of the SQLite database file.
+
+        Raises:
+            sqlite3.Error: If the database cannot be opened.
+        """
+        import sqlite3
+        self.database_path = database_path
+        self._lock = threading.Lock()
+        self.session_stats = dict.fromkeys(STATS_NAMES, 0)
+
+        self._connection = sqlite3.connect(database_path, timeout=5, check_same_thread=False)
+        try:
+            self._create_schema()
+        except sqlite3.Error:
+            self._connection.close()
+            raise
+
+    def _create_schema(self) -> None:
+        """Create the tables, dropping those of an older schema version."""
+        with self._connection:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            version = self._connection.execute('PRAGMA user_version').fetchone()[0]
+            if version != SCHEMA_VERSION:
+                self._connection.execute('DROP TABLE IF EXISTS saves')
+                self._connection.execute('DROP TABLE IF EXISTS containers')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS containers ('
+                'path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, '
+                'chunk_count INTEGER NOT NULL)')
+            # Chunk GUIDs are stored as 16 bytes each
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS saves ('
+                'container_path TEXT NOT NULL, save_index INTEGER NOT NULL, name TEXT NOT NULL, '
+                'chunks_guids BLOB NOT NULL, PRIMARY KEY (container_path, save_index))')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            self._connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def load(self, container_path: str, container_stat: os.stat_result,
+             chunk_count: int) -> Optional[List[Tuple[str, bytes]]]:
+        """Return the cached saves of a container if it did not change.
+
+        Args:
+            container_path: Path of the container file.
+            container_stat: Current ``os.stat`` of the container.
+            chunk_count: Number of chunks stated by the container header.
+
+        Returns:
+            ``(save_name, chunks_guids)`` for each save, or ``None`` if the
+            container is not cached or its entry is outdated.
+        """
+        import sqlite3
+        key = self._get_key(container_path)
+        try:
+            with self._lock:
+                entry = self._connection.execute(
+                    'SELECT size, mtime_ns, chunk_count FROM containers WHERE path = ?', (key,)).fetchone()
+                if entry is None:
+                    self.session_stats['misses'] += 1
+                    return None
+
+                if entry != (container_stat.st_size, container_stat.st_mtime_ns, chunk_count):
+                    self.session_stats['invalidations'] += 1
+                    with self._connection:
+                        self._delete(key)
+                    return None
+
+                rows = self._connection.execute(
+                    'SELECT name, chunks_guids FROM saves '
+                    'WHERE container_path = ? ORDER BY save_index', (key,)).fetchall()
+                self.session_stats['hits'] += 1
+        except sqlite3.Error as e:
+            Logger.logPrint('Container cache lookup failed for %s: %s', 'debug', container_path, e)
+            return None
+
+        return [(name, bytes(chunks_guids)) for name, chunks_guids in rows]
+
+    def store(self, container_path: str, container_stat: os.stat_result, chunk_count: int,
+              saves: List[Tuple[str, bytes]]) -> bool:
+        """Cache the saves of a container.
+
+        Containers modified within ``RACY_MTIME_WINDOW_NS`` are not stored.
+
+        Args:
+            container_path: Path of the container file.
+            container_stat: ``os.stat`` of the container when it was parsed.
+            chunk_count: Number of chunks stated by the container header.
+            saves: ``(save_name, chunks_guids)`` for each save.
+
+        Returns:
+            bool: ``True`` if the container has been stored.
+        """
+        import sqlite3
+        if time.time_ns() - container_stat.st_mtime_ns < RACY_MTIME_WINDOW_NS:
+            return False
+
+        key = self._get_key(container_path)
+        rows = [
+            (key, save_index, name, chunks_guids)
+            for save_index, (name, chunks_guids) in enumerate(saves)
+        ]
+        try:
+            with self._lock, self._connection:
+                self._delete(key)
+                self._connection.execute(
+                    'INSERT INTO containers (path, size, mtime_ns, chunk_count) VALUES (?, ?, ?, ?)',
+                    (key, container_stat.st_size, container_stat.st_mtime_ns, chunk_count))
+                self._connection.executemany(
+                    'INSERT INTO saves (container_path, save_index, name, chunks_guids) '
+                    'VALUES (?, ?, ?, ?)', rows)
+        except sqlite3.Error as e:
+            Logger.logPrint('Container cache update failed for %s: %s', 'debug', container_path, e)
+            return False
+
+        Logger.logPrint('Container cached: %s (%d saves)', 'debug', container_path, len(rows))
+        return True
+
+    def get_stats(self) -> dict:
+        """Return the size of the cache and the hit counters, this session included.
+
+        Returns:
+            dict: ``containers``, ``saves``, ``database_size`` (bytes), then
+            ``hits``, ``misses``, ``invalidations`` and ``hit_rate``.
+        """
+        with self._lock:
+            stats = {
+                'containers': self._connection.execute('SELECT COUNT(*) FROM containers').fetchone()[0],
+                'saves': self._connection.execute('SELECT COUNT(*) FROM saves').fetchone()[0],
+                'database_size': os.path.getsize(self.database_path),
+            }
+            totals = dict(self._connection.execute('SELECT name, value FROM stats').fetchall())
+
+        for name in STATS_NAMES:
+            stats[name] = totals.get(name, 0) + self.session_stats[name]
+        lookups = stats['hits'] + stats['misses'] + stats['invalidations']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def clear(self) -> None:
+        """Drop every cached container and reset the counters."""
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM saves')
+            self._connection.execute('DELETE FROM containers')
+            self._connection.execute('DELETE FROM stats')
+            self.session_stats = dict.fromkeys(STATS_NAMES, 0)
+
+    def close(self) -> None:
+        """Save the counters of the session and close the database."""
+        import sqlite3
+        with self._lock:
+            if self._connection is None:
+                return
+            Logger.logPrint('Container cache: %s hits, %s misses, %s invalidations', 'debug',
+                            *(self.session_stats[name] for name in STATS_NAMES))
+            try:
+                with self._connection:
+                    self._connection.executemany(
+                        'INSERT INTO stats (name, value) VALUES (?, ?) '
+                        'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+                        list(self.session_stats.items()))
+            except sqlite3.Error as e:
+                Logger.logPrint('Container cache counters not saved: %s', 'debug', e)
+            self._connection.close()
+            self._connection = None
+
+    def _delete(self, key: str) -> None:
+        """Remove the entry of a container, the lock must be held."""
+        self._connection.execute('DELETE FROM saves WHERE container_path = ?', (key,))
+        self._connection.execute('DELETE FROM containers WHERE path = ?', (key,))
+
+    @staticmethod
+    def _get_key(container_path: str) -> str:
+        """Return the key of a container, the same whatever the form of its path."""
+        return os.path.normcase(os.path.abspath(container_path))
+
+
+def setup_cache(astroPath: str) -> Optional[AstroContainerCache]:
+    """Open the cache used by every container parsed from now on.
+
+    Args:
+        astroPath: Base directory where the cache database is stored.
+
+    Returns:
+        AstroContainerCache: The cache, ``None`` if it cannot be opened (the
+        containers are then parsed without cache).
+    """
+    global _cache
+    import sqlite3
+    disable_cache()
+
+    cachePath = os.path.join(astroPath, CACHE_FOLDER_NAME)
+    try:
+        os.makedirs(cachePath, exist_ok=True)
+        _cache = AstroContainerCache(os.path.join(cachePath, CACHE_FILE_NAME))
+    except (OSError, sqlite3.Error) as e:
+        Logger.logPrint('Container cache disabled, cannot open it in %s: %s', 'debug', cachePath, e)
+        return None
+
+    atexit.register(_cache.close)
+    return _cache
+
+
+def get_cache() -> Optional[AstroContainerCache]:
+    """Return the cache set up with ``setup_cache``, ``None`` if disabled."""
+    return _cache
+
+
+def disable_cache() -> None:
+    """Close the current cache, containers are parsed without cache afterwards."""
+    global _cache
+    if _cache is not None:
+        atexit.unregister(_cache.close)
+        _cache.close()
+        _cache = None
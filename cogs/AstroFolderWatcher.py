@@ -0,0 +1,202 @@
+"""Waiting for changes in save folders.
+
+Two backends are available. On Linux, inotify lets the kernel wake the
+watcher up when a file changes, costing nothing in between. Elsewhere the
+folders are listed every ``POLL_PERIOD`` seconds with ``os.scandir`` and
+the sizes and modification dates of their files are compared.
+"""
+
+import os
+import sys
+import time
+from typing import List
+
+from cogs import AstroLogging as Logger
+
+WATCH_BACKENDS = ('auto', 'poll', 'inotify')
+POLL_PERIOD = 2  # Seconds between two listings of the watched folders
+WATCH_DEBOUNCE = 5  # Seconds without change in the watched folder before converting
+MAX_WATCH_DEPTH = 3  # wgs/<user>/<container folder>/<chunk>
+
+# inotify_add_watch mask: files written, created, deleted or renamed
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+INOTIFY_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_READ_SIZE = 64 * 1024
+
+
+class PollingWatcher:
+    """Watches folders by listing them periodically."""
+
+    def __init__(self, paths: List[str], poll_period: float = POLL_PERIOD) -> None:
+        """Take a first snapshot of ``paths``.
+
+        Args:
+            paths: Folders to watch, with their subfolders down to ``MAX_WATCH_DEPTH``.
+            poll_period: Seconds between two listings.
+        """
+        self.paths = paths
+        self.poll_period = poll_period
+        self._snapshot = take_snapshot(paths)
+
+    def wait_for_change(self, timeout: float = None) -> bool:
+        """Wait until a file of the watched folders changes.
+
+        Args:
+            timeout: Maximum seconds to wait, ``None`` to wait as long as needed.
+
+        Returns:
+            bool: ``True`` if something changed since the previous call,
+            ``False`` if ``timeout`` was reached first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            delay = self.poll_period if deadline is None else min(self.poll_period, deadline - time.monotonic())
+            if delay > 0:
+                time.sleep(delay)
+
+            snapshot = take_snapshot(self.paths)
+            if snapshot != self._snapshot:
+                self._snapshot = snapshot
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """Watches folders with Linux inotify, sleeping until the kernel reports a change."""
+
+    def __init__(self, paths: List[str]) -> None:
+        """Watch ``paths`` and their subfolders down to ``MAX_WATCH_DEPTH``.
+
+        Raises:
+            OSError: If inotify is not available on this system.
+        """
+        if not sys.platform.startswith('linux'):
+            raise OSError('inotify is only available on Linux')
+
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError('inotify is not supported by the C library')
+
+        self.paths = paths
+        self._libc = libc
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._add_watches()
+
+    def wait_for_change(self, timeout: float = None) -> bool:
+        """Wait until a file of the watched folders changes, see ``PollingWatcher.wait_for_change``."""
+        import select
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return False
+
+        # Only the fact that something changed matters, events are dropped
+        try:
+            while os.read(self._fd, INOTIFY_READ_SIZE):
+                pass
+        except BlockingIOError:
+            pass
+        # Folders created since are watched as well
+        self._add_watches()
+        return True
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _add_watches(self) -> None:
+        """Watch every folder of ``paths``, folders already watched are kept as they are."""
+        for folder in _list_folders(self.paths):
+            if self._libc.inotify_add_watch(self._fd, os.fsencode(folder), INOTIFY_MASK) < 0:
+                # Removed while listing, its parent reports it
+                Logger.logPrint('Cannot watch %s', 'debug', folder)
+
+
+def create_watcher(paths: List[str], backend: str = 'auto', poll_period: float = POLL_PERIOD):
+    """Return a watcher of ``paths``.
+
+    Args:
+        paths: Folders to watch.
+        backend: ``'inotify'``, ``'poll'``, or ``'auto'`` for inotify when
+            it is available and polling otherwise.
+        poll_period: Seconds between two listings of the polling backend.
+
+    Returns:
+        InotifyWatcher or PollingWatcher: The watcher, to ``close`` once done.
+
+    Raises:
+        ValueError: If ``backend`` is unknown.
+        OSError: If ``backend`` is ``'inotify'`` and inotify is not available.
+    """
+    if backend not in WATCH_BACKENDS:
+        raise ValueError(f'Unknown watch backend: {backend}')
+
+    if backend != 'poll':
+        try:
+            watcher = InotifyWatcher(paths)
+            Logger.logPrint('Watching %s with inotify', 'debug', paths)
+            return watcher
+        except OSError as e:
+            if backend == 'inotify':
+                raise
+            Logger.logPrint('inotify not available (%s), polling instead', 'debug', e)
+
+    Logger.logPrint('Watching %s every %ss', 'debug', paths, poll_period)
+    return PollingWatcher(paths, poll_period)
+
+
+def take_snapshot(paths: List[str]) -> dict:
+    """Return the size and modification date of every file and folder of ``paths``, by path."""
+    snapshot = {}
+    for path in paths:
+        _snapshot_folder(path, 0, snapshot)
+    return snapshot
+
+
+def _snapshot_folder(folder: str, depth: int, snapshot: dict) -> None:
+    """Add the entries of ``folder`` and of its subfolders to ``snapshot``."""
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                try:
+                    entry_stat = entry.stat(follow_symlinks=False)
+                    snapshot[entry.path] = (entry_stat.st_size, entry_stat.st_mtime_ns)
+                    if depth < MAX_WATCH_DEPTH and entry.is_dir(follow_symlinks=False):
+                        _snapshot_folder(entry.path, depth + 1, snapshot)
+                except OSError:
+                    # Removed while listing the folder
+                    continue
+    except OSError:
+        pass
+
+
+def _list_folders(paths: List[str]) -> List[str]:
+    """Return ``paths`` and their subfolders down to ``MAX_WATCH_DEPTH``."""
+    folders = []
+    pending = [(path, 0) for path in paths]
+    while pending:
+        folder, depth = pending.pop()
+        folders.append(folder)
+        if depth >= MAX_WATCH_DEPTH:
+            continue
+        try:
+            with os.scandir(folder) as entries:
+                pending.extend((entry.path, depth + 1) for entry in entries if entry.is_dir(follow_symlinks=False))
+        except OSError:
+            continue
+    return folders
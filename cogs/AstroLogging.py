@@ -1,40 +1,90 @@
-"""Thin wrapper around :mod:`logging` used throughout the project."""
+"""Thin wrapper around :mod:`logging` used throughout the project.
 
+Messages accept ``%``-style arguments, formatted only if the message is
+actually logged or printed. Once ``setup_logging`` is called, records are
+written to the log file by a background thread, so that logging a debug
+message on a converting thread costs little more than queuing it.
+"""
+
+import atexit
 import logging
 import os
-from logging.handlers import TimedRotatingFileHandler
+import sys
+import uuid
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+from queue import SimpleQueue
+
+from cogs import AstroProgress
+
+LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "warning": logging.WARNING,
+    "exception": logging.ERROR,
+    "error": logging.ERROR,
+    "critical": logging.CRITICAL,
+}
+# Arguments of these types cannot change before the background thread formats the record
+IMMUTABLE_ARGS_TYPES = (str, int, float, bool, bytes, type(None), uuid.UUID)
 
+_logger = logging.getLogger()
+_listener = None
 
-def logPrint(message, msgType="info"):
+
+def logPrint(message, msgType="info", *args):
     """Log a message with the provided severity and optionally print it.
 
     Args:
-        message: Message to log.
+        message: Message to log, formatted with ``args`` if there are some.
         msgType: Logging level such as ``"info"`` or ``"debug"``.
+        *args: ``%``-style arguments of ``message``, e.g.
+            ``logPrint('Chunk written: %s', 'debug', path)``.
     """
-    message = str(message)
-    if msgType == "debug":
-        logging.debug(message)
+    level = LEVELS.get(msgType)
+    if level is None:
+        return
+
+    # Checked first so that nothing is built for a message nobody reads
+    if _logger.isEnabledFor(level):
+        # Built directly: the log format does not use the caller location,
+        # which Logger.log would look up in the stack for every record
+        record = _logger.makeRecord(_logger.name, level, "(unknown file)", 0, message, args,
+                                    sys.exc_info() if msgType == "exception" else None)
+        _logger.handle(record)
+
     if msgType == "info":
-        logging.info(message)
-        print(message)
-    if msgType == "warning":
-        logging.warning(message)
-    if msgType == "exception":
-        logging.exception(message)
-    if msgType == "error":
-        logging.error(message)
-    if msgType == "critical":
-        logging.critical(message)
+        # A progress bar may be drawn on the current line
+        AstroProgress.clear_progress_line()
+        print(str(message) % args if args else message)
+
+
+class _LazyQueueHandler(QueueHandler):
+    """Queue handler leaving the formatting of records to the background thread.
+
+    Records whose arguments may be modified in the meantime, or carrying an
+    exception, are still formatted when they are queued.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info or record.stack_info or not isinstance(record.args, tuple) or \
+                not all(isinstance(arg, IMMUTABLE_ARGS_TYPES) for arg in record.args):
+            return super().prepare(record)
+        return record
 
 
 def setup_logging(astroPath: str, console_print: bool = True) -> None:
     """Configure the logging subsystem.
 
+    Records are queued and written to the log file by a background thread,
+    stopped by ``shutdown_logging`` (registered to run at exit).
+
     Args:
         astroPath: Base directory where log files should be stored.
         console_print: Unused legacy flag to enable console output.
     """
+    global _listener
+    shutdown_logging()
+
     formatter = logging.Formatter(
         '%(asctime)s - %(levelname)-6s %(message)s', datefmt="%Y-%m-%d %H:%M:%S")
     rootLogger = logging.getLogger()
@@ -48,4 +98,25 @@ def setup_logging(astroPath: str, console_print: bool = True) -> None:
         os.path.join(astroPath, 'logs', "astro_converter.log"), 'midnight', 1)
     fileLogHandler.setFormatter(formatter)
 
-    rootLogger.addHandler(fileLogHandler)
+    queue = SimpleQueue()
+    rootLogger.addHandler(_LazyQueueHandler(queue))
+    _listener = QueueListener(queue, fileLogHandler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Write the records still queued and close the log file."""
+    global _listener
+    if _listener is None:
+        return
+
+    rootLogger = logging.getLogger()
+    for handler in list(rootLogger.handlers):
+        if isinstance(handler, _LazyQueueHandler):
+            rootLogger.removeHandler(handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+    atexit.unregister(shutdown_logging)
@@ -1,11 +1,55 @@
 """Utilities for locating and backing up Microsoft/Xbox save folders."""
 
 import os
+from cogs import AstroBackup
 from cogs import AstroLogging as Logger
+from cogs import AstroProfiler
 import utils
 import re
 import glob
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import List, Optional
+from cogs.AstroSaveContainer import AstroSaveContainer, CHUNK_METADATA, CHUNK_METADATA_SIZE, CONTAINER_HEADER
+from cogs.AstroSaveContainer import scan_save_folder
+
+MAX_DISCOVERY_DEPTH = 4  # Save folders are found at wgs/<user>/<container folder>
+# User-defined name + '$' + 'c' for a creative save + YYYY.MM.dd-HH.mm.ss
+SAVE_NAME_PATTERN = re.compile(r'([A-Za-z0-9_]+)\$(c?)(\d{4}\.\d{2}\.\d{2}-\d{2}\.\d{2}\.\d{2})')
+
+
+class SaveDetails:
+    """A save of a Microsoft save folder, as listed by ``get_save_details``."""
+
+    __slots__ = ('name', 'date', 'date_text', 'is_creative', 'chunk_count', 'size', 'container_path', 'index')
+
+    def __init__(self, name: str, date: Optional[datetime], date_text: str, is_creative: bool,
+                 chunk_count: int, size: Optional[int], container_path: str, index: int) -> None:
+        """Describe a save.
+
+        Args:
+            name: User-defined part of the save name.
+            date: Date of the save, ``None`` if ``date_text`` is not a valid date.
+            date_text: Date as written in the save name, e.g. ``2020.06.14-17.40.07``.
+            is_creative: ``True`` for a creative mode save.
+            chunk_count: Number of chunk files of the save.
+            size: Size of the save in bytes, ``None`` if a chunk is missing.
+            container_path: Container of the save.
+            index: Position of the save in its container.
+        """
+        self.name = name
+        self.date = date
+        self.date_text = date_text
+        self.is_creative = is_creative
+        self.chunk_count = chunk_count
+        self.size = size
+        self.container_path = container_path
+        self.index = index
+
+    @property
+    def date_string(self) -> str:
+        """Date of the save to display, e.g. ``2020-06-14 17:40:07``."""
+        return self.date.strftime('%Y-%m-%d %H:%M:%S') if self.date is not None else self.date_text
 
 
 def get_microsoft_save_folder() -> str:
@@ -18,14 +62,12 @@ def get_microsoft_save_folder() -> str:
         FileNotFoundError: If no folder can be located.
     """
 
-    try:
-        target = os.environ['LOCALAPPDATA'] + '\\Packages\\SystemEraSoftworks*\\SystemAppData\\wgs'
-    except KeyError:
+    if 'LOCALAPPDATA' not in os.environ:
         Logger.logPrint("Local Appdata are missing, maybe you're on linux ?")
         Logger.logPrint("Press any key to exit")
         utils.wait_and_exit(1)
 
-    microsoft_save_paths = list(glob.iglob(target))
+    microsoft_save_paths = get_wgs_folders()
 
     for path in microsoft_save_paths:
         Logger.logPrint(f'SES path found in appadata: {path}', 'debug')
@@ -67,8 +109,8 @@ def seek_microsoft_save_folder(appdata_path: str) -> str:
     for i, folder in enumerate(folders, 1):
         Logger.logPrint(f"\t{i}) {folder}")
         Logger.logPrint("\tFolder content:")
-        for name, date in get_save_details(folder):
-            Logger.logPrint(f"\t\t{name} - {date}")
+        for details in get_save_details(folder):
+            Logger.logPrint(f"\t\t{details.name} - {details.date_string}")
 
     while True:
         choice = input()
@@ -84,9 +126,14 @@ def seek_microsoft_save_folder(appdata_path: str) -> str:
     return folders[index - 1]
 
 
+@AstroProfiler.timed('discovery')
 def get_save_folders_from_path(path: str) -> list:
     """Return all subdirectories containing a valid container file.
 
+    Folders are listed with ``os.scandir``. A folder holding a save container
+    is not explored further, neither are folders deeper than
+    ``MAX_DISCOVERY_DEPTH``.
+
     Args:
         path: Directory to scan recursively.
 
@@ -94,89 +141,165 @@ def get_save_folders_from_path(path: str) -> list:
         list: Paths of detected save folders.
     """
     microsoft_save_folders = []
+    _scan_folder(path, 0, microsoft_save_folders)
+    return microsoft_save_folders
 
-    for root, _, files in os.walk(path):
-        for file in files:
-            if re.search(r'^container\.', file):
-                container_full_path = utils.join_paths(root, file)
 
-                Logger.logPrint(f'Container file found: {container_full_path}', 'debug')
+def get_save_folders_from_paths(paths: list) -> list:
+    """Return the save folders found in several directories, scanned in parallel.
 
-                container_text = read_container_text_from_path(container_full_path)
+    Args:
+        paths: Directories to scan, e.g. one per ``SystemEraSoftworks*`` package.
 
-                if do_container_text_match_date(container_text):
-                    Logger.logPrint(f'Matching save folder: {root}', 'debug')
-                    microsoft_save_folders.append(root)
+    Returns:
+        list: Paths of detected save folders, in the order of ``paths``.
+    """
+    if len(paths) <= 1:
+        return [folder for path in paths for folder in get_save_folders_from_path(path)]
 
-    return microsoft_save_folders
+    with ThreadPoolExecutor(max_workers=len(paths)) as executor:
+        folders_per_path = list(executor.map(get_save_folders_from_path, paths))
+    return [folder for folders in folders_per_path for folder in folders]
 
 
-def get_save_details(folder_path: str):
-    """Return list of ``(save_name, date_str)`` for saves in ``folder_path``."""
-    container_files = glob.glob(utils.join_paths(folder_path, 'container.*'))
-    if not container_files:
-        return []
+def _scan_folder(folder: str, depth: int, microsoft_save_folders: list) -> None:
+    """Add ``folder`` or its subfolders to ``microsoft_save_folders`` if they hold a save container."""
+    subfolders = []
+    is_save_folder = False
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subfolders.append(entry.path)
+                elif entry.name.startswith('container.') and entry.is_file():
+                    Logger.logPrint('Container file found: %s', 'debug', entry.path)
+                    is_save_folder = is_save_folder or is_save_container(entry.path)
+    except OSError as e:
+        Logger.logPrint('Cannot scan %s: %s', 'debug', folder, e)
+        return
+
+    if is_save_folder:
+        Logger.logPrint('Matching save folder: %s', 'debug', folder)
+        microsoft_save_folders.append(folder)
+    elif depth < MAX_DISCOVERY_DEPTH:
+        for subfolder in subfolders:
+            _scan_folder(subfolder, depth + 1, microsoft_save_folders)
+
+
+def is_save_container(path: str) -> bool:
+    """Check whether a container file holds Astroneer saves.
+
+    Only the header and the first chunk metadata are read: the first save
+    name must be followed by its date.
+    """
+    try:
+        with open(path, 'rb') as container_file:
+            beginning = container_file.read(CONTAINER_HEADER.size + CHUNK_METADATA_SIZE)
+    except OSError:
+        return False
+
+    if len(beginning) < CONTAINER_HEADER.size + CHUNK_METADATA_SIZE:
+        return False
+
+    file_type, chunk_count = CONTAINER_HEADER.unpack_from(beginning)
+    if file_type != b'\x04\x00' or chunk_count == 0:
+        return False
+
+    raw_name = CHUNK_METADATA.unpack_from(beginning, CONTAINER_HEADER.size)[0]
+    return bool(do_container_text_match_date(raw_name.decode('utf-16le', errors='ignore')))
+
+
+@AstroProfiler.timed('save_details')
+def get_save_details(folder_path: str) -> List[SaveDetails]:
+    """List the saves of every container of a Microsoft save folder.
+
+    The folder is listed once for all its containers, which are read with
+    ``AstroSaveContainer`` so that the container cache is used when it is
+    set up. Unreadable containers and saves whose name has no date are left
+    out.
+
+    Args:
+        folder_path: Microsoft save folder.
 
-    container_path = container_files[0]
-    with open(container_path, 'rb') as container_file:
-        text = container_file.read().decode('utf-16le', errors='ignore')
+    Returns:
+        List[SaveDetails]: Saves in the order of their containers.
+    """
+    try:
+        containers_paths, files_sizes = scan_save_folder(folder_path)
+    except OSError as e:
+        Logger.logPrint('Cannot list %s: %s', 'debug', folder_path, e)
+        return []
 
-    pattern = re.compile(r'([A-Za-z0-9_]+)\$c?(\d{4}\.\d{2}\.\d{2}-\d{2}\.\d{2}\.\d{2})')
     details = []
-    for name, date_str in pattern.findall(text):
+    for container_path in containers_paths:
         try:
-            dt = datetime.strptime(date_str, '%Y.%m.%d-%H.%M.%S')
-            formatted_date = dt.strftime('%Y-%m-%d %H:%M:%S')
-        except ValueError:
-            formatted_date = date_str
-        details.append((name, formatted_date))
+            container = AstroSaveContainer(container_path, files_sizes)
+            saves = list(container.iter_saves())
+        except Exception as e:
+            Logger.logPrint('Cannot read the saves of %s: %s', 'debug', container_path, e)
+            continue
+
+        for index, save in enumerate(saves):
+            match = SAVE_NAME_PATTERN.match(save.name)
+            if not match:
+                continue
+            name, creative_flag, date_text = match.groups()
+            try:
+                date = datetime.strptime(date_text, '%Y.%m.%d-%H.%M.%S')
+            except ValueError:
+                date = None
+            chunks_sizes = container.get_chunks_sizes(index)
+            details.append(SaveDetails(name, date, date_text, creative_flag == 'c', len(chunks_sizes),
+                                       None if -1 in chunks_sizes else sum(chunks_sizes), container_path, index))
     return details
 
 
-def read_container_text_from_path(path: str) -> str:
-    """Read a container file and return its decoded text."""
-    with open(path, 'rb') as container_file:
-        binary_content = container_file.read()
-        return binary_content.decode('utf-16le', errors='ignore')
-
-
 def do_container_text_match_date(text: str) -> bool:
-    """Check whether container text contains a date pattern."""
-    return re.search(r'\$\d{4}\.\d{2}\.\d{2}', text)
+    """Check whether container text contains a date pattern (``$c`` for creative saves)."""
+    return re.search(r'\$c?\d{4}\.\d{2}\.\d{2}', text)
 
 
 def backup_microsoft_save_folder(to_path: str) -> str:
     """Copy the Microsoft save folder to ``to_path``.
 
     Args:
-        to_path: Destination directory for the backup.
+        to_path: Destination of the backup, an archive extension is added
+            depending on the backup format (see ``AstroBackup.configure_backups``).
 
     Returns:
         str: Path to the original save folder that was backed up.
     """
     astroneer_save_folder = get_microsoft_save_folder()
-    utils.copy_files(astroneer_save_folder, to_path)
+    AstroBackup.save_backup(astroneer_save_folder, to_path)
 
     return astroneer_save_folder
 
 
-def find_microsoft_save_folders() -> list:
-    """Find all Microsoft save folders on the system."""
-    save_folders = []
+def get_wgs_folders() -> list:
+    """Return the ``wgs`` folders of every installed Microsoft version of Astroneer.
 
+    Returns:
+        list: Paths of the folders, empty if none or if Local Appdata are missing.
+    """
     try:
         target = os.environ['LOCALAPPDATA'] + '\\Packages\\SystemEraSoftworks*\\SystemAppData\\wgs'
     except KeyError:
+        return []
+    return list(glob.iglob(target))
+
+
+def find_microsoft_save_folders() -> list:
+    """Find all Microsoft save folders on the system."""
+    if 'LOCALAPPDATA' not in os.environ:
         Logger.logPrint("Local Appdata are missing, maybe you're on linux ?")
         Logger.logPrint("Press any key to exit")
         utils.wait_and_exit(1)
 
-    for path in glob.iglob(target):
-        save_folders.extend(get_save_folders_from_path(path))
+    save_folders = get_save_folders_from_paths(get_wgs_folders())
 
-    Logger.logPrint(f'{len(save_folders)} save folders found', 'debug')
+    Logger.logPrint('%d save folders found', 'debug', len(save_folders))
     for folder in save_folders:
-        Logger.logPrint(f'Save folder found: {folder}', 'debug')
+        Logger.logPrint('Save folder found: %s', 'debug', folder)
 
     if not save_folders:
         raise FileNotFoundError
@@ -185,10 +308,23 @@ def find_microsoft_save_folders() -> list:
 
 
 def backup_microsoft_save_folders(folders: list, to_path: str) -> list:
-    """Backup multiple Microsoft save folders into numbered directories."""
+    """Backup multiple Microsoft save folders into numbered directories.
+
+    Files unchanged since the previous backup (the latest folder named like
+    ``to_path``) are hard-linked from its ``Backup_{i}`` directories. With an
+    archive backup format, ``Backup_{i}`` archives are written in parallel
+    instead.
+    """
     utils.make_dir_if_doesnt_exists(to_path)
-    for i, folder in enumerate(folders, 1):
-        destination = utils.join_paths(to_path, f'Backup_{i}')
-        utils.copy_files(folder, destination)
+    destinations = [utils.join_paths(to_path, f'Backup_{i}') for i in range(1, len(folders) + 1)]
+
+    if AstroBackup.get_backup_format() != 'dir':
+        AstroBackup.archive_folders(list(zip(folders, destinations)))
+        return folders
+
+    previous_backup = AstroBackup.find_previous_snapshot(to_path)
+    for i, (folder, destination) in enumerate(zip(folders, destinations), 1):
+        previous_destination = utils.join_paths(previous_backup, f'Backup_{i}') if previous_backup else None
+        AstroBackup.create_snapshot(folder, destination, previous_destination)
 
     return folders
@@ -0,0 +1,244 @@
+"""Timing of the stages of a conversion.
+
+Key functions are wrapped in spans (see ``span`` and ``timed``) recording
+when they ran, on which thread and how many bytes they processed. Spans
+cost a single check while profiling is disabled. Once enabled with
+``start_profiling``, ``stop_profiling`` prints a table of the time and bytes
+of each stage and writes the spans as a Chrome trace, which can be opened
+in ``chrome://tracing`` or https://ui.perfetto.dev.
+"""
+
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+from cogs import AstroLogging as Logger
+
+MEGABYTE = 1024 * 1024
+PROFILE_FOLDER_NAME = 'profiles'
+
+_settings = {'enabled': False}
+_spans = []  # (name, start_ns, duration_ns, thread_id, byte_count) of the spans ended so far
+_thread_names = {}
+_session = {'start_ns': 0, 'folder': None, 'name': None, 'cprofile': None}
+
+
+class AstroSpan:
+    """A stage being timed, to which processed bytes can be added.
+
+    Used as a context manager, see ``span``.
+    """
+
+    def __init__(self, name: str, byte_count: int = 0) -> None:
+        self.name = name
+        self.byte_count = byte_count
+        self._start = 0
+
+    def __enter__(self) -> 'AstroSpan':
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        _record(self, self._start)
+
+    def add_bytes(self, byte_count: int) -> None:
+        """Count ``byte_count`` more bytes processed by the stage."""
+        self.byte_count += byte_count
+
+
+class _DisabledSpan:
+    """Span returned while profiling is disabled, which records nothing."""
+
+    def __enter__(self) -> '_DisabledSpan':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        pass
+
+    def add_bytes(self, byte_count: int) -> None:
+        pass
+
+
+_disabled_span = _DisabledSpan()
+
+
+def span(name: str, byte_count: int = 0):
+    """Return a context manager timing its ``with`` block as the stage ``name``.
+
+    Args:
+        name: Name of the stage, spans of the same name are summed up.
+        byte_count: Bytes processed by the stage, more can be added with
+            ``AstroSpan.add_bytes``.
+
+    Returns:
+        AstroSpan: A new span, or a shared one recording nothing if
+        profiling is disabled.
+    """
+    if not _settings['enabled']:
+        return _disabled_span
+    return AstroSpan(name, byte_count)
+
+
+def timed(name: str, count_bytes: Callable = None):
+    """Decorate a function so that each call is timed as the stage ``name``.
+
+    Args:
+        name: Name of the stage.
+        count_bytes: Returns the bytes processed by a call from its result,
+            only called while profiling.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _settings['enabled']:
+                return function(*args, **kwargs)
+
+            current_span = AstroSpan(name)
+            start = time.perf_counter_ns()
+            try:
+                result = function(*args, **kwargs)
+                if count_bytes is not None:
+                    current_span.add_bytes(count_bytes(result))
+                return result
+            finally:
+                _record(current_span, start)
+        return wrapper
+    return decorator
+
+
+def _record(current_span: AstroSpan, start: int) -> None:
+    """Keep an ended span."""
+    thread = threading.current_thread()
+    _thread_names.setdefault(thread.ident, thread.name)
+    # list.append is atomic, spans can end on several threads at once
+    _spans.append((current_span.name, start, time.perf_counter_ns() - start, thread.ident,
+                   current_span.byte_count))
+
+
+def is_profiling() -> bool:
+    """Return ``True`` between ``start_profiling`` and ``stop_profiling``."""
+    return _settings['enabled']
+
+
+def start_profiling(astroPath: str, use_cprofile: bool = False) -> None:
+    """Record spans from now on, and optionally profile every call of the main thread.
+
+    Args:
+        astroPath: Base directory where the profiles are written, in a
+            ``profiles`` folder.
+        use_cprofile: Also run ``cProfile`` (main thread only), its
+            statistics are dumped by ``stop_profiling``.
+    """
+    _spans.clear()
+    _thread_names.clear()
+    _session['start_ns'] = time.perf_counter_ns()
+    _session['folder'] = os.path.join(astroPath, PROFILE_FOLDER_NAME)
+    _session['name'] = datetime.now().strftime('profile_%Y.%m.%d-%H.%M.%S')
+    _session['cprofile'] = None
+    _settings['enabled'] = True
+
+    if use_cprofile:
+        import cProfile
+        _session['cprofile'] = cProfile.Profile()
+        _session['cprofile'].enable()
+    atexit.register(stop_profiling)
+
+
+def stop_profiling() -> Optional[str]:
+    """Stop recording, print the stages table and write the profile files.
+
+    Returns:
+        str: Path of the Chrome trace, ``None`` if profiling was not started.
+    """
+    if not _settings['enabled']:
+        return None
+    _settings['enabled'] = False
+    atexit.unregister(stop_profiling)
+
+    profiler = _session['cprofile']
+    if profiler is not None:
+        profiler.disable()
+
+    for line in format_stages_table(get_stages()):
+        Logger.logPrint(line)
+
+    os.makedirs(_session['folder'], exist_ok=True)
+    base_path = os.path.join(_session['folder'], _session['name'])
+    trace_path = write_chrome_trace(base_path + '.trace.json')
+    Logger.logPrint(f'Chrome trace written to {trace_path}')
+    if profiler is not None:
+        profiler.dump_stats(base_path + '.prof')
+        Logger.logPrint(f'cProfile statistics written to {base_path}.prof')
+    return trace_path
+
+
+def get_stages() -> dict:
+    """Sum up the spans recorded so far by stage.
+
+    Returns:
+        dict: ``calls``, ``seconds`` (summed over the calls), ``wall_seconds``
+        (time during which at least one call was running) and ``bytes`` of
+        each stage, by name, in the order the stages were first entered.
+    """
+    stages = {}
+    running_until = {}  # End of the calls of each stage merged so far
+    for name, start, duration, _, byte_count in sorted(_spans, key=lambda recorded_span: recorded_span[1]):
+        stage = stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'wall_seconds': 0.0, 'bytes': 0})
+        stage['calls'] += 1
+        stage['seconds'] += duration / 1e9
+        stage['bytes'] += byte_count
+
+        # Calls running at the same time on other threads count once in the wall time
+        end = start + duration
+        previous_end = running_until.get(name, start)
+        stage['wall_seconds'] += max(end - max(start, previous_end), 0) / 1e9
+        running_until[name] = max(end, previous_end)
+    return stages
+
+
+def format_stages_table(stages: dict) -> list:
+    """Return the lines of a table of the stages, see ``get_stages``.
+
+    Time of a stage includes the stages run within it. The throughput is
+    computed over the wall time of the stage.
+    """
+    lines = [f'{"Stage":<24} {"Calls":>7} {"Time (s)":>10} {"Wall (s)":>10} {"MB":>10} {"MB/s":>9}']
+    for name, stage in stages.items():
+        wall_seconds = stage['wall_seconds']
+        throughput = stage['bytes'] / MEGABYTE / wall_seconds if stage['bytes'] and wall_seconds else 0
+        lines.append(f'{name:<24} {stage["calls"]:>7} {stage["seconds"]:>10.3f} {wall_seconds:>10.3f} '
+                     f'{stage["bytes"] / MEGABYTE:>10.1f} {throughput:>9.1f}')
+    return lines
+
+
+def write_chrome_trace(path: str) -> str:
+    """Write the spans recorded so far in the Chrome trace event format.
+
+    Returns:
+        str: ``path``.
+    """
+    pid = os.getpid()
+    events = [
+        {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': thread_id, 'args': {'name': thread_name}}
+        for thread_id, thread_name in _thread_names.items()
+    ]
+    for name, start, duration, thread_id, byte_count in _spans:
+        events.append({
+            'name': name,
+            'cat': 'astro',
+            'ph': 'X',
+            'ts': (start - _session['start_ns']) / 1000,
+            'dur': duration / 1000,
+            'pid': pid,
+            'tid': thread_id,
+            'args': {'bytes': byte_count},
+        })
+
+    with open(path, 'w') as trace_file:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, trace_file)
+    return path
@@ -0,0 +1,187 @@
+"""Progress of long file operations, measured in bytes actually copied.
+
+A progress is advanced by the copy functions (see the ``on_progress``
+arguments of ``utils``) and redrawn at most ``REFRESH_PERIOD`` times per
+second, each frame being a single write. When the output is not a
+terminal, JSON lines are written instead of a bar.
+"""
+
+import json
+import sys
+import threading
+import time
+
+MEGABYTE = 1024 * 1024
+PROGRESS_MODES = ('auto', 'bar', 'json', 'none')
+REFRESH_PERIOD = 0.1  # Seconds between two frames of a bar
+JSON_REFRESH_PERIOD = 1.0  # Seconds between two JSON progress lines
+BAR_WIDTH = 20
+
+_settings = {'mode': 'auto'}
+_console_lock = threading.Lock()
+_active_bar = None  # Bar currently drawn on the console
+
+
+def configure_progress(mode: str = 'auto') -> None:
+    """Set how the progresses created from now on are shown.
+
+    Args:
+        mode: ``'bar'``, ``'json'``, ``'none'``, or ``'auto'`` for a bar on a
+            terminal and JSON lines otherwise.
+
+    Raises:
+        ValueError: If ``mode`` is unknown.
+    """
+    if mode not in PROGRESS_MODES:
+        raise ValueError(f'Unknown progress mode: {mode}')
+    _settings['mode'] = mode
+
+
+def clear_progress_line() -> None:
+    """Erase the bar being drawn, so that a message can be printed on its line.
+
+    The bar is drawn again on its next frame.
+    """
+    global _active_bar
+    with _console_lock:
+        if _active_bar is not None:
+            _active_bar._erase()
+            _active_bar = None
+
+
+class AstroProgress:
+    """Thread-safe byte counter drawn as a bar with its throughput and ETA."""
+
+    def __init__(self, label: str, total_bytes: int, stream=None, mode: str = None) -> None:
+        """Start a progress.
+
+        Args:
+            label: Short description of the operation.
+            total_bytes: Number of bytes expected.
+            stream: Where to write, ``sys.stdout`` if ``None``.
+            mode: See ``configure_progress``, the configured mode if ``None``.
+        """
+        self.label = label
+        self.total_bytes = total_bytes
+        self.done_bytes = 0
+        self._stream = stream if stream is not None else sys.stdout
+        self._mode = mode or _settings['mode']
+        if self._mode == 'auto':
+            is_terminal = getattr(self._stream, 'isatty', lambda: False)()
+            self._mode = 'bar' if is_terminal else 'json'
+
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._last_frame = None
+        self._frame_width = 0
+        self._is_finished = False
+
+        if self._mode == 'json':
+            self._write_json('start')
+
+    def __enter__(self) -> 'AstroProgress':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.finish()
+
+    def advance(self, byte_count: int) -> None:
+        """Count ``byte_count`` more bytes, redrawing if the last frame is old enough.
+
+        Can be called from several threads at once.
+        """
+        with self._lock:
+            self.done_bytes += byte_count
+            now = time.monotonic()
+            period = JSON_REFRESH_PERIOD if self._mode == 'json' else REFRESH_PERIOD
+            if self._is_finished or (self._last_frame is not None and now - self._last_frame < period):
+                return
+            self._last_frame = now
+            self._draw(now)
+
+    def finish(self) -> None:
+        """Draw the final state and release the console line."""
+        global _active_bar
+        with self._lock:
+            if self._is_finished:
+                return
+            self._is_finished = True
+            now = time.monotonic()
+            if self._mode == 'bar':
+                with _console_lock:
+                    self._stream.write(self._render(now) + '\n')
+                    self._stream.flush()
+                    if _active_bar is self:
+                        _active_bar = None
+            elif self._mode == 'json':
+                self._write_json('end', now)
+
+    @property
+    def throughput(self) -> float:
+        """Bytes per second since the start."""
+        return self.done_bytes / max(time.monotonic() - self._start, 1e-9)
+
+    def _draw(self, now: float) -> None:
+        """Write the current frame, the lock must be held."""
+        global _active_bar
+        if self._mode == 'json':
+            self._write_json('progress', now)
+        elif self._mode == 'bar':
+            with _console_lock:
+                self._stream.write(self._render(now))
+                self._stream.flush()
+                _active_bar = self
+
+    def _render(self, now: float) -> str:
+        """Return the frame of the bar, starting at the beginning of the line."""
+        elapsed = max(now - self._start, 1e-9)
+        rate = self.done_bytes / elapsed
+        ratio = min(self.done_bytes / self.total_bytes, 1.0) if self.total_bytes else 1.0
+        filled = int(ratio * BAR_WIDTH)
+        if self._is_finished:
+            timing = f'in {_format_duration(elapsed)}'
+        elif rate > 0:
+            timing = f'ETA {_format_duration(max(self.total_bytes - self.done_bytes, 0) / rate)}'
+        else:
+            timing = 'ETA --:--'
+
+        text = (f'{self.label} [{"■" * filled}{" " * (BAR_WIDTH - filled)}] {ratio:6.1%} '
+                f'{self.done_bytes / MEGABYTE:.1f}/{self.total_bytes / MEGABYTE:.1f} MB '
+                f'{rate / MEGABYTE:.1f} MB/s {timing}')
+        # Spaces erase what remains of a longer previous frame
+        frame = '\r' + text.ljust(self._frame_width)
+        self._frame_width = len(text)
+        return frame
+
+    def _erase(self) -> None:
+        """Blank the line of the bar, the console lock must be held."""
+        self._stream.write('\r' + ' ' * self._frame_width + '\r')
+        self._stream.flush()
+        self._frame_width = 0
+
+    def _write_json(self, event: str, now: float = None) -> None:
+        """Write one JSON line describing the progress."""
+        elapsed = (now or time.monotonic()) - self._start
+        rate = self.done_bytes / max(elapsed, 1e-9)
+        line = {
+            'event': event,
+            'label': self.label,
+            'done_bytes': self.done_bytes,
+            'total_bytes': self.total_bytes,
+            'elapsed': round(elapsed, 3),
+            'bytes_per_second': round(rate),
+        }
+        if event != 'end':
+            line['eta'] = round(max(self.total_bytes - self.done_bytes, 0) / rate, 1) if rate > 0 else None
+        with _console_lock:
+            self._stream.write(json.dumps(line) + '\n')
+            self._stream.flush()
+
+
+def _format_duration(seconds: float) -> str:
+    """Format a duration as ``MM:SS``, or ``HH:MM:SS`` above an hour."""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f'{hours}:{minutes:02}:{seconds:02}'
+    return f'{minutes:02}:{seconds:02}'
@@ -0,0 +1,123 @@
+"""Waiting for Astroneer to stop writing to its save folders.
+
+Containers must not be edited while the game may still update them. Rather
+than always waiting a fixed time, the modification dates of the save
+folders are watched and the wait ends as soon as nothing has been written
+for a while, immediately if the game has not saved recently.
+"""
+
+import os
+import time
+from typing import List
+
+from cogs import AstroLogging as Logger
+from cogs.LoadingBar import LoadingBar
+
+WAIT_MODES = ('auto', 'fixed')
+QUIET_PERIOD = 20  # Seconds without any write before the game is considered closed
+FIXED_WAIT = 15  # Seconds waited in 'fixed' mode
+POLL_PERIOD = 0.5  # Seconds between two checks of the modification dates
+MAX_WATCH_DEPTH = 3  # wgs/<user>/<container folder>/<chunk>
+
+
+def wait_until_idle(paths: List[str], wait_mode: str = 'auto', quiet_period: float = QUIET_PERIOD) -> float:
+    """Wait until it is safe to edit the save folders in ``paths``.
+
+    Args:
+        paths: Folders (or files) the game writes to, missing ones are ignored.
+        wait_mode: ``'auto'`` to wait for ``quiet_period`` seconds without
+            any write, ``'fixed'`` to always wait ``FIXED_WAIT`` seconds.
+        quiet_period: Seconds without write required in ``'auto'`` mode.
+
+    Returns:
+        float: Seconds waited.
+
+    Raises:
+        ValueError: If ``wait_mode`` is unknown.
+    """
+    if wait_mode not in WAIT_MODES:
+        raise ValueError(f'Unknown wait mode: {wait_mode}')
+
+    start = time.monotonic()
+    if wait_mode == 'fixed':
+        LoadingBar(FIXED_WAIT).start_loading()
+    else:
+        wait_for_quiescence(paths, quiet_period)
+    return time.monotonic() - start
+
+
+def wait_for_quiescence(paths: List[str], quiet_period: float = QUIET_PERIOD,
+                        poll_period: float = POLL_PERIOD, timeout: float = None) -> bool:
+    """Wait until nothing in ``paths`` has been modified for ``quiet_period`` seconds.
+
+    Args:
+        paths: Folders (or files) to watch, missing ones are ignored.
+        quiet_period: Seconds without modification to wait for.
+        poll_period: Maximum seconds between two checks.
+        timeout: Maximum seconds to wait, ``None`` to wait as long as needed.
+
+    Returns:
+        bool: ``True`` once quiet, ``False`` if ``timeout`` was reached first.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    is_waiting = False
+
+    while True:
+        idle_time = get_idle_time(paths)
+        if idle_time >= quiet_period:
+            if is_waiting:
+                Logger.logPrint('\nThe save folder is not modified anymore')
+            return True
+
+        if not is_waiting:
+            Logger.logPrint(f'The save folder was modified {idle_time:.0f}s ago, waiting until it has not been '
+                            f'modified for {quiet_period:.0f}s. Please make sure Astroneer is closed.')
+            is_waiting = True
+
+        delay = min(quiet_period - idle_time, poll_period)
+        if deadline is not None:
+            delay = min(delay, deadline - time.monotonic())
+            if delay <= 0:
+                Logger.logPrint(f'Save folder still modified after {timeout:.0f}s', 'debug')
+                return False
+        time.sleep(delay)
+
+
+def get_idle_time(paths: List[str]) -> float:
+    """Return the seconds elapsed since the last modification in ``paths``."""
+    last_modification = max((get_last_modification(path) for path in paths), default=0.0)
+    return max(0.0, time.time() - last_modification)
+
+
+def get_last_modification(path: str, depth: int = 0) -> float:
+    """Return the latest modification date of ``path`` and of what it contains.
+
+    Folders are explored down to ``MAX_WATCH_DEPTH`` levels. The date of a
+    folder changes when a file is created, renamed or deleted in it.
+
+    Returns:
+        float: Timestamp of the last modification, ``0`` if ``path`` is missing.
+    """
+    try:
+        last_modification = os.stat(path).st_mtime
+    except OSError:
+        return 0.0
+
+    if depth >= MAX_WATCH_DEPTH or not os.path.isdir(path):
+        return last_modification
+
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        entry_modification = get_last_modification(entry.path, depth + 1)
+                    else:
+                        entry_modification = entry.stat().st_mtime
+                except OSError:
+                    # Removed while listing the folder, which changed the folder date
+                    continue
+                last_modification = max(last_modification, entry_modification)
+    except OSError:
+        pass
+    return last_modification
@@ -4,18 +4,60 @@ from __future__ import annotations
 import os
 import re
 import uuid
-from typing import List, Tuple
-from io import BytesIO
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from typing import Callable, List, Sequence, Tuple
 
 from cogs import AstroLogging as Logger
-from utils import is_a_file, list_folder_content, join_paths
+from cogs import AstroProfiler
+from utils import is_a_file, is_path_exists, list_folder_content, join_paths, concatenate_files, copy_file_slice
 
 
 XBOX_CHUNK_SIZE = int.from_bytes(b'\x01\x00\x00\x00', byteorder='big')
+XBOX_WRITE_WORKERS = 4  # Chunk files of a save written at the same time
+
+
+def guid_to_chunk_name(guid: bytes) -> str:
+    """Return the chunk file name of a GUID stored in a container.
+
+    Same result as ``uuid.UUID(bytes_le=guid).hex.upper()``, without building
+    an intermediate ``UUID`` object.
+
+    Args:
+        guid: 16 bytes GUID, in little-endian layout.
+
+    Returns:
+        str: Uppercase hexadecimal file name of the chunk.
+    """
+    return guid_to_uuid_bytes(guid).hex().upper()
+
+
+def guid_to_uuid_bytes(guid: bytes) -> bytes:
+    """Return the big-endian bytes of a GUID stored in a container.
+
+    Same result as ``uuid.UUID(bytes_le=guid).bytes``.
+
+    Args:
+        guid: 16 bytes GUID, in little-endian layout.
+
+    Returns:
+        bytes: The GUID in the layout of ``uuid.UUID.bytes``.
+    """
+    return guid[3::-1] + guid[5:3:-1] + guid[7:5:-1] + guid[8:]
+
+
+def get_xbox_chunk_count(save_size: int, chunk_size: int = XBOX_CHUNK_SIZE) -> int:
+    """Return the number of Xbox chunks a Steam save of ``save_size`` bytes is split into."""
+    return max(1, -(-save_size // chunk_size))
 
 
 class AstroSave:
-    """In-memory representation of an Astroneer save."""
+    """In-memory representation of an Astroneer save.
+
+    Chunks are kept as a single block of raw 16 bytes UUIDs, their file
+    names are only formatted when ``chunks_names`` is read.
+    """
+
+    __slots__ = ('name', 'chunks_guids')
 
     def __init__(self, save_name: str, chunks_names: List[str]) -> None:
         """Create a new ``AstroSave`` instance.
@@ -23,9 +65,55 @@ class AstroSave:
         Args:
             save_name: Name of the save.
             chunks_names: Names of the chunks constituting the save.
+
+        Raises:
+            ValueError: If a chunk name is not a 32 digits hexadecimal UUID.
         """
         self.name = save_name  # User-defined save name + '$' + YYYY.MM.dd-HH.mm.ss
-        self.chunks_names = chunks_names  # Names of the all the chunks composing the save
+        self.chunks_names = chunks_names
+
+    @classmethod
+    def from_guids(cls, save_name: str, chunks_guids: bytes) -> 'AstroSave':
+        """Create an ``AstroSave`` from the raw UUIDs of its chunks.
+
+        Args:
+            save_name: Name of the save.
+            chunks_guids: ``uuid.UUID.bytes`` of each chunk, concatenated.
+        """
+        save = cls.__new__(cls)
+        save.name = save_name
+        save.chunks_guids = bytes(chunks_guids)  # 16 bytes per chunk, in order
+        return save
+
+    def __repr__(self) -> str:
+        return f'AstroSave({self.name!r}, {self.chunks_names!r})'
+
+    @property
+    def chunks_names(self) -> Tuple[str, ...]:
+        """Names of the all the chunks composing the save, built on each access.
+
+        The names are a tuple built from ``chunks_guids``: changing them in
+        place is an error, a new sequence must be assigned with the setter.
+        """
+        guids = self.chunks_guids
+        return tuple(guids[i:i + 16].hex().upper() for i in range(0, len(guids), 16))
+
+    @chunks_names.setter
+    def chunks_names(self, chunks_names: Sequence[str]) -> None:
+        if any(len(chunk_name) != 32 for chunk_name in chunks_names):
+            raise ValueError(f'Invalid chunk names: {chunks_names}')
+        self.chunks_guids = bytes.fromhex(''.join(chunks_names))
+
+    @property
+    def chunk_count(self) -> int:
+        """Number of chunks composing the save."""
+        return len(self.chunks_guids) // 16
+
+    def get_chunk_name(self, chunk_index: int) -> str:
+        """Return the file name of the chunk at ``chunk_index``."""
+        if not 0 <= chunk_index < self.chunk_count:
+            raise IndexError(f'No chunk {chunk_index} in save {self.name}')
+        return self.chunks_guids[chunk_index * 16:(chunk_index + 1) * 16].hex().upper()
 
     @staticmethod
     def init_saves_list_from(steamsave_files_list: List[str]) -> List['AstroSave']:
@@ -36,62 +124,109 @@ class AstroSave:
             saves_list.append(AstroSave(current_save_name, []))
         return saves_list
 
-    def convert_to_steam(self, source: str) -> BytesIO:
-        """Exports a save to a buffer in its Steam file format
+    @AstroProfiler.timed('chunk_io', count_bytes=lambda written: written)
+    def convert_to_steam_file(self, source: str, target: str, on_progress: Callable[[int], None] = None,
+                              digests: list = None) -> int:
+        """Exports a save directly to a file in its Steam file format
 
-        The save is returned in a buffer representing a unique file
-        obtained by concatenating all its chunks
+        The chunks are streamed one after the other into ``target`` so the
+        save is never held in memory
 
         Arguments:
             source: Where to read the chunks of the save
+            target: Path of the Steam save file to write
+            on_progress: Called with the number of bytes of each step of the copy
+            digests: One ``AstroVerify.AstroDigest`` per chunk, to verify the
+                copy with. ``target`` is left untouched if it fails
 
         Returns:
-            A buffer containing the Steam save
+            The number of bytes written
+
+        Raises:
+            ExportVerificationError: If the bytes written differ from those read
         """
-        buffer = BytesIO()
-        for chunk_name in self.chunks_names:
-            chunk_file_path = join_paths(source, chunk_name)
+        chunk_files_paths = [join_paths(source, chunk_name) for chunk_name in self.chunks_names]
+        return concatenate_files(chunk_files_paths, target, on_progress, digests)
 
-            with open(chunk_file_path, 'rb') as chunk_file:
-                buffer.write(chunk_file.read())
-        return buffer
+    def write_xbox_chunks(self, source: str, to_path: str, workers: int = XBOX_WRITE_WORKERS,
+                          chunk_size: int = XBOX_CHUNK_SIZE,
+                          on_progress: Callable[[int], None] = None, digests: list = None) -> List[uuid.UUID]:
+        """Split a Steam save file into Xbox chunk files written concurrently.
 
-    def convert_to_xbox(self, source: str) -> Tuple[List[uuid.UUID], List[BytesIO]]:
-        """Split a Steam save file into Xbox-formatted chunks.
+        Chunk names are chosen against a single listing of ``to_path``. Each
+        chunk is copied by a worker to a temporary file then renamed, and if
+        any chunk fails every chunk already written is deleted.
 
         Args:
             source: Path to the Steam ``.savegame`` file.
+            to_path: Directory where the chunk files are written.
+            workers: Maximum number of chunks written at the same time.
+            chunk_size: Maximum size of a chunk file.
+            on_progress: Called with the number of bytes of each step of the
+                copies, possibly from several threads at once.
+            digests: One ``AstroVerify.AstroDigest`` per chunk (see
+                ``get_xbox_chunk_count``), to verify the copies with.
 
         Returns:
-            Tuple[List[uuid.UUID], List[BytesIO]]: Generated UUIDs and chunk buffers.
-        """
-        buffer_uuids: List[uuid.UUID] = []
-        buffers: List[BytesIO] = []
-        self.chunks_names = []
-
-        len_read = XBOX_CHUNK_SIZE
-        save_file_path = source
+            List[uuid.UUID]: UUIDs of the chunks, in order.
 
-        with open(save_file_path, 'rb') as save_file:
-            while len_read == XBOX_CHUNK_SIZE:
-                buffer = BytesIO()
+        Raises:
+            OSError: If a chunk cannot be written, once the chunks are rolled back.
+            ExportVerificationError: If the bytes written to a chunk differ
+                from those read, once the chunks are rolled back.
+        """
+        save_size = os.path.getsize(source)
+        chunk_count = get_xbox_chunk_count(save_size, chunk_size)
+        if digests is None:
+            digests = [None] * chunk_count
+        elif len(digests) != chunk_count:
+            raise ValueError(f'{len(digests)} digests given for {chunk_count} chunks')
+
+        taken_names = {file_name.upper() for file_name in list_folder_content(to_path)}
+        chunk_uuids: List[uuid.UUID] = []
+        for _ in range(chunk_count):
+            file_uuid = uuid.uuid4()
+            # Regenerating chunk name if it already exists. Very, very unlikely
+            while file_uuid.hex.upper() in taken_names:
+                Logger.logPrint('UUID: %s already exists ! (omg)', "debug", file_uuid.hex.upper())
                 file_uuid = uuid.uuid4()
-                Logger.logPrint(f'UUID generated: {file_uuid}', "debug")
-
-                buffer.write(save_file.read(XBOX_CHUNK_SIZE))
-
-                len_read = len(buffer.getvalue())
-
-                self.chunks_names.append(file_uuid.hex.upper())
-                buffer_uuids.append(file_uuid)
-                buffers.append(buffer)
-
-        return (buffer_uuids, buffers)
+            Logger.logPrint('UUID generated: %s', "debug", file_uuid)
+            taken_names.add(file_uuid.hex.upper())
+            chunk_uuids.append(file_uuid)
+        self.chunks_guids = b''.join(chunk_uuid.bytes for chunk_uuid in chunk_uuids)
+
+        chunks_paths = [join_paths(to_path, chunk_name) for chunk_name in self.chunks_names]
+
+        with AstroProfiler.span('chunk_io', save_size), \
+                ThreadPoolExecutor(max_workers=max(1, min(workers, chunk_count))) as executor:
+            futures = [
+                executor.submit(copy_file_slice, source, i * chunk_size, chunk_size, chunk_path, on_progress,
+                                digests[i])
+                for i, chunk_path in enumerate(chunks_paths)
+            ]
+            wait(futures, return_when=FIRST_EXCEPTION)
+            for future in futures:
+                future.cancel()
+            wait(futures)
+
+        errors = [future.exception() for future in futures
+                  if not future.cancelled() and future.exception() is not None]
+        if errors:
+            Logger.logPrint('Writing chunks of %s failed, deleting the chunks already written', "debug", self.name)
+            for chunk_path in chunks_paths:
+                if is_path_exists(chunk_path):
+                    os.remove(chunk_path)
+            raise errors[0]
+
+        return chunk_uuids
 
     def regenerate_uuid(self, chunk_index: int) -> uuid.UUID:
         """Generate a new UUID for the chunk at ``chunk_index``."""
+        if not 0 <= chunk_index < self.chunk_count:
+            raise IndexError(f'No chunk {chunk_index} in save {self.name}')
         new_uuid = uuid.uuid4()
-        self.chunks_names[chunk_index](new_uuid.hex.upper())
+        start = chunk_index * 16
+        self.chunks_guids = self.chunks_guids[:start] + new_uuid.bytes + self.chunks_guids[start + 16:]
         return new_uuid
 
     def get_file_name(self) -> str:
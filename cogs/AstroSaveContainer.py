@@ -1,152 +1,381 @@
 """Parsing and handling of Astroneer save container files."""
 
 import os
-import hexdump
-import re
-
-from utils import is_a_file, list_folder_content, join_paths
-
-from cogs.AstroSave import AstroSave
+import mmap
+import struct
+import threading
+import uuid
+from contextlib import contextmanager
+from io import BytesIO
+from typing import Iterator, List, Tuple
+
+from utils import atomic_write, is_a_file, is_a_temporary_file, list_folder_content, join_paths, write_full
+
+from cogs.AstroSave import AstroSave, guid_to_chunk_name, guid_to_uuid_bytes
+from cogs import AstroContainerCache
 from cogs import AstroLogging as Logger
+from cogs import AstroProfiler
 
 CHUNK_METADATA_SIZE = 160  # Length of a chunk metadata found in a save container
+CHUNK_NAME_SIZE = 128  # Length of the UTF-16 save name field of a chunk metadata
+
+# Container header: Astroneer file type, 2 unknown bytes, number of chunks
+CONTAINER_HEADER = struct.Struct('<2s2xI')
+# Chunk metadata: save name, 16 unused bytes, GUID of the chunk file
+CHUNK_METADATA = struct.Struct(f'<{CHUNK_NAME_SIZE}s16x16s')
 
 
 class AstroSaveContainer:
-    """Represent an Astroneer save container and its contents."""
+    """Lazy index over an Astroneer save container.
+
+    Only the header is read when the container is opened. Chunk metadata
+    are decoded on demand, when a save is requested with ``get_save`` or
+    while iterating with ``iter_saves``.
+
+    If a container cache is set up (see ``AstroContainerCache.setup_cache``)
+    and the container did not change since it was cached, every save is
+    loaded from the cache instead. Containers decoded entirely are cached.
+    """
 
-    def __init__(self, container_file_path: str) -> None:
-        """Reads the container file, divides it into chunks and
-        regroups the chunks into save objects
+    @AstroProfiler.timed('container_open')
+    def __init__(self, container_file_path: str, folder_files_sizes: dict = None) -> None:
+        """Reads the container header
 
         Args:
             container_file_path: Path to the container file.
+            folder_files_sizes: Size of every file of the container folder by
+                uppercase name, if the folder has already been listed (see
+                ``scan_save_folder``).
+
+        Raises:
+            Exception: If the header is invalid or the container holds fewer
+                chunks than its header states.
         """
         self.full_path = container_file_path
-        self.save_list = []
-        Logger.logPrint(f'full_path: {self.full_path}', "debug")
+        Logger.logPrint('full_path: %s', "debug", self.full_path)
 
         with open(self.full_path, "rb") as container:
-            # The Astroneer file type is contained in at least the first 2 bytes of the file
-            self.header = container.read(2)
+            # The Astroneer file type is contained in at least the first 2 bytes of the file,
+            # the 2 next bytes may be part of the header, and the 4 following ones are the
+            # number of saves chunk
+            header = container.read(CONTAINER_HEADER.size)
+            self.header = header[:2]
 
-            if not self.is_valid_container_header(self.header):
+            if len(header) < CONTAINER_HEADER.size or not self.is_valid_container_header(self.header):
                 raise Exception(
                     f'The save container {self.full_path} is not valid (First two bytes:{self.header})')
-            # Skipping 2 bytes that may be part of the header
-            container.read(2)
 
-            # Next 4 bytes are the number of saves chunk
-            self.chunk_count = int.from_bytes(
-                container.read(4), byteorder='little')
+            self.chunk_count = CONTAINER_HEADER.unpack(header)[1]
 
-            # Parsing saves chunks
-            current_save_name = None
-            for _ in range(self.chunk_count):
-                current_chunk = container.read(CHUNK_METADATA_SIZE)
-                current_chunk_name = self.extract_name_from_chunk(
-                    current_chunk)
-                Logger.logPrint(f'Save: {current_chunk_name}', "debug")
+            records_end = CONTAINER_HEADER.size + self.chunk_count * CHUNK_METADATA_SIZE
+            self._stat = os.fstat(container.fileno())
+            if self._stat.st_size < records_end:
+                raise Exception(
+                    f'The save container {self.full_path} is truncated ({self.chunk_count} chunks expected)')
+
+        # Name and index of the first chunk of each save found so far, the
+        # latter followed by the index of the first chunk not yet regrouped
+        self._saves_name = []
+        self._saves_first_chunk = [0]
+        self._last_chunk_name = (None, None)
+        self._saves = {}
+        self._save_list = None
+        self._chunks_sizes = {}
+        self._folder_files_sizes = folder_files_sizes
+        self._is_cached = False
+
+        cache = AstroContainerCache.get_cache()
+        if cache is not None:
+            cached_saves = cache.load(self.full_path, self._stat, self.chunk_count)
+            if cached_saves is not None:
+                self._load_cached_saves(cached_saves)
+
+    def __len__(self) -> int:
+        """Return the number of saves in the container."""
+        if self._saves_first_chunk[-1] < self.chunk_count:
+            with self._open_view() as container_view:
+                self._find_saves_until(container_view, None)
+        return len(self._saves_name)
+
+    def __getitem__(self, save_index: int) -> AstroSave:
+        """Return the save at ``save_index``, see ``get_save``."""
+        return self.get_save(save_index)
+
+    def __iter__(self) -> Iterator[AstroSave]:
+        """Iterate over the saves, see ``iter_saves``."""
+        return self.iter_saves()
+
+    @property
+    def save_list(self) -> List[AstroSave]:
+        """All the saves of the container, decoded on first access."""
+        if self._save_list is None:
+            if self._saves_first_chunk[-1] < self.chunk_count or len(self._saves) < len(self._saves_name):
+                with self._open_view() as container_view:
+                    self._find_saves_until(container_view, None)
+                    for save_index in range(len(self._saves_name)):
+                        if save_index not in self._saves:
+                            self._saves[save_index] = self._read_save(container_view, save_index)
+            self._save_list = [self._saves[i] for i in range(len(self._saves_name))]
+            self._store_in_cache([save.chunks_guids for save in self._save_list])
+        return self._save_list
+
+    def get_save(self, save_index: int) -> AstroSave:
+        """Return the save at ``save_index``, decoding only the chunks needed.
+
+        The returned object is kept, so that changes made to it (e.g. a
+        rename) are seen by later calls.
 
-                if current_chunk_name != current_save_name:
-                    if current_save_name != None:
-                        # Parsing a new save, storing the current save
-                        self.save_list.append(AstroSave(current_save_name,
-                                                        current_chunks_names))
+        Args:
+            save_index: Position of the save in the container.
 
-                    current_chunks_names = []
-                    current_save_name = current_chunk_name
+        Returns:
+            AstroSave: The requested save.
 
-                chunk_file_name = self.extract_chunk_file_name_from_chunk(current_chunk)
-                Logger.logPrint(f'Processed chunk: {chunk_file_name}', "debug")
+        Raises:
+            IndexError: If there is no save at ``save_index``.
+        """
+        if save_index < 0:
+            save_index += len(self)
+            if save_index < 0:
+                raise IndexError(f'No save {save_index - len(self)} in container {self.full_path}')
 
-                current_chunks_names.append(chunk_file_name)
+        if save_index not in self._saves:
+            with self._open_view() as container_view:
+                self._saves[save_index] = self._read_save(container_view, save_index)
 
-            # Saving the last save of the container file
-            self.save_list.append(AstroSave(current_save_name,
-                                            current_chunks_names))
+        return self._saves[save_index]
 
-    def is_valid_container_header(self, header: bytes) -> bool:
-        """Validate a container file header."""
-        expected_header = b'\x04\x00'
-        return header == expected_header
+    def iter_saves(self) -> Iterator[AstroSave]:
+        """Iterate over the saves of the container.
+
+        The container is mapped once for the whole iteration and saves are
+        decoded one at a time, so that paging through a very large container
+        does not keep every save in memory.
 
-    def extract_name_from_chunk(self, chunk: bytes) -> str:
-        """Extract the save name stored in a chunk.
+        Yields:
+            AstroSave: Each save, in the order of the container.
+        """
+        if not self.chunk_count:
+            return
+
+        # Chunks of every save, kept only to fill the cache at the end
+        saves_chunks_guids = [] if AstroContainerCache.get_cache() is not None and not self._is_cached else None
+
+        with self._open_view() as container_view:
+            save_index = 0
+            while True:
+                if save_index in self._saves:
+                    save = self._saves[save_index]
+                else:
+                    try:
+                        save = self._read_save(container_view, save_index)
+                    except IndexError:
+                        break
+                if saves_chunks_guids is not None:
+                    saves_chunks_guids.append(save.chunks_guids)
+                yield save
+                save_index += 1
+
+        if saves_chunks_guids is not None:
+            self._store_in_cache(saves_chunks_guids)
+
+    def get_chunks_sizes(self, save_index: int) -> List[int]:
+        """Return the size of each chunk file of a save, ``-1`` for a missing chunk.
+
+        Sizes are never taken from the container cache, as chunk files can
+        change without their container. The whole folder of the container is
+        listed once for every save.
 
         Args:
-            chunk: Raw chunk bytes.
+            save_index: Position of the save in the container.
 
         Returns:
-            str: Name of the save.
+            List[int]: Size in bytes of each chunk, in order.
+
+        Raises:
+            IndexError: If there is no save at ``save_index``.
+        """
+        if save_index < 0:
+            save_index += len(self)
+            if save_index < 0:
+                raise IndexError(f'No save {save_index - len(self)} in container {self.full_path}')
+
+        if save_index not in self._chunks_sizes:
+            save = self.get_save(save_index)
+            files_sizes = self._get_folder_files_sizes()
+            self._chunks_sizes[save_index] = [files_sizes.get(chunk_name, -1) for chunk_name in save.chunks_names]
+
+        return self._chunks_sizes[save_index]
+
+    def _get_folder_files_sizes(self) -> dict:
+        """Return the size of every file of the container folder, by uppercase name."""
+        if self._folder_files_sizes is None:
+            self._folder_files_sizes = scan_save_folder(os.path.dirname(self.full_path) or '.')[1]
+        return self._folder_files_sizes
+
+    def _load_cached_saves(self, cached_saves: list) -> None:
+        """Fill the index with saves loaded from the container cache."""
+        for save_index, (save_name, chunks_guids) in enumerate(cached_saves):
+            self._saves_name.append(save_name)
+            self._saves_first_chunk.append(self._saves_first_chunk[-1] + len(chunks_guids) // 16)
+            self._saves[save_index] = AstroSave.from_guids(save_name, chunks_guids)
+        self._is_cached = True
+        Logger.logPrint('Container loaded from cache: %s (%d saves)', "debug", self.full_path, len(cached_saves))
+
+    def _store_in_cache(self, saves_chunks_guids: List[bytes]) -> None:
+        """Cache the saves of the container once all of them have been decoded.
+
+        Names are taken from the index rather than from the saves, which
+        may have been renamed since.
         """
-        # Reading the whole UTF-16 string in the chunk
-        utf_16_encoded_text = chunk[0:CHUNK_METADATA_SIZE -
-                                    32].decode('utf-16le', errors='ignore')
+        cache = AstroContainerCache.get_cache()
+        if cache is None or self._is_cached or len(saves_chunks_guids) != len(self._saves_name):
+            return
 
-        # The seperator is either '$$' in case of multi-chunk save
-        # or '\x00' if only one chunk
-        return re.split('[$]{2}|[\\x00]', utf_16_encoded_text)[0]
+        cached_saves = list(zip(self._saves_name, saves_chunks_guids))
+        self._is_cached = cache.store(self.full_path, self._stat, self.chunk_count, cached_saves)
 
-    def extract_chunk_file_name_from_chunk(self, chunk: bytes) -> str:
-        """Extract the filename associated with a chunk.
+    @contextmanager
+    def _open_view(self) -> Iterator[mmap.mmap]:
+        """Map the container file in memory for reading."""
+        with open(self.full_path, "rb") as container:
+            with mmap.mmap(container.fileno(), 0, access=mmap.ACCESS_READ) as container_view:
+                yield container_view
 
-        Args:
-            chunk: Chunk to inspect.
+    def _read_save(self, container_view, save_index: int) -> AstroSave:
+        """Decode the save at ``save_index`` from the container content.
 
-        Returns:
-            str: Filename derived from the chunk metadata.
+        Raises:
+            IndexError: If there is no save at ``save_index``.
         """
-        chunk_file_name = ''
-        partial_name = ''
-        i = CHUNK_METADATA_SIZE - 16
+        self._find_saves_until(container_view, save_index + 1)
+        if save_index >= len(self._saves_name):
+            raise IndexError(f'No save {save_index} in container {self.full_path}')
+
+        save_name = self._saves_name[save_index]
+        first_offset = self._chunk_offset(self._saves_first_chunk[save_index])
+        end_offset = self._chunk_offset(self._saves_first_chunk[save_index + 1])
+        chunks_guids = b''.join(
+            guid_to_uuid_bytes(CHUNK_METADATA.unpack_from(container_view, offset)[1])
+            for offset in range(first_offset, end_offset, CHUNK_METADATA_SIZE)
+        )
+        save = AstroSave.from_guids(save_name, chunks_guids)
+        # Chunk names are only formatted if debug messages are logged
+        Logger.logPrint('Save: %r', "debug", save)
+
+        return save
+
+    @AstroProfiler.timed('container_parse')
+    def _find_saves_until(self, container_view, save_count) -> None:
+        """Regroup chunks into saves until ``save_count`` saves are known.
+
+        Every chunk is decoded: the multi-chunk metadata of the first chunk
+        of a save cannot be trusted to skip the following ones, which may
+        belong to another save.
 
-        (partial_name, i) = self.chunk_grab_bytes_to_string(chunk, i, 4)
-        chunk_file_name = self.convert_chunk_name_to_file_name(partial_name)
+        Args:
+            container_view: Whole content of the container file.
+            save_count: Number of saves to find, ``None`` to find them all.
+        """
+        saves_first_chunk = self._saves_first_chunk
+
+        while saves_first_chunk[-1] < self.chunk_count and \
+                (save_count is None or len(self._saves_name) < save_count):
+            first_chunk = saves_first_chunk[-1]
+            save_name = self._read_chunk_name(container_view, first_chunk)[0]
+            encoded_name = save_name.encode('utf-16le')
+            # A save name ending with '$' would be cut short by a following
+            # '$$', and a name filling the field is followed by other fields
+            can_match_bytes = len(encoded_name) <= CHUNK_NAME_SIZE - 4 and not save_name.endswith('$')
+
+            end_chunk = first_chunk + 1
+            while end_chunk < self.chunk_count:
+                if not (can_match_bytes and
+                        self._has_save_name(container_view, end_chunk, encoded_name)) and \
+                        self._read_chunk_name(container_view, end_chunk)[0] != save_name:
+                    break
+                end_chunk += 1
+
+            self._saves_name.append(save_name)
+            saves_first_chunk.append(end_chunk)
+
+    def _has_save_name(self, container_view, chunk_index: int, encoded_name: bytes) -> bool:
+        """Tell from its raw bytes whether a chunk has the save name ``encoded_name``.
+
+        ``False`` means the chunk has to be decoded to know.
+        """
+        offset = self._chunk_offset(chunk_index)
+        name_end = offset + len(encoded_name)
+        if container_view[offset:name_end] != encoded_name:
+            return False
+        # Followed by the end of the name or by the multi-chunk metadata
+        return container_view[name_end:name_end + 2] == b'\x00\x00' or \
+            container_view[name_end:name_end + 4] == b'$\x00$\x00'
+
+    def _read_chunk_name(self, container_view, chunk_index: int) -> Tuple[str, int]:
+        """Decode the save name of a chunk and the number of chunks left in the save.
+
+        The last decoded chunk is remembered, as the chunk following a save
+        is decoded again as the first chunk of the next save.
+        """
+        if self._last_chunk_name[0] != chunk_index:
+            offset = CONTAINER_HEADER.size + chunk_index * CHUNK_METADATA_SIZE
+            self._last_chunk_name = (
+                chunk_index, self.decode_chunk_name(container_view[offset:offset + CHUNK_NAME_SIZE]))
+        return self._last_chunk_name[1]
 
-        (partial_name, i) = self.chunk_grab_bytes_to_string(chunk, i, 2)
-        chunk_file_name += self.convert_chunk_name_to_file_name(partial_name)
+    @staticmethod
+    def _chunk_offset(chunk_index: int) -> int:
+        """Return the offset of a chunk metadata in the container file."""
+        return CONTAINER_HEADER.size + chunk_index * CHUNK_METADATA_SIZE
 
-        (partial_name, i) = self.chunk_grab_bytes_to_string(chunk, i, 2)
-        chunk_file_name += self.convert_chunk_name_to_file_name(partial_name)
+    @staticmethod
+    def decode_save_name(raw_name: bytes) -> str:
+        """Decode the save name from the name field of a chunk metadata.
 
-        (partial_name, i) = self.chunk_grab_bytes_to_string(chunk, i, 8)
-        chunk_file_name += self.string_to_hex(partial_name)
+        The field is a UTF-16 string where the name is followed either by
+        ``'$$'`` in case of multi-chunk save or by ``'\\x00'`` if only one chunk.
 
-        return chunk_file_name
+        Args:
+            raw_name: Name field of the chunk metadata.
 
-    def chunk_grab_bytes_to_string(self, chunk: bytes, index: int, n: int):
-        """Read ``n`` bytes from ``chunk`` starting at ``index``.
+        Returns:
+            str: Name of the save.
+        """
+        return AstroSaveContainer.decode_chunk_name(raw_name)[0]
+
+    @staticmethod
+    def decode_chunk_name(raw_name: bytes) -> Tuple[str, int]:
+        """Decode the name field of a chunk metadata.
+
+        Multi-chunk saves have their name followed by ``'$${i}${chunk_count}$1'``.
 
         Args:
-            chunk: Source bytes.
-            index: Starting index.
-            n: Number of bytes to read.
+            raw_name: Name field of the chunk metadata.
 
         Returns:
-            tuple[str, int]: Extracted string and new index position.
+            tuple[str, int]: Name of the save and number of chunks of the save
+            starting from this one (``1`` if unknown).
         """
-        extracted_string = ''
-        for _ in range(n):
-            extracted_string += chr(chunk[index])
-            index += 1
-
-        return (extracted_string, index)
+        utf_16_encoded_text = raw_name.decode('utf-16le', errors='ignore')
+        save_name, _, chunk_metadata = utf_16_encoded_text.split('\x00', 1)[0].partition('$$')
 
-    def reverse_string(self, string: str) -> str:
-        """Return ``string`` reversed."""
-        return string[::-1]
+        remaining_chunks = 1
+        if chunk_metadata:
+            try:
+                chunk_index, chunk_count = chunk_metadata.split('$')[:2]
+                remaining_chunks = max(int(chunk_count) - int(chunk_index), 1)
+            except ValueError:
+                pass
 
-    def convert_chunk_name_to_file_name(self, string: str) -> str:
-        """Convert a chunk's display name to its filename."""
-        return self.string_to_hex(self.reverse_string(string))
+        return (save_name, remaining_chunks)
 
-    def string_to_hex(self, string: str) -> str:
-        """Convert ``string`` to uppercase hexadecimal using Latin-1 encoding."""
-        return string.encode('latin1').hex().upper()
+    def is_valid_container_header(self, header: bytes) -> bool:
+        """Validate a container file header."""
+        expected_header = b'\x04\x00'
+        return header == expected_header
 
     @staticmethod
-
     def get_containers_list(path: str) -> list:
         """Return container filenames found in a directory.
 
@@ -187,6 +416,190 @@ class AstroSaveContainer:
             path: File path to inspect.
 
         Returns:
-            bool: ``True`` if the file name contains ``'container'``.
+            bool: ``True`` if the file name contains ``'container'`` and it
+            is not a container being rewritten.
+        """
+        return is_a_file(path) and os.path.basename(path).rfind('container') != -1 and \
+            not is_a_temporary_file(path)
+
+
+def scan_save_folder(folder: str) -> Tuple[List[str], dict]:
+    """List a save folder in a single pass.
+
+    Args:
+        folder: Folder holding containers and chunk files.
+
+    Returns:
+        Tuple[List[str], dict]: Paths of the ``container.*`` files sorted by
+        name, and the size of every file by uppercase name.
+    """
+    containers_paths = []
+    files_sizes = {}
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_file():
+                files_sizes[entry.name.upper()] = entry.stat().st_size
+                if entry.name.startswith('container.'):
+                    containers_paths.append(entry.path)
+    return sorted(containers_paths), files_sizes
+
+
+def encode_chunk_name(save_name: str, chunk_index: int, chunk_count: int) -> bytes:
+    """Encode the name field of the chunk ``chunk_index`` of a save.
+
+    Multi-chunk saves have their name followed by ``'$${i}${chunk_count}$1'``,
+    whatever the number of digits of the index and count.
+
+    Args:
+        save_name: Name of the save.
+        chunk_index: Position of the chunk in the save.
+        chunk_count: Number of chunks of the save.
+
+    Returns:
+        bytes: UTF-16 name, at most ``CHUNK_NAME_SIZE`` bytes.
+
+    Raises:
+        ValueError: If the name does not fit in the field.
+    """
+    chunk_name = save_name
+    if chunk_count > 1:
+        chunk_name += f'$${chunk_index}${chunk_count}$1'
+
+    encoded_name = chunk_name.encode('utf-16le', errors='ignore')
+    if len(encoded_name) > CHUNK_NAME_SIZE:
+        raise ValueError(f'The name of {save_name} is too long for a save of {chunk_count} chunks: '
+                         f'{chunk_name} does not fit in {CHUNK_NAME_SIZE} bytes')
+    return encoded_name
+
+
+def build_chunks_metadata(save_name: str, chunk_uuids: List[uuid.UUID]) -> bytes:
+    """Build the container metadata of every chunk of a save.
+
+    Args:
+        save_name: Name of the save.
+        chunk_uuids: UUIDs of the chunk files, in order.
+
+    Returns:
+        bytes: ``CHUNK_METADATA_SIZE`` bytes per chunk.
+
+    Raises:
+        ValueError: If the name of a chunk does not fit in the container, see
+            ``encode_chunk_name``.
+    """
+    chunk_count = len(chunk_uuids)
+    chunks_metadata = BytesIO()
+    for i, chunk_uuid in enumerate(chunk_uuids):
+        chunks_metadata.write(CHUNK_METADATA.pack(encode_chunk_name(save_name, i, chunk_count), chunk_uuid.bytes_le))
+
+    return chunks_metadata.getvalue()
+
+
+class AstroSaveContainerWriter:
+    """Changes to the containers of an Xbox save folder, committed at once.
+
+    Saves to add and to remove are collected (possibly from several threads)
+    and each container of the folder is rewritten a single time by
+    ``commit``, through a temporary file atomically renamed over it.
+    """
+
+    # Commits of different writers on the same folder must not interleave
+    _commit_lock = threading.Lock()
+
+    def __init__(self, folder_path: str) -> None:
+        """Start a new set of changes.
+
+        Args:
+            folder_path: Xbox save folder whose containers are edited.
+        """
+        self.folder_path = folder_path
+        self._lock = threading.Lock()
+        self._added_metadata = []
+        self._added_chunk_count = 0
+        self._removed_chunks_names = set()
+
+    def add_save(self, save_name: str, chunk_uuids: List[uuid.UUID]) -> None:
+        """Reference a save whose chunk files are already written in the folder."""
+        metadata = build_chunks_metadata(save_name, chunk_uuids)
+        with self._lock:
+            self._added_metadata.append(metadata)
+            self._added_chunk_count += len(chunk_uuids)
+
+    def remove_save(self, save: AstroSave) -> None:
+        """Drop a save read from the folder, its chunk files are deleted after the commit."""
+        with self._lock:
+            self._removed_chunks_names.update(save.chunks_names)
+
+    def has_changes(self) -> bool:
+        """Return ``True`` if there is something to commit."""
+        return bool(self._added_metadata or self._removed_chunks_names)
+
+    @AstroProfiler.timed('container_commit')
+    def commit(self, fsync: bool = True) -> str:
+        """Write every pending change to the containers of the folder.
+
+        Args:
+            fsync: Flush the new containers to disk before renaming them.
+
+        Returns:
+            str: Path of the container the new saves were added to.
         """
-        return is_a_file(path) and path.rfind('container') != -1
+        with self._commit_lock, self._lock:
+            try:
+                containers_names = AstroSaveContainer.get_containers_list(self.folder_path)
+            except FileNotFoundError:
+                AstroSaveContainer.create_empty_container(self.folder_path)
+                containers_names = ['container.1']
+
+            # New saves go to the first container, as the game does not care
+            target_container_path = join_paths(self.folder_path, containers_names[0])
+
+            for container_name in containers_names:
+                container_full_path = join_paths(self.folder_path, container_name)
+                is_target = container_full_path == target_container_path
+                self._rewrite_container(container_full_path, is_target, fsync)
+
+            for chunk_name in self._removed_chunks_names:
+                chunk_full_path = join_paths(self.folder_path, chunk_name)
+                if is_a_file(chunk_full_path):
+                    os.remove(chunk_full_path)
+
+            self._added_metadata = []
+            self._added_chunk_count = 0
+            self._removed_chunks_names = set()
+
+        return target_container_path
+
+    def _rewrite_container(self, container_full_path: str, is_target: bool, fsync: bool) -> None:
+        """Rewrite one container with the pending changes that concern it."""
+        with open(container_full_path, 'rb') as container:
+            header = container.read(CONTAINER_HEADER.size)
+            chunk_count = CONTAINER_HEADER.unpack(header)[1]
+            chunks_metadata = container.read(chunk_count * CHUNK_METADATA_SIZE)
+
+        kept_metadata = [
+            chunks_metadata[offset:offset + CHUNK_METADATA_SIZE]
+            for offset in range(0, len(chunks_metadata), CHUNK_METADATA_SIZE)
+        ]
+        if self._removed_chunks_names:
+            kept_metadata = [
+                metadata for metadata in kept_metadata
+                if guid_to_chunk_name(CHUNK_METADATA.unpack(metadata)[1]) not in self._removed_chunks_names
+            ]
+        is_changed = len(kept_metadata) != chunk_count
+
+        new_chunk_count = len(kept_metadata)
+        if is_target and self._added_metadata:
+            kept_metadata.extend(self._added_metadata)
+            new_chunk_count += self._added_chunk_count
+            is_changed = True
+
+        if not is_changed:
+            return
+
+        Logger.logPrint('Editing container: %s (%d -> %d chunks)', "debug",
+                        container_full_path, chunk_count, new_chunk_count)
+        with atomic_write(container_full_path) as container:
+            write_full(container, header[:4] + new_chunk_count.to_bytes(4, byteorder='little'))
+            write_full(container, b''.join(kept_metadata))
+            if fsync:
+                os.fsync(container.fileno())
@@ -1,13 +1,11 @@
-import os
-from cogs import AstroLogging as Logger
 """Helpers for locating Steam save folders."""
 
 import os
 import utils
 from errors import MultipleFolderFoundError
-import re
 import glob
 from cogs import AstroLogging as Logger
+from cogs import AstroMicrosoftSaveFolder
 
 
 def get_steam_save_folder() -> str:
@@ -62,32 +60,8 @@ def seek_microsoft_save_folder(appdata_path: str) -> str:
 
 
 def get_save_folders_from_path(path: str) -> list:
-    """Return all subdirectories containing a container file."""
-    microsoft_save_folders = []
-
-    for root, _, files in os.walk(path):
-        for file in files:
-            if re.search(r'^container\.', file):
-                container_full_path = utils.join_paths(root, file)
-
-                Logger.logPrint(f'Container file found: {container_full_path}', 'debug')
-
-                container_text = read_container_text_from_path(container_full_path)
-
-                if do_container_text_match_date(container_text):
-                    Logger.logPrint(f'Matching save folder {root}', 'debug')
-                    microsoft_save_folders.append(root)
+    """Return all subdirectories containing a container file.
 
-    return microsoft_save_folders
-
-
-def read_container_text_from_path(path: str) -> str:
-    """Return decoded text from a container file."""
-    with open(path, 'rb') as container_file:
-        binary_content = container_file.read()
-        return binary_content.decode('utf-16le', errors='ignore')
-
-
-def do_container_text_match_date(text: str) -> bool:
-    """Return ``True`` if ``text`` contains a date pattern."""
-    return re.search(r'\$\d{4}\.\d{2}\.\d{2}', text)
+    See ``AstroMicrosoftSaveFolder.get_save_folders_from_path``.
+    """
+    return AstroMicrosoftSaveFolder.get_save_folders_from_path(path)
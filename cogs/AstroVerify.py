@@ -0,0 +1,144 @@
+"""Verification of exported saves, computed while they are written.
+
+When verification is enabled (see ``configure_verification``), exports are
+copied through a buffer instead of kernel-side: each block read from the
+source is hashed, then each part of it accepted by a write is hashed again.
+The two BLAKE2 digests must be equal before the written file replaces its
+target, without reading anything a second time. A manifest describing the
+export is then written to the manifest folder, kept apart from the save
+folders the game reads.
+"""
+
+import json
+import os
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+import utils
+from errors import ExportVerificationError
+
+DIGEST_SIZE = 32
+DIGEST_ALGORITHM = f'blake2b-{DIGEST_SIZE * 8}'
+MANIFEST_FOLDER_NAME = 'manifests'
+MANIFEST_VERSION = 1
+
+_settings = {'enabled': False, 'manifest_folder': None}
+
+
+def configure_verification(enabled: bool = False, manifest_folder: str = None) -> None:
+    """Enable or disable the verification of the exports made from now on.
+
+    Args:
+        enabled: Verify the exports and write their manifests.
+        manifest_folder: Folder where the manifests are written. If omitted,
+            a ``manifests`` folder in the working directory.
+    """
+    _settings['enabled'] = enabled
+    _settings['manifest_folder'] = manifest_folder
+
+
+def is_verification_enabled() -> bool:
+    """Return ``True`` if exports are verified, see ``configure_verification``."""
+    return _settings['enabled']
+
+
+class AstroDigest:
+    """Digests of the bytes read from a source and of the bytes written from them.
+
+    A digest can have a parent, which is given every byte this one is given:
+    the digest of a whole file can be computed along with those of its parts.
+    """
+
+    def __init__(self, parent: 'AstroDigest' = None) -> None:
+        """Start empty digests.
+
+        Args:
+            parent: Digest also updated with every byte given to this one.
+        """
+        import hashlib
+        self.parent = parent
+        self.read_bytes = 0
+        self.written_bytes = 0
+        self._read_hash = hashlib.blake2b(digest_size=DIGEST_SIZE)
+        self._written_hash = hashlib.blake2b(digest_size=DIGEST_SIZE)
+
+    def update_read(self, data) -> None:
+        """Hash bytes just read from the source."""
+        self._read_hash.update(data)
+        self.read_bytes += len(data)
+        if self.parent is not None:
+            self.parent.update_read(data)
+
+    def update_written(self, data) -> None:
+        """Hash bytes just written to the target."""
+        self._written_hash.update(data)
+        self.written_bytes += len(data)
+        if self.parent is not None:
+            self.parent.update_written(data)
+
+    @property
+    def hexdigest(self) -> str:
+        """Digest of the bytes written."""
+        return self._written_hash.hexdigest()
+
+    def check(self) -> None:
+        """Check that the bytes written are those read.
+
+        Raises:
+            ExportVerificationError: If they differ.
+        """
+        if self.read_bytes != self.written_bytes or self._read_hash.digest() != self._written_hash.digest():
+            raise ExportVerificationError(
+                f'{self.read_bytes} bytes read ({self._read_hash.hexdigest()}) but '
+                f'{self.written_bytes} bytes written ({self._written_hash.hexdigest()})')
+
+
+def write_manifest(to_path: str, save_name: str, export_format: str, chunks: List[Tuple[str, AstroDigest]],
+                   file_digest: Optional[AstroDigest] = None) -> str:
+    """Describe a verified export in ``<manifest folder>/<save_name>.<export_format>.manifest.json``.
+
+    The manifest is never written in ``to_path``: the Microsoft save folder
+    is read by the game, which must only find its own files there.
+
+    Args:
+        to_path: Folder the save was exported to.
+        save_name: Name of the exported save.
+        export_format: ``'steam'`` or ``'microsoft'``, the format of the export.
+        chunks: Name (GUID) and digest of each chunk of the save, in order.
+        file_digest: Digest of the whole Steam save file, if the save was
+            written as a single file.
+
+    Returns:
+        str: Path of the manifest.
+
+    Raises:
+        ExportVerificationError: If a digest does not match, no manifest is
+            written then.
+    """
+    for _, digest in chunks:
+        digest.check()
+    if file_digest is not None:
+        file_digest.check()
+
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'save': save_name,
+        'format': export_format,
+        'folder': to_path,
+        'algorithm': DIGEST_ALGORITHM,
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'size': sum(digest.written_bytes for _, digest in chunks),
+        'digest': file_digest.hexdigest if file_digest is not None else None,
+        'chunks': [
+            {'guid': chunk_name, 'size': digest.written_bytes, 'digest': digest.hexdigest}
+            for chunk_name, digest in chunks
+        ],
+    }
+
+    manifest_folder = _settings['manifest_folder'] or utils.join_paths(os.getcwd(), MANIFEST_FOLDER_NAME)
+    # Saves of a batch are exported concurrently
+    os.makedirs(manifest_folder, exist_ok=True)
+    manifest_path = utils.join_paths(manifest_folder, f'{save_name}.{export_format}.manifest.json')
+    with utils.atomic_write(manifest_path) as manifest_file:
+        utils.write_full(manifest_file, memoryview(json.dumps(manifest, indent=2).encode('utf-8')))
+    return manifest_path
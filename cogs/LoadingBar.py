@@ -22,28 +22,22 @@ class LoadingBar:
     def start_loading(self) -> None:
         """Animate the loading bar until completion."""
 
-        print("[", end='')
-        for _ in range(self.__bar_count):
-            print(" ", end='')
-        print("]", end='', flush=True)
+        print(self.render_bar(-1), end='', flush=True)
 
         for i in range(self.__bar_count):
             time.sleep(self.__update_period)
-            self.clean_bar()
-            self.print_bar(i)
+            # Each frame is written at once
+            print("\b" * (self.__bar_count + 2) + self.render_bar(i), end='', flush=True)
 
     def clean_bar(self) -> None:
         """Remove the bar from the console."""
-        for _ in range(self.__bar_count + 2):
-            print("\b", end='')
-        print("", end='', flush=True)
+        print("\b" * (self.__bar_count + 2), end='', flush=True)
 
     def print_bar(self, progress: int) -> None:
         """Print the bar with a given progress state."""
-        print("[", end='')
-        for i in range(self.__bar_count):
-            if progress >= i:
-                print("■", end='')
-            else:
-                print(" ", end='')
-        print("]", end='', flush=True)
+        print(self.render_bar(progress), end='', flush=True)
+
+    def render_bar(self, progress: int) -> str:
+        """Return the bar with a given progress state."""
+        filled = max(0, min(progress + 1, self.__bar_count))
+        return "[" + "■" * filled + " " * (self.__bar_count - filled) + "]"
@@ -5,3 +5,7 @@ class MultipleFolderFoundError(Exception):
     """Raised when more than one save folder is detected."""
     pass
 
+
+class ExportVerificationError(Exception):
+    """Raised when the bytes written by an export differ from those read."""
+    pass
@@ -1,23 +1,39 @@
 """Command-line interface for AstroSaveConverter.
 
 This module exposes the entry points used to convert Astroneer save files
-between Microsoft/Xbox and Steam formats. Functions defined here orchestrate
-user interaction, file discovery and conversion workflows.
+between Microsoft/Xbox and Steam formats. Functions defined here handle user
+interaction and file discovery, conversions are done by ``AstroApi``.
 """
 
 import os
+import sys
 import utils
 from argparse import ArgumentParser, Namespace
+from typing import Dict, List
+import AstroApi
 import AstroSaveScenario as Scenario
+from cogs import AstroBackup
+from cogs import AstroContainerCache
+from cogs import AstroFolderWatcher
 from cogs import AstroLogging as Logger
+from cogs import AstroMicrosoftSaveFolder
+from cogs import AstroProfiler
+from cogs import AstroProgress
+from cogs import AstroQuiescence
 from cogs import AstroSteamSaveFolder
+from cogs import AstroVerify
 from cogs.AstroSaveContainer import AstroSaveContainer as Container
 from cogs.AstroSave import AstroSave
 from cogs.AstroConvType import AstroConvType
-from cogs.LoadingBar import LoadingBar
+from cogs.AstroConflictPolicy import AstroConflictPolicy
 
 APP_VERSION = "3.0"
 
+BATCH_MODES = {
+    "win2steam": AstroConvType.WIN2STEAM,
+    "steam2win": AstroConvType.STEAM2WIN,
+}
+
 
 def get_args() -> Namespace:
     """Parse command-line arguments.
@@ -32,7 +48,229 @@ def get_args() -> Namespace:
         help="Path from which to read the container and extract the saves",
         required=False,
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--mode",
+        choices=list(BATCH_MODES),
+        help="Convert without any prompt (batch mode) in the given direction",
+    )
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="Batch mode: convert every save of every container of the saves path",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Batch mode: keep running and convert the saves of the saves path again each time they change",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=AstroFolderWatcher.WATCH_DEBOUNCE,
+        help="Watch mode: seconds without change in the saves path before converting",
+    )
+    parser.add_argument(
+        "--watch-backend",
+        choices=list(AstroFolderWatcher.WATCH_BACKENDS),
+        default="auto",
+        help="Watch mode: how to detect changes, inotify (Linux only), polling, or auto (inotify if available)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Batch mode: number of saves converted concurrently",
+    )
+    parser.add_argument(
+        "--on-conflict",
+        choices=[policy.value for policy in AstroConflictPolicy],
+        default=AstroConflictPolicy.SKIP.value,
+        help="Batch mode: what to do when a save already exists in the target folder",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Batch mode: target folder (defaults to the Steam save folder for win2steam)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Parse every container again instead of using the container cache",
+    )
+    parser.add_argument(
+        "--backup-hash",
+        action="store_true",
+        help="Compare file contents, not only sizes and dates, before reusing files of the previous backup",
+    )
+    parser.add_argument(
+        "--backup-format",
+        choices=list(AstroBackup.BACKUP_FORMATS),
+        default="dir",
+        help="Format of the backups made before converting: folders, or compressed archives",
+    )
+    parser.add_argument(
+        "--wait",
+        choices=list(AstroQuiescence.WAIT_MODES),
+        default="auto",
+        help="Before editing Microsoft saves, wait until the save folder is not modified anymore (auto) "
+             f"or always wait {AstroQuiescence.FIXED_WAIT} seconds (fixed)",
+    )
+    parser.add_argument(
+        "--quiet-period",
+        type=float,
+        default=AstroQuiescence.QUIET_PERIOD,
+        help="Seconds without modification of the save folder required by --wait auto",
+    )
+    parser.add_argument(
+        "--progress",
+        choices=list(AstroProgress.PROGRESS_MODES),
+        default="auto",
+        help="How to show the progress of copies: bar, JSON lines, none, or auto "
+             "(bar on a terminal, JSON lines otherwise)",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Check that the bytes of exported saves are those read, and write a manifest of their digests",
+    )
+    parser.add_argument(
+        "--manifest-dir",
+        help="With --verify, folder where the manifests are written (default: manifests in the current folder)",
+    )
+    parser.add_argument(
+        "--max-reads",
+        type=int,
+        default=utils.MAX_READS,
+        help="Blocks read at the same time by the copies that go through memory",
+    )
+    parser.add_argument(
+        "--max-writes",
+        type=int,
+        default=utils.MAX_WRITES,
+        help="Blocks written at the same time by the copies that go through memory",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print the time and bytes of each stage of the conversion and write a Chrome trace of them "
+             f"in the {AstroProfiler.PROFILE_FOLDER_NAME} folder",
+    )
+    parser.add_argument(
+        "--cprofile",
+        action="store_true",
+        help="With --profile, also write cProfile statistics of the main thread",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    cache_parser = subparsers.add_parser("cache", help="Inspect or empty the container cache")
+    cache_parser.add_argument("action", choices=["stats", "clear"])
+    args = parser.parse_args()
+
+    if args.watch and not args.mode:
+        parser.error("--watch requires --mode")
+    if args.debounce < 0:
+        parser.error("--debounce cannot be negative")
+    if args.mode:
+        if not args.all and not args.watch:
+            parser.error("batch mode requires --all or --watch")
+        if not args.savesPath:
+            parser.error("batch mode requires --savesPath")
+        if args.jobs < 1:
+            parser.error("--jobs must be at least 1")
+        if not args.output and (BATCH_MODES[args.mode] == AstroConvType.STEAM2WIN or 'LOCALAPPDATA' not in os.environ):
+            parser.error(f"--output is required for {args.mode}")
+    if args.quiet_period < 0:
+        parser.error("--quiet-period cannot be negative")
+    if args.max_reads < 1 or args.max_writes < 1:
+        parser.error("--max-reads and --max-writes must be at least 1")
+    if args.cprofile and not args.profile:
+        parser.error("--cprofile requires --profile")
+    if args.manifest_dir and not args.verify:
+        parser.error("--manifest-dir requires --verify")
+
+    return args
+
+
+def batch_conversion(args: Namespace) -> int:
+    """Run a conversion without prompting, as described by the command line.
+
+    Args:
+        args: Parsed command-line arguments, with ``mode`` set.
+
+    Returns:
+        int: Process exit code.
+    """
+    import AstroBatchScenario
+    conversion_type = BATCH_MODES[args.mode]
+    to_path = args.output or AstroSteamSaveFolder.get_steam_save_folder()
+
+    try:
+        _, failures = AstroBatchScenario.run_batch_conversion(
+            conversion_type, args.savesPath, to_path, args.jobs, AstroConflictPolicy(args.on_conflict),
+            args.wait, args.quiet_period)
+    except FileNotFoundError as e:
+        Logger.logPrint(f'No save found in {args.savesPath}')
+        Logger.logPrint(e, 'exception')
+        return 1
+    except Exception as e:
+        Logger.logPrint(e)
+        Logger.logPrint('', 'exception')
+        return 1
+
+    return 1 if failures else 0
+
+
+def watch_conversion(args: Namespace) -> int:
+    """Convert the saves of the saves path, then each save that changes, until interrupted.
+
+    Args:
+        args: Parsed command-line arguments, with ``mode`` and ``watch`` set.
+
+    Returns:
+        int: Process exit code.
+    """
+    import AstroWatchScenario
+    if not os.path.isdir(args.savesPath):
+        Logger.logPrint(f'Save folder not found: {args.savesPath}')
+        return 1
+
+    to_path = args.output or AstroSteamSaveFolder.get_steam_save_folder()
+    watcher = AstroWatchScenario.AstroSaveWatcher(
+        BATCH_MODES[args.mode], args.savesPath, to_path, args.jobs, AstroConflictPolicy(args.on_conflict),
+        args.wait, args.quiet_period)
+    try:
+        watcher.run(args.debounce, args.watch_backend)
+    except OSError as e:
+        # The inotify backend is not available
+        Logger.logPrint(f'Cannot watch {args.savesPath}: {e}')
+        return 1
+    return 0
+
+
+def cache_command(args: Namespace) -> int:
+    """Run the ``cache`` subcommand.
+
+    Args:
+        args: Parsed command-line arguments, with ``command`` set to ``"cache"``.
+
+    Returns:
+        int: Process exit code.
+    """
+    cache = AstroContainerCache.setup_cache(os.getcwd())
+    if cache is None:
+        Logger.logPrint('The container cache cannot be opened')
+        return 1
+
+    if args.action == "clear":
+        cache.clear()
+        Logger.logPrint(f'Container cache cleared: {cache.database_path}')
+        return 0
+
+    stats = cache.get_stats()
+    Logger.logPrint(f'Container cache: {cache.database_path} ({stats["database_size"] / 1024:.1f} KB)')
+    Logger.logPrint(f'\t{stats["containers"]} containers, {stats["saves"]} saves')
+    Logger.logPrint(f'\t{stats["hits"]} hits, {stats["misses"]} misses, '
+                    f'{stats["invalidations"]} invalidations (hit rate: {stats["hit_rate"]:.1%})')
+    return 0
 
 
 def windows_to_steam_conversion(original_save_path: str) -> None:
@@ -66,31 +304,39 @@ def windows_to_steam_conversion(original_save_path: str) -> None:
 
     Logger.logPrint('Container file loaded successfully !\n')
 
-    saves_to_export = Scenario.ask_saves_to_export(container.save_list, "Microsoft")
+    saves_to_export = Scenario.ask_saves_to_export(container, "Microsoft")
+    original_names = [container.get_save(save_index).name for save_index in saves_to_export]
 
-    Scenario.ask_rename_saves(saves_to_export, container.save_list)
+    Scenario.ask_rename_saves(saves_to_export, container)
 
     to_path = AstroSteamSaveFolder.get_steam_save_folder()
     utils.make_dir_if_doesnt_exists(to_path)
 
-    Logger.logPrint(f'\nExtracting saves {str([i+1 for i in saves_to_export])}')
-    Logger.logPrint(f'Exporting to Steam folder: {to_path}', "debug")
-
+    # Saves still conflicting once renamed are those the user agreed to overwrite
     for save_index in saves_to_export:
-        save = container.save_list[save_index]
+        Scenario.ask_overwrite_save_while_file_exists(container.get_save(save_index), to_path)
+    saves = [container.get_save(save_index) for save_index in saves_to_export]
 
-        Scenario.ask_overwrite_save_while_file_exists(save, to_path)
-        export_path = Scenario.export_save_to_steam(save, original_save_path, to_path)
-        Logger.logPrint(f"Container: {container_url} has been exported to {export_path}", "debug")
+    Logger.logPrint(f'\nExtracting saves {str([i+1 for i in saves_to_export])}')
+    Logger.logPrint(f'Exporting to Steam folder: {to_path}', "debug")
 
-        Logger.logPrint(f"\nSave {save.name} has been exported successfully to {export_path}")
+    save_size = sum(size for save_index in saves_to_export for size in container.get_chunks_sizes(save_index)
+                    if size > 0)
+    with AstroProgress.AstroProgress('Converting', save_size) as progress:
+        result = AstroApi.export_to_steam(container_url, saves_to_export, to_path, AstroConflictPolicy.OVERWRITE,
+                                          get_new_names(original_names, saves), on_progress=progress.advance)
+    report_export_result(result, to_path)
 
 
-def steam_to_windows_conversion(original_save_path: str) -> None:
+def steam_to_windows_conversion(original_save_path: str, wait_mode: str = "auto",
+                                quiet_period: float = AstroQuiescence.QUIET_PERIOD) -> None:
     """Convert Steam saves to the Microsoft/Xbox format.
 
     Args:
         original_save_path: Directory containing Steam ``.savegame`` files.
+        wait_mode: How to wait for Astroneer to stop writing its saves, see
+            ``AstroQuiescence.wait_until_idle``.
+        quiet_period: Seconds without write required by the ``auto`` wait mode.
 
     Raises:
         FileNotFoundError: If a save file to convert cannot be located.
@@ -98,8 +344,7 @@ def steam_to_windows_conversion(original_save_path: str) -> None:
     Logger.logPrint('\n\n/!\\ WARNING /!\\')
     Logger.logPrint('/!\\ Astroneer needs to be closed longer than 20 seconds before we can start exporting your saves /!\\')
     Logger.logPrint('/!\\ More info and save restoring procedure are available on Github (cf. README) /!\\')
-    loading_bar = LoadingBar(15)
-    loading_bar.start_loading()
+    AstroQuiescence.wait_until_idle(AstroMicrosoftSaveFolder.get_wgs_folders(), wait_mode, quiet_period)
 
     microsoft_target_folder = Scenario.backup_win_before_steam_export()
     if not microsoft_target_folder:
@@ -120,12 +365,48 @@ def steam_to_windows_conversion(original_save_path: str) -> None:
     Logger.logPrint(f'\nExtracting saves {str([i+1 for i in saves_indexes_to_export])}')
     Logger.logPrint(f'Working folder: {original_save_path} Export to: {microsoft_target_folder}', "debug")
 
-    for save_index in saves_indexes_to_export:
-        save = saves_list[save_index]
-        original_save_full_path = utils.join_paths(original_save_path, original_saves_name[save_index]+'.savegame')
-        export_path = Scenario.export_save_to_xbox(save, original_save_full_path, microsoft_target_folder)
+    savegame_paths = [utils.join_paths(original_save_path, steamsave_files_list[save_index])
+                      for save_index in saves_indexes_to_export]
+    new_names = get_new_names([original_saves_name[save_index] for save_index in saves_indexes_to_export],
+                              [saves_list[save_index] for save_index in saves_indexes_to_export])
+    save_size = sum(os.path.getsize(savegame_path) for savegame_path in savegame_paths)
+    # Existing Microsoft saves of the same name are kept, the exported ones are renamed
+    with AstroProgress.AstroProgress('Converting', save_size) as progress:
+        result = AstroApi.export_to_xbox(savegame_paths, microsoft_target_folder, AstroConflictPolicy.RENAME,
+                                         new_names, on_progress=progress.advance)
+    if result.container_path is not None:
+        Logger.logPrint(f"Container {result.container_path} has been updated", "debug")
+    report_export_result(result, microsoft_target_folder)
 
-        Logger.logPrint(f"\nSave {save.name} has been exported successfully to {export_path}")
+
+def get_new_names(original_names: List[str], saves: List[AstroSave]) -> Dict[str, str]:
+    """Return the names chosen by the user for ``AstroApi``, by original save name.
+
+    Args:
+        original_names: Name of each save before the user renamed it.
+        saves: The saves, possibly renamed.
+    """
+    return {original_name: save.name.split('$')[0]
+            for original_name, save in zip(original_names, saves) if save.name != original_name}
+
+
+def report_export_result(result: AstroApi.ExportResult, to_path: str) -> None:
+    """Log the saves exported by ``AstroApi`` to ``to_path`` and those that could not be.
+
+    Raises:
+        Exception: The error of the first save that could not be exported,
+            once every export has been logged.
+    """
+    for exported in result.exported:
+        if exported.renamed_from is not None:
+            Logger.logPrint(f"\n{exported.renamed_from} already exists, renamed to {exported.name}")
+        Logger.logPrint(f"\nSave {exported.name} has been exported successfully to {to_path}")
+    for save_name in result.skipped:
+        Logger.logPrint(f"\nSave {save_name} already exists, skipped")
+    for save_name, error in result.failed.items():
+        Logger.logPrint(f"\nSave {save_name} could not be exported ({error})")
+    if result.failed:
+        raise next(iter(result.failed.values()))
 
 
 if __name__ == "__main__":
@@ -133,13 +414,26 @@ if __name__ == "__main__":
         Logger.setup_logging(os.getcwd())
         Logger.logPrint(f"Starting AstroSaveConverter version {APP_VERSION}")
 
-        try:
-            os.system(f"title AstroSaveConverter {APP_VERSION} - Convert your Astroneer saves between Microsoft and Steam")
-        except:
-            pass
+        utils.set_console_title(
+            f"AstroSaveConverter {APP_VERSION} - Convert your Astroneer saves between Microsoft and Steam")
 
         args = get_args()
 
+        if args.command == "cache":
+            sys.exit(cache_command(args))
+        if not args.no_cache:
+            AstroContainerCache.setup_cache(os.getcwd())
+        AstroProgress.configure_progress(args.progress)
+        AstroBackup.configure_backups(compare_hash=args.backup_hash, backup_format=args.backup_format)
+        AstroVerify.configure_verification(args.verify, args.manifest_dir)
+        utils.configure_io(args.max_reads, args.max_writes)
+        if args.profile:
+            # Stopped at exit, or before waiting for the user at the end of the conversion
+            AstroProfiler.start_profiling(os.getcwd(), use_cprofile=args.cprofile)
+
+        if args.mode:
+            sys.exit(watch_conversion(args) if args.watch else batch_conversion(args))
+
         conversion_type = Scenario.ask_conversion_type()
 
         try:
@@ -157,8 +451,9 @@ if __name__ == "__main__":
         if conversion_type == AstroConvType.WIN2STEAM:
             windows_to_steam_conversion(original_save_path)
         elif conversion_type == AstroConvType.STEAM2WIN:
-            steam_to_windows_conversion(original_save_path)
+            steam_to_windows_conversion(original_save_path, args.wait, args.quiet_period)
 
+        AstroProfiler.stop_profiling()
         Logger.logPrint(f'\nTask completed, press any key to exit')
         Logger.logPrint("\n" + "-" * 60 + "\n")
         utils.wait_and_exit(0)
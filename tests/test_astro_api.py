@@ -0,0 +1,79 @@
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import AstroApi
+import main
+from cogs.AstroConflictPolicy import AstroConflictPolicy
+from cogs.AstroSaveContainer import AstroSaveContainer as Container
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'test_data')
+CONTAINER_PATH = os.path.join(TEST_DATA, 'container.32')
+
+
+def _no_prompt(*args):
+    raise AssertionError('prompted')
+
+
+def test_list_saves_of_microsoft_folder():
+    saves = AstroApi.list_saves(TEST_DATA)
+
+    assert [(save.name, save.platform, save.path, save.index) for save in saves][2] == \
+        ('SAVE_1$2020.06.14-17.40.07', 'microsoft', CONTAINER_PATH, 2)
+    assert saves[2].size == os.path.getsize(os.path.join(TEST_DATA, '3AD334FFF956470E9A432FA17EA38E5C'))
+    # Some chunks of test_data are missing
+    assert [save.size is None for save in saves] == [False, True, False, True]
+
+
+def test_export_to_steam(tmp_path):
+    with patch('builtins.input', _no_prompt):
+        result = AstroApi.export_to_steam(CONTAINER_PATH, [2, 'AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAB$2020.06.18-00.01.48'],
+                                          str(tmp_path), new_names={'SAVE_1$2020.06.14-17.40.07': 'RENAMED'})
+
+    assert [exported.name for exported in result.exported] == [
+        'RENAMED$2020.06.14-17.40.07', 'AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAB$2020.06.18-00.01.48']
+    assert result.exported[0].paths == [str(tmp_path / 'RENAMED$2020.06.14-17.40.07.savegame')]
+    assert result.size == sum(os.path.getsize(path) for exported in result.exported for path in exported.paths)
+    assert (result.skipped, result.failed) == ([], {})
+
+    result = AstroApi.export_to_steam(CONTAINER_PATH, None, str(tmp_path))
+
+    assert result.skipped == ['AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAB$2020.06.18-00.01.48']
+    assert [exported.name for exported in result.exported] == ['SAVE_1$2020.06.14-17.40.07']
+    assert sorted(result.failed) == ['HICKNUS$2020.07.22-21.27.17', 'SAVE_2$c2020.06.15-01.36.26']
+
+
+def test_export_to_steam_unknown_save(tmp_path):
+    with pytest.raises(ValueError):
+        AstroApi.export_to_steam(CONTAINER_PATH, [4], str(tmp_path))
+
+
+def test_export_to_xbox_renames_conflicts(tmp_path):
+    steam_path = tmp_path / 'steam'
+    AstroApi.export_to_steam(CONTAINER_PATH, [0, 2], str(steam_path))
+    savegame_paths = [save.path for save in AstroApi.list_saves(str(steam_path))]
+    xbox_path = tmp_path / 'xbox'
+    AstroApi.export_to_xbox(savegame_paths[:1], str(xbox_path))
+
+    result = AstroApi.export_to_xbox(savegame_paths, str(xbox_path), AstroConflictPolicy.RENAME)
+
+    assert result.container_path == str(xbox_path / 'container.1')
+    assert [(exported.name, exported.renamed_from) for exported in result.exported][0] == \
+        ('AAAAAAAAAAAAAAAAAAAAAAAAAAAAA1$2020.06.18-00.01.48',
+         'AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAB$2020.06.18-00.01.48')
+    saves = Container(result.container_path).save_list
+    assert [save.name for save in saves][1:] == [exported.name for exported in result.exported]
+    assert saves[2].chunks_names == tuple(os.path.basename(path) for path in result.exported[1].paths)
+    assert all(os.path.isfile(path) for exported in result.exported for path in exported.paths)
+
+
+def test_interactive_conversion_uses_api(tmp_path):
+    answers = iter(['3', 'y', 'NEWNAME'])
+    with patch('builtins.input', lambda *args: next(answers)), patch('cogs.AstroLogging.logPrint'), \
+            patch('main.AstroSteamSaveFolder.get_steam_save_folder', return_value=str(tmp_path)):
+        main.windows_to_steam_conversion(TEST_DATA)
+
+    assert os.listdir(tmp_path) == ['NEWNAME$2020.06.14-17.40.07.savegame']
@@ -0,0 +1,119 @@
+import os
+import shutil
+import sys
+import tracemalloc
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from cogs import AstroBackup
+
+
+@pytest.fixture
+def source(tmp_path):
+    source = tmp_path / 'source'
+    (source / 'sub').mkdir(parents=True)
+    (source / 'container.1').write_bytes(b'container')
+    (source / ('A' * 32)).write_bytes(os.urandom(4096))
+    (source / 'sub' / ('B' * 32)).write_bytes(os.urandom(1024))
+    return source
+
+
+def _read_tree(folder):
+    return {
+        os.path.relpath(os.path.join(root, name), folder): open(os.path.join(root, name), 'rb').read()
+        for root, _, names in os.walk(folder) for name in names
+    }
+
+
+def test_backup_links_unchanged_files(tmp_path, source):
+    first = tmp_path / 'backups' / 'Backup_2026.01.01-10.00'
+    second = tmp_path / 'backups' / 'Backup_2026.01.01-10.05'
+    (tmp_path / 'backups' / 'Other_2026.01.01-10.01').mkdir(parents=True)
+
+    first_result = AstroBackup.backup_folder(str(source), str(first))
+    (source / 'container.1').write_bytes(b'container edited')
+    (source / ('C' * 32)).write_bytes(b'new chunk')
+    second_result = AstroBackup.backup_folder(str(source), str(second))
+
+    assert (first_result.previous_snapshot, first_result.copied_files, first_result.linked_files) == (None, 3, 0)
+    assert second_result.previous_snapshot == str(first)
+    assert (second_result.copied_files, second_result.linked_files, second_result.linked_bytes) == (2, 2, 5120)
+    assert os.path.samefile(first / ('A' * 32), second / ('A' * 32))
+    assert os.path.samefile(first / 'sub' / ('B' * 32), second / 'sub' / ('B' * 32))
+    assert not os.path.samefile(first / 'container.1', second / 'container.1')
+    assert _read_tree(second) == _read_tree(source)
+    assert (first / 'container.1').read_bytes() == b'container'
+
+
+def test_backup_copies_when_links_fail(tmp_path, source):
+    first = tmp_path / 'Backup_2026.01.01-10.00'
+    second = tmp_path / 'Backup_2026.01.01-10.05'
+    AstroBackup.backup_folder(str(source), str(first))
+
+    with patch('os.link', side_effect=OSError('not supported')):
+        result = AstroBackup.backup_folder(str(source), str(second))
+
+    assert (result.copied_files, result.linked_files) == (3, 0)
+    assert _read_tree(second) == _read_tree(source)
+
+
+def test_backup_compare_hash(tmp_path, source):
+    first = tmp_path / 'Backup_2026.01.01-10.00'
+    second = tmp_path / 'Backup_2026.01.01-10.05'
+    AstroBackup.backup_folder(str(source), str(first))
+    # Same size and date, different content
+    chunk = source / ('A' * 32)
+    chunk_stat = chunk.stat()
+    chunk.write_bytes(os.urandom(4096))
+    os.utime(chunk, ns=(chunk_stat.st_atime_ns, chunk_stat.st_mtime_ns))
+
+    AstroBackup.configure_backups(compare_hash=True)
+    try:
+        result = AstroBackup.backup_folder(str(source), str(second))
+    finally:
+        AstroBackup.configure_backups()
+
+    assert (result.copied_files, result.linked_files) == (1, 2)
+    assert _read_tree(second) == _read_tree(source)
+
+
+@pytest.mark.parametrize('backup_format', ['zip', 'tar.gz', 'tar.xz'])
+def test_archive_folders(tmp_path, source, backup_format):
+    second_source = tmp_path / 'second'
+    second_source.mkdir()
+    (second_source / 'container.2').write_bytes(b'\x00' * 100000)
+    targets = [str(tmp_path / 'backups' / 'Backup_1'), str(tmp_path / 'backups' / 'Backup_2')]
+    (tmp_path / 'backups').mkdir()
+
+    with patch('cogs.AstroLogging.logPrint'):
+        results = AstroBackup.archive_folders(list(zip([str(source), str(second_source)], targets)), backup_format)
+
+    assert [result.archive_path for result in results] == [target + '.' + backup_format for target in targets]
+    assert results[1].source_bytes == 100000 and results[1].ratio < 0.1
+    extracted = tmp_path / 'extracted'
+    for result in results:
+        shutil.unpack_archive(result.archive_path, str(extracted))
+    assert _read_tree(extracted / 'Backup_1') == _read_tree(source)
+    assert _read_tree(extracted / 'Backup_2') == _read_tree(second_source)
+    assert sorted(os.listdir(tmp_path / 'backups')) == sorted(os.path.basename(r.archive_path) for r in results)
+
+
+@pytest.mark.parametrize('backup_format', ['zip', 'tar.gz'])
+def test_archive_memory_stays_bounded(tmp_path, backup_format):
+    source = tmp_path / 'source'
+    source.mkdir()
+    with open(source / 'chunk', 'wb') as chunk:
+        for _ in range(16):
+            chunk.write(os.urandom(1024 * 1024))
+
+    tracemalloc.start()
+    try:
+        AstroBackup.archive_folder(str(source), str(tmp_path / 'Backup'), backup_format)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # A few blocks (read buffer, compressor output, file buffer), whatever the file size
+    assert peak < 6 * AstroBackup.ARCHIVE_BLOCK_SIZE
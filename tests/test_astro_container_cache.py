@@ -0,0 +1,104 @@
+import os
+import shutil
+import sys
+import time
+import uuid
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from cogs import AstroContainerCache
+from cogs.AstroSaveContainer import AstroSaveContainer as Container
+from cogs.AstroSaveContainer import AstroSaveContainerWriter as ContainerWriter
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'test_data')
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = AstroContainerCache.setup_cache(str(tmp_path / 'astro'))
+    yield cache
+    AstroContainerCache.disable_cache()
+
+
+def _make_old(path):
+    old = time.time() - 60
+    os.utime(path, (old, old))
+
+
+def _copy_test_data(folder):
+    folder.mkdir()
+    for file_name in os.listdir(TEST_DATA):
+        shutil.copy(os.path.join(TEST_DATA, file_name), folder)
+    container_path = str(folder / 'container.32')
+    _make_old(container_path)
+    return container_path
+
+
+def test_container_served_from_cache(tmp_path, cache):
+    container_path = _copy_test_data(tmp_path / 'saves')
+    saves = [(save.name, save.chunks_names) for save in Container(container_path).save_list]
+
+    with patch.object(Container, '_find_saves_until') as find_saves_until:
+        container = Container(container_path)
+        assert [(save.name, save.chunks_names) for save in container.save_list] == saves
+        assert container.get_chunks_sizes(2) == [os.path.getsize(tmp_path / 'saves' / saves[2][1][0])]
+
+    find_saves_until.assert_not_called()
+    assert cache.session_stats == {'hits': 1, 'misses': 1, 'invalidations': 0}
+
+
+def test_rewritten_chunk_size_not_served_from_cache(tmp_path, cache):
+    container_path = _copy_test_data(tmp_path / 'saves')
+    chunk_name = Container(container_path).save_list[2].chunks_names[0]
+
+    # The game rewrites a chunk file in place, its container is left as it is
+    (tmp_path / 'saves' / chunk_name).write_bytes(b'rewritten')
+    container = Container(container_path)
+
+    assert container.get_chunks_sizes(2) == [len(b'rewritten')]
+    assert cache.session_stats == {'hits': 1, 'misses': 1, 'invalidations': 0}
+
+
+def test_cache_keeps_original_names(tmp_path, cache):
+    container_path = _copy_test_data(tmp_path / 'saves')
+    container = Container(container_path)
+    container.get_save(0).rename('RENAMED')
+
+    container.save_list
+
+    assert Container(container_path).get_save(0).name == 'AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAB$2020.06.18-00.01.48'
+
+
+def test_cache_invalidated_when_container_changes(tmp_path, cache):
+    container_path = _copy_test_data(tmp_path / 'saves')
+    list(Container(container_path).iter_saves())
+    writer = ContainerWriter(str(tmp_path / 'saves'))
+    writer.add_save('NEW$2021.01.01-00.00.00', [uuid.uuid4()])
+    writer.commit(fsync=False)
+
+    saves = Container(container_path).save_list
+    assert saves[-1].name == 'NEW$2021.01.01-00.00.00'
+    # Just modified, it may change again within the same mtime: not cached yet
+    assert cache.get_stats()['containers'] == 0
+
+    _make_old(container_path)
+    Container(container_path).save_list
+    assert [save.name for save in Container(container_path).save_list] == [save.name for save in saves]
+    assert cache.session_stats == {'hits': 1, 'misses': 2, 'invalidations': 1}
+
+
+def test_cache_stats_persist(tmp_path, cache):
+    container_path = _copy_test_data(tmp_path / 'saves')
+    Container(container_path).save_list
+    Container(container_path).save_list
+    cache.close()
+
+    reopened = AstroContainerCache.setup_cache(str(tmp_path / 'astro'))
+    stats = reopened.get_stats()
+
+    assert (stats['containers'], stats['saves'], stats['hits'], stats['misses']) == (1, 4, 1, 1)
+    assert stats['hit_rate'] == 0.5
+    reopened.clear()
+    assert reopened.get_stats()['containers'] == 0
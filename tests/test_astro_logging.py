@@ -0,0 +1,51 @@
+import logging
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from cogs import AstroLogging as Logger
+
+
+class _Unprintable:
+    def __str__(self):
+        raise AssertionError('formatted although not logged')
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    root_level = logging.getLogger().level
+    Logger.setup_logging(str(tmp_path))
+    yield tmp_path / 'logs' / 'astro_converter.log'
+    Logger.shutdown_logging()
+    logging.getLogger().setLevel(root_level)
+
+
+def test_arguments_not_formatted_below_level():
+    root_logger = logging.getLogger()
+    root_level = root_logger.level
+    root_logger.setLevel(logging.INFO)
+    try:
+        Logger.logPrint('Chunk: %s', 'debug', _Unprintable())
+    finally:
+        root_logger.setLevel(root_level)
+
+
+def test_info_printed_with_arguments(capsys):
+    Logger.logPrint('%d saves in %s', 'info', 3, 'folder')
+
+    assert capsys.readouterr().out == '3 saves in folder\n'
+
+
+def test_records_written_by_background_thread(log_file):
+    chunks_names = ['A']
+    Logger.logPrint('Chunk written: %s (%d bytes)', 'debug', 'B' * 32, 42)
+    Logger.logPrint('Chunks: %s', 'debug', chunks_names)
+    # Mutable arguments are formatted when the message is logged
+    chunks_names.append('C')
+    Logger.shutdown_logging()
+
+    lines = log_file.read_text().splitlines()
+    assert lines[0].endswith(f"DEBUG  Chunk written: {'B' * 32} (42 bytes)")
+    assert lines[1].endswith("DEBUG  Chunks: ['A']")
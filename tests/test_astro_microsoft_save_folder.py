@@ -0,0 +1,94 @@
+import os
+import shutil
+import sys
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from cogs import AstroMicrosoftSaveFolder
+from cogs.AstroSaveContainer import AstroSaveContainer as Container
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'test_data')
+
+
+def _make_wgs(root):
+    save_folder = root / '000900000A1B2C3D_0000000000000000000000006A2F1E9C' / 'E1B1A2D59BD44A3B8C5F55C5DA6FC5D2'
+    save_folder.mkdir(parents=True)
+    shutil.copy(os.path.join(TEST_DATA, 'container.32'), save_folder)
+    settings_folder = root / '000900000A1B2C3D_0000000000000000000000006A2F1E9C' / 'B0C1D8E4'
+    settings_folder.mkdir()
+    Container.create_empty_container(str(settings_folder))
+    (root / 'containers.index').write_bytes(b'\x0e\x00\x00\x00')
+    return save_folder
+
+
+def test_get_save_folders_from_path(tmp_path):
+    save_folder = _make_wgs(tmp_path)
+
+    with patch('cogs.AstroLogging.logPrint'):
+        assert AstroMicrosoftSaveFolder.get_save_folders_from_path(str(tmp_path)) == [str(save_folder)]
+
+
+def test_get_save_folders_from_path_reads_only_the_first_chunk(tmp_path):
+    _make_wgs(tmp_path)
+    real_open = open
+    read_sizes = []
+
+    class RecordingFile:
+        def __init__(self, file):
+            self.file = file
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            self.file.close()
+
+        def read(self, size=-1):
+            read_sizes.append(size)
+            return self.file.read(size)
+
+    with patch('builtins.open', side_effect=lambda *args, **kwargs: RecordingFile(real_open(*args, **kwargs))), \
+            patch('cogs.AstroLogging.logPrint'):
+        AstroMicrosoftSaveFolder.get_save_folders_from_path(str(tmp_path))
+
+    assert read_sizes and all(0 < size <= 168 for size in read_sizes)
+
+
+def test_get_save_folders_from_paths_keeps_order(tmp_path):
+    first_root, second_root = tmp_path / 'first', tmp_path / 'second'
+    first_folder, second_folder = _make_wgs(first_root), _make_wgs(second_root)
+
+    with patch('cogs.AstroLogging.logPrint'):
+        folders = AstroMicrosoftSaveFolder.get_save_folders_from_paths([str(second_root), str(first_root)])
+
+    assert folders == [str(second_folder), str(first_folder)]
+
+
+def test_get_save_details_of_every_container(tmp_path):
+    save_folder = _make_wgs(tmp_path)
+    shutil.copy(os.path.join(TEST_DATA, 'container.32'), save_folder / 'container.33')
+    for chunk_name in ('3AD334FFF956470E9A432FA17EA38E5C', 'A178B110FB374A539EC6A93E49F105DD'):
+        shutil.copy(os.path.join(TEST_DATA, chunk_name), save_folder)
+
+    with patch('cogs.AstroLogging.logPrint'), patch('os.scandir', side_effect=os.scandir) as scandir:
+        details = AstroMicrosoftSaveFolder.get_save_details(str(save_folder))
+
+    assert scandir.call_count == 1
+    assert [(save.name, save.date_string, save.is_creative, save.index) for save in details[:4]] == [
+        ('AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAB', '2020-06-18 00:01:48', False, 0),
+        ('HICKNUS', '2020-07-22 21:27:17', False, 1),
+        ('SAVE_1', '2020-06-14 17:40:07', False, 2),
+        ('SAVE_2', '2020-06-15 01:36:26', True, 3),
+    ]
+    assert [save.container_path for save in details] == \
+        [str(save_folder / 'container.32')] * 4 + [str(save_folder / 'container.33')] * 4
+    assert details[2].size == os.path.getsize(os.path.join(TEST_DATA, '3AD334FFF956470E9A432FA17EA38E5C'))
+    assert [save.size is None for save in details[:4]] == [False, True, False, True]
+    assert details[1].chunk_count == len(Container(str(save_folder / 'container.32'))[1].chunks_names)
+
+
+def test_get_save_details_skips_unreadable_containers(tmp_path):
+    (tmp_path / 'container.1').write_bytes(b'\x00' * 8)
+
+    with patch('cogs.AstroLogging.logPrint'):
+        assert AstroMicrosoftSaveFolder.get_save_details(str(tmp_path)) == []
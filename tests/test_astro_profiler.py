@@ -0,0 +1,64 @@
+import json
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import AstroApi
+from cogs import AstroProfiler
+from cogs.AstroSaveContainer import AstroSaveContainer as Container
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'test_data')
+
+
+def _record_worker_span():
+    with AstroProfiler.span('worker'):
+        pass
+
+
+def test_nothing_recorded_while_disabled():
+    @AstroProfiler.timed('stage')
+    def stage():
+        return 42
+
+    with AstroProfiler.span('block') as block:
+        block.add_bytes(10)
+    assert stage() == 42
+    assert AstroProfiler.get_stages() == {}
+
+
+def test_wall_time_counts_concurrent_calls_once():
+    AstroProfiler._spans[:] = [('copy', 0, 10, 1, 5), ('copy', 5, 10, 2, 5), ('copy', 30, 5, 1, 0)]
+    try:
+        assert AstroProfiler.get_stages() == {
+            'copy': {'calls': 3, 'seconds': 25e-9, 'wall_seconds': 20e-9, 'bytes': 10}}
+    finally:
+        AstroProfiler._spans.clear()
+
+
+def test_profile_of_an_export(tmp_path):
+    AstroProfiler.start_profiling(str(tmp_path), use_cprofile=True)
+    try:
+        container = Container(os.path.join(TEST_DATA, 'container.32'))
+        save = container.get_save(0)
+        AstroApi.export_save_to_steam(save, TEST_DATA, str(tmp_path), on_progress=lambda _: None)
+        worker = threading.Thread(target=_record_worker_span, name='worker-1')
+        worker.start()
+        worker.join()
+        stages = AstroProfiler.get_stages()
+    finally:
+        trace_path = AstroProfiler.stop_profiling()
+
+    save_size = sum(os.path.getsize(os.path.join(TEST_DATA, chunk_name)) for chunk_name in save.chunks_names)
+    assert list(stages)[:2] == ['container_open', 'container_parse']
+    assert stages['chunk_io']['calls'] == 1 and stages['chunk_io']['bytes'] == save_size
+    assert stages['chunk_io']['wall_seconds'] == stages['chunk_io']['seconds']
+
+    with open(trace_path) as trace_file:
+        events = json.load(trace_file)['traceEvents']
+    spans = [event for event in events if event['ph'] == 'X']
+    assert {event['name'] for event in spans} == set(stages)
+    assert all(event['dur'] >= 0 and event['ts'] >= 0 for event in spans)
+    assert {'name': 'worker-1'} in [event['args'] for event in events if event['ph'] == 'M']
+    assert os.path.isfile(trace_path[:-len('.trace.json')] + '.prof')
+    assert not AstroProfiler.is_profiling()
@@ -0,0 +1,87 @@
+import io
+import json
+import os
+import sys
+import threading
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import AstroApi
+from cogs import AstroProgress
+from cogs.AstroSave import AstroSave
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'test_data')
+
+
+class RecordingStream(io.StringIO):
+    def __init__(self, is_terminal):
+        super().__init__()
+        self.is_terminal = is_terminal
+        self.writes = []
+
+    def isatty(self):
+        return self.is_terminal
+
+    def write(self, text):
+        self.writes.append(text)
+        return super().write(text)
+
+
+def test_bar_redraw_is_capped():
+    stream = RecordingStream(is_terminal=True)
+
+    with AstroProgress.AstroProgress('SAVE', 4000 * 1024, stream) as progress:
+        threads = [threading.Thread(target=lambda: [progress.advance(1024) for _ in range(1000)])
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert progress.done_bytes == 4000 * 1024
+    # One write per frame, the first one and the final one at least
+    assert 2 <= len(stream.writes) < 100
+    assert all(frame.startswith('\r') for frame in stream.writes)
+    assert '100.0%' in stream.writes[-1] and stream.writes[-1].endswith('\n')
+    assert 'MB/s' in stream.writes[-1]
+
+
+def test_json_progress_when_not_a_terminal():
+    stream = RecordingStream(is_terminal=False)
+
+    with AstroProgress.AstroProgress('SAVE', 100, stream) as progress:
+        progress.advance(60)
+        progress.advance(40)
+
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [event['event'] for event in events] == ['start', 'progress', 'end']
+    assert (events[-1]['done_bytes'], events[-1]['total_bytes']) == (100, 100)
+
+
+def test_no_progress(capsys):
+    with AstroProgress.AstroProgress('SAVE', 100, mode='none') as progress:
+        progress.advance(100)
+
+    assert capsys.readouterr().out == ''
+
+
+def test_clear_progress_line():
+    stream = RecordingStream(is_terminal=True)
+    progress = AstroProgress.AstroProgress('SAVE', 100, stream)
+    progress.advance(10)
+    frame_width = len(stream.writes[-1]) - 1
+
+    AstroProgress.clear_progress_line()
+    progress.finish()
+
+    assert stream.writes[-2] == '\r' + ' ' * frame_width + '\r'
+
+
+def test_export_reports_every_byte(tmp_path):
+    save = AstroSave('HICKNUS$2020.07.22-21.27.17',
+                     ['A178B110FB374A539EC6A93E49F105DD', '3AD334FFF956470E9A432FA17EA38E5C'])
+    reported = []
+
+    export_path = AstroApi.export_save_to_steam(save, TEST_DATA, str(tmp_path), reported.append)
+
+    assert sum(reported) == os.path.getsize(export_path)
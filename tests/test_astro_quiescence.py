@@ -0,0 +1,71 @@
+import os
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from cogs import AstroQuiescence
+
+
+def _make_wgs(root, age):
+    save_folder = root / 'user' / 'saves'
+    save_folder.mkdir(parents=True)
+    (save_folder / 'container.1').write_bytes(b'\x04\x00')
+    past = time.time() - age
+    for path in (save_folder / 'container.1', save_folder, root / 'user', root):
+        os.utime(path, (past, past))
+    return save_folder
+
+
+def test_no_wait_when_not_modified_recently(tmp_path):
+    _make_wgs(tmp_path, 3600)
+
+    with patch('time.sleep') as sleep, patch('cogs.AstroLogging.logPrint'):
+        assert AstroQuiescence.wait_for_quiescence([str(tmp_path), str(tmp_path / 'missing')])
+
+    sleep.assert_not_called()
+    assert AstroQuiescence.get_idle_time([str(tmp_path)]) >= 3600
+
+
+def test_no_wait_without_save_folder(tmp_path):
+    with patch('time.sleep') as sleep:
+        assert AstroQuiescence.wait_until_idle([str(tmp_path / 'missing')]) < 1
+
+    sleep.assert_not_called()
+
+
+def test_wait_until_quiet(tmp_path):
+    save_folder = _make_wgs(tmp_path, 3600)
+    container = save_folder / 'container.1'
+    os.utime(container)
+
+    def write_again():
+        time.sleep(0.2)
+        container.write_bytes(b'\x04\x00\x00')
+
+    writer = threading.Thread(target=write_again)
+    start = time.monotonic()
+    with patch('cogs.AstroLogging.logPrint'):
+        writer.start()
+        assert AstroQuiescence.wait_for_quiescence([str(tmp_path)], quiet_period=0.4, poll_period=0.05)
+    writer.join()
+
+    # The second write restarted the quiet period
+    assert time.monotonic() - start >= 0.55
+    assert AstroQuiescence.get_idle_time([str(tmp_path)]) >= 0.4
+
+
+def test_wait_timeout(tmp_path):
+    _make_wgs(tmp_path, 0)
+
+    with patch('cogs.AstroLogging.logPrint'):
+        assert not AstroQuiescence.wait_for_quiescence([str(tmp_path)], quiet_period=60, timeout=0.1)
+
+
+def test_fixed_wait(tmp_path):
+    with patch('cogs.AstroQuiescence.LoadingBar') as loading_bar:
+        AstroQuiescence.wait_until_idle([str(tmp_path)], 'fixed')
+
+    loading_bar.assert_called_once_with(AstroQuiescence.FIXED_WAIT)
+    loading_bar.return_value.start_loading.assert_called_once_with()
@@ -0,0 +1,110 @@
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import utils
+from cogs.AstroSave import AstroSave
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'test_data')
+
+
+def _make_chunks(folder, contents):
+    names = []
+    for i, content in enumerate(contents):
+        name = f'{i:032X}'
+        with open(os.path.join(folder, name), 'wb') as chunk:
+            chunk.write(content)
+        names.append(name)
+    return names
+
+
+def test_convert_to_steam_file_concatenates_chunks(tmp_path):
+    save = AstroSave('SAVE_1$2020.06.14-17.40.07',
+                     ['A178B110FB374A539EC6A93E49F105DD', '3AD334FFF956470E9A432FA17EA38E5C'])
+    target = str(tmp_path / save.get_file_name())
+
+    written = save.convert_to_steam_file(TEST_DATA, target)
+
+    expected = b''
+    for chunk_name in save.chunks_names:
+        with open(os.path.join(TEST_DATA, chunk_name), 'rb') as chunk_file:
+            expected += chunk_file.read()
+    with open(target, 'rb') as steam_save:
+        content = steam_save.read()
+    assert content == expected
+    assert written == len(content)
+
+
+def test_convert_to_steam_file_without_kernel_copy(tmp_path):
+    contents = [os.urandom(utils.STREAM_BUFFER_SIZE + 17), b'', os.urandom(42)]
+    save = AstroSave('SAVE$2020.06.14-17.40.07', _make_chunks(str(tmp_path), contents))
+    target = str(tmp_path / save.get_file_name())
+
+    with patch('utils._get_kernel_copy_functions', return_value=[]):
+        written = save.convert_to_steam_file(str(tmp_path), target)
+
+    with open(target, 'rb') as steam_save:
+        assert steam_save.read() == b''.join(contents)
+    assert written == sum(len(content) for content in contents)
+
+
+def test_write_xbox_chunks(tmp_path):
+    chunk_size = 64 * 1024
+    content = os.urandom(5 * chunk_size + 1)
+    source = tmp_path / 'SAVE$2020.06.14-17.40.07.savegame'
+    source.write_bytes(content)
+    to_path = tmp_path / 'xbox'
+    to_path.mkdir()
+    save = AstroSave('SAVE$2020.06.14-17.40.07', [])
+
+    chunk_uuids = save.write_xbox_chunks(str(source), str(to_path), 3, chunk_size)
+
+    assert save.chunks_names == tuple(chunk_uuid.hex.upper() for chunk_uuid in chunk_uuids)
+    assert sorted(os.listdir(to_path)) == sorted(save.chunks_names)
+    assert b''.join((to_path / name).read_bytes() for name in save.chunks_names) == content
+
+
+def test_write_xbox_chunks_rolls_back_on_failure(tmp_path):
+    chunk_size = 1024
+    source = tmp_path / 'SAVE$2020.06.14-17.40.07.savegame'
+    source.write_bytes(os.urandom(8 * chunk_size))
+    to_path = tmp_path / 'xbox'
+    to_path.mkdir()
+    (to_path / 'container.1').write_bytes(b'')
+    save = AstroSave('SAVE$2020.06.14-17.40.07', [])
+    real_copy_file_slice = utils.copy_file_slice
+
+    def failing_copy_file_slice(source, offset, length, target, on_progress=None, digest=None):
+        if offset == 5 * chunk_size:
+            raise OSError('disk full')
+        return real_copy_file_slice(source, offset, length, target, on_progress, digest)
+
+    with patch('cogs.AstroSave.copy_file_slice', side_effect=failing_copy_file_slice):
+        with pytest.raises(OSError, match='disk full'):
+            save.write_xbox_chunks(str(source), str(to_path), 2, chunk_size)
+
+    assert os.listdir(to_path) == ['container.1']
+
+
+def test_chunks_stored_as_raw_guids():
+    chunks_names = ['A178B110FB374A539EC6A93E49F105DD', '3AD334FFF956470E9A432FA17EA38E5C']
+    save = AstroSave('SAVE_1$2020.06.14-17.40.07', chunks_names)
+
+    assert not hasattr(save, '__dict__')
+    assert save.chunks_guids == bytes.fromhex(''.join(chunks_names))
+    assert save.chunks_names == tuple(chunks_names)
+    assert (save.chunk_count, save.get_chunk_name(1)) == (2, chunks_names[1])
+    assert AstroSave.from_guids(save.name, save.chunks_guids).chunks_names == tuple(chunks_names)
+
+    new_uuid = save.regenerate_uuid(0)
+    assert save.chunks_names == (new_uuid.hex.upper(), chunks_names[1])
+    # Names are only changed by assigning them
+    with pytest.raises(TypeError):
+        save.chunks_names[0] = chunks_names[0]
+    save.chunks_names = chunks_names
+    assert save.chunks_names == tuple(chunks_names)
+    with pytest.raises(ValueError):
+        AstroSave(save.name, ['A178B110'])
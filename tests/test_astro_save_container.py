@@ -0,0 +1,180 @@
+import os
+import shutil
+import sys
+import uuid
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from cogs.AstroSave import guid_to_chunk_name
+from utils import atomic_write
+from cogs.AstroSaveContainer import AstroSaveContainer as Container
+from cogs.AstroSaveContainer import AstroSaveContainerWriter as ContainerWriter
+from benchmarks.bench_container_parser import legacy_parse, write_container
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'test_data')
+
+
+def test_parse_test_data_container():
+    container = Container(os.path.join(TEST_DATA, 'container.32'))
+
+    assert container.chunk_count == 7
+    assert [(save.name, save.chunks_names) for save in container.save_list] == [
+        ('AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAB$2020.06.18-00.01.48',
+         ('A178B110FB374A539EC6A93E49F105DD',)),
+        ('HICKNUS$2020.07.22-21.27.17',
+         ('D227C70A197B4EE19EA2374E017F0E07', '6B314A1D2A4B4F93970B8D0D6C184ACE')),
+        ('SAVE_1$2020.06.14-17.40.07', ('3AD334FFF956470E9A432FA17EA38E5C',)),
+        ('SAVE_2$c2020.06.15-01.36.26',
+         ('86301F680CB54583B26A551BC3C7A012', '764CC546461D4859BD32000B37D670E0',
+          '3030F22EC4384E6B9C724A85B8CA354C')),
+    ]
+
+
+def test_parser_matches_legacy_parser(tmp_path):
+    container_path = str(tmp_path / 'container.1')
+    write_container(container_path, 10007)
+
+    saves = Container(container_path).save_list
+    legacy_saves = legacy_parse(container_path)
+
+    assert len(saves) == 3336
+    assert [(s.name, s.chunks_names) for s in saves] == \
+        [(s.name, s.chunks_names) for s in legacy_saves]
+
+
+def test_parse_empty_container(tmp_path):
+    Container.create_empty_container(str(tmp_path))
+
+    container = Container(str(tmp_path / 'container.1'))
+
+    assert container.chunk_count == 0
+    assert container.save_list == []
+
+
+def test_parse_truncated_container(tmp_path):
+    container_path = str(tmp_path / 'container.1')
+    write_container(container_path, 3)
+    with open(container_path, 'r+b') as container:
+        container.truncate(8 + 2 * 160)
+
+    with pytest.raises(Exception, match='truncated'):
+        Container(container_path)
+
+
+def test_guid_to_chunk_name():
+    for _ in range(100):
+        chunk_uuid = uuid.uuid4()
+        assert guid_to_chunk_name(chunk_uuid.bytes_le) == chunk_uuid.hex.upper()
+
+
+def test_lazy_container_random_access(tmp_path):
+    container_path = str(tmp_path / 'container.1')
+    write_container(container_path, 30)
+    legacy_saves = legacy_parse(container_path)
+
+    container = Container(container_path)
+    save = container.get_save(7)
+
+    assert (save.name, save.chunks_names) == (legacy_saves[7].name, legacy_saves[7].chunks_names)
+    assert container.get_save(7) is save
+    assert len(container) == 10
+    assert [s.name for s in container.iter_saves()] == [s.name for s in legacy_saves]
+    assert container.save_list[7] is save
+    with pytest.raises(IndexError):
+        container.get_save(10)
+
+
+def test_lazy_container_negative_index():
+    container = Container(os.path.join(TEST_DATA, 'container.32'))
+
+    assert container.get_save(-1) is container.get_save(len(container) - 1)
+    with pytest.raises(IndexError):
+        container.get_save(-len(container) - 1)
+    with pytest.raises(IndexError):
+        container.get_chunks_sizes(-len(container) - 1)
+
+
+def test_lazy_container_misleading_chunk_metadata(tmp_path):
+    container_path = str(tmp_path / 'container.1')
+    names = ['A$2021.01.01-00.00.00$$0$3$1', 'A$2021.01.01-00.00.00$$1$3$1',
+             'B$2021.01.01-00.00.00$$2$3$1', 'B$2021.01.01-00.00.00']
+    with open(container_path, 'wb') as container_file:
+        container_file.write(b'\x04\x00\x00\x00' + len(names).to_bytes(4, byteorder='little'))
+        for name in names:
+            encoded_name = name.encode('utf-16le')
+            container_file.write(encoded_name + b'\x00' * (144 - len(encoded_name)) + uuid.uuid4().bytes_le)
+
+    container = Container(container_path)
+
+    assert [(save.name, len(save.chunks_names)) for save in container] == \
+        [('A$2021.01.01-00.00.00', 2), ('B$2021.01.01-00.00.00', 2)]
+
+
+def test_lazy_container_other_save_within_multi_chunk_save(tmp_path):
+    container_path = str(tmp_path / 'container.1')
+    names = ['A$2021.01.01-00.00.00$$0$3$1', 'B$2021.01.01-00.00.00', 'A$2021.01.01-00.00.00$$2$3$1']
+    with open(container_path, 'wb') as container_file:
+        container_file.write(b'\x04\x00\x00\x00' + len(names).to_bytes(4, byteorder='little'))
+        for name in names:
+            encoded_name = name.encode('utf-16le')
+            container_file.write(encoded_name + b'\x00' * (144 - len(encoded_name)) + uuid.uuid4().bytes_le)
+
+    container = Container(container_path)
+
+    assert [(save.name, len(save.chunks_names)) for save in container] == \
+        [('A$2021.01.01-00.00.00', 1), ('B$2021.01.01-00.00.00', 1), ('A$2021.01.01-00.00.00', 1)]
+
+
+def test_container_writer_single_commit(tmp_path):
+    shutil.copy(os.path.join(TEST_DATA, 'container.32'), tmp_path)
+    shutil.copy(os.path.join(TEST_DATA, '3AD334FFF956470E9A432FA17EA38E5C'), tmp_path)
+    container_path = str(tmp_path / 'container.32')
+    replaced_save = Container(container_path).get_save(2)
+    writer = ContainerWriter(str(tmp_path))
+    new_chunks = [[uuid.uuid4()], [uuid.uuid4() for _ in range(12)]]
+
+    writer.add_save('NEW1$2021.01.01-00.00.00', new_chunks[0])
+    writer.add_save('NEW2$2021.01.01-00.00.00', new_chunks[1])
+    writer.remove_save(replaced_save)
+    with patch('cogs.AstroSaveContainer.atomic_write', wraps=atomic_write) as atomic_write_mock:
+        assert writer.commit(fsync=False) == container_path
+
+    assert atomic_write_mock.call_count == 1
+    assert not writer.has_changes()
+    assert not (tmp_path / '3AD334FFF956470E9A432FA17EA38E5C').exists()
+    container = Container(container_path)
+    assert container.chunk_count == 7 - 1 + 13
+    assert [(save.name, save.chunks_names) for save in container.save_list[-2:]] == [
+        ('NEW1$2021.01.01-00.00.00', tuple(chunk.hex.upper() for chunk in new_chunks[0])),
+        ('NEW2$2021.01.01-00.00.00', tuple(chunk.hex.upper() for chunk in new_chunks[1])),
+    ]
+    assert 'SAVE_1$2020.06.14-17.40.07' not in [save.name for save in container]
+
+
+def test_container_writer_creates_container(tmp_path):
+    writer = ContainerWriter(str(tmp_path))
+    chunk_uuid = uuid.uuid4()
+
+    writer.add_save('NEW$2021.01.01-00.00.00', [chunk_uuid])
+    writer.commit()
+
+    saves = Container(str(tmp_path / 'container.1')).save_list
+    assert [(save.name, save.chunks_names) for save in saves] == \
+        [('NEW$2021.01.01-00.00.00', (chunk_uuid.hex.upper(),))]
+
+
+def test_interrupted_commit_leaves_no_container(tmp_path):
+    shutil.copy(os.path.join(TEST_DATA, 'container.32'), tmp_path)
+    writer = ContainerWriter(str(tmp_path))
+    writer.add_save('NEW$2021.01.01-00.00.00', [uuid.uuid4()])
+
+    with patch('os.replace', side_effect=KeyboardInterrupt):
+        with pytest.raises(KeyboardInterrupt):
+            writer.commit(fsync=False)
+    assert os.listdir(tmp_path) == ['container.32']
+
+    # Left by a killed process
+    shutil.copy(os.path.join(TEST_DATA, 'container.32'), tmp_path / '.astro-0123456789abcdef.partial')
+    assert Container.get_containers_list(str(tmp_path)) == ['container.32']
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import utils
+import AstroApi
+from cogs import AstroVerify
+from cogs.AstroSave import AstroSave, XBOX_CHUNK_SIZE
+from cogs.AstroSaveContainer import AstroSaveContainer as Container
+from errors import ExportVerificationError
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'test_data')
+
+
+@pytest.fixture
+def manifest_path(tmp_path):
+    manifest_path = tmp_path / 'manifests'
+    AstroVerify.configure_verification(True, str(manifest_path))
+    yield manifest_path
+    AstroVerify.configure_verification(False)
+
+
+def _blake2(content):
+    return hashlib.blake2b(content, digest_size=AstroVerify.DIGEST_SIZE).hexdigest()
+
+
+original_write_full = utils.write_full
+
+
+def _corrupting_write_full(target, view, on_written=None):
+    # A block altered between the moment it is read and the moment it is written
+    view[0] ^= 0xFF
+    original_write_full(target, view, on_written)
+
+
+def test_steam_export_writes_manifest(tmp_path, manifest_path):
+    save = AstroSave('SAVE_1$2020.06.14-17.40.07',
+                     ['A178B110FB374A539EC6A93E49F105DD', '3AD334FFF956470E9A432FA17EA38E5C'])
+    to_path = tmp_path / 'steam'
+    to_path.mkdir()
+
+    export_path = AstroApi.export_save_to_steam(save, TEST_DATA, str(to_path), on_progress=lambda _: None)
+
+    with open(manifest_path / 'SAVE_1$2020.06.14-17.40.07.steam.manifest.json') as manifest_file:
+        manifest = json.load(manifest_file)
+    with open(export_path, 'rb') as steam_save:
+        content = steam_save.read()
+    assert os.listdir(to_path) == ['SAVE_1$2020.06.14-17.40.07.savegame']
+    assert (manifest['save'], manifest['format'], manifest['folder'], manifest['size']) == \
+        (save.name, 'steam', str(to_path), len(content))
+    assert manifest['digest'] == _blake2(content)
+    for chunk, chunk_name in zip(manifest['chunks'], save.chunks_names):
+        with open(os.path.join(TEST_DATA, chunk_name), 'rb') as chunk_file:
+            chunk_content = chunk_file.read()
+        assert chunk == {'guid': chunk_name, 'size': len(chunk_content), 'digest': _blake2(chunk_content)}
+
+
+def test_xbox_export_writes_manifest(tmp_path, manifest_path):
+    source = tmp_path / 'SAVE$2020.06.14-17.40.07.savegame'
+    source.write_bytes(os.urandom(2 * XBOX_CHUNK_SIZE + 5))
+    to_path = tmp_path / 'xbox'
+    save = AstroSave('SAVE$2020.06.14-17.40.07', [])
+
+    AstroApi.export_save_to_xbox(save, str(source), str(to_path), on_progress=lambda _: None)
+
+    with open(manifest_path / 'SAVE$2020.06.14-17.40.07.microsoft.manifest.json') as manifest_file:
+        manifest = json.load(manifest_file)
+    # The game finds nothing but its chunks and container in the save folder
+    assert sorted(os.listdir(to_path)) == sorted(save.chunks_names + ('container.1',))
+    assert tuple(chunk['guid'] for chunk in manifest['chunks']) == save.chunks_names
+    assert [chunk['size'] for chunk in manifest['chunks']] == [XBOX_CHUNK_SIZE, XBOX_CHUNK_SIZE, 5]
+    for chunk in manifest['chunks']:
+        assert chunk['digest'] == _blake2((to_path / chunk['guid']).read_bytes())
+    assert Container(str(to_path / 'container.1')).save_list[0].chunks_names == save.chunks_names
+
+
+def test_corrupted_steam_export_leaves_no_file(tmp_path, manifest_path):
+    save = AstroSave('SAVE_1$2020.06.14-17.40.07', ['A178B110FB374A539EC6A93E49F105DD'])
+
+    to_path = tmp_path / 'steam'
+    to_path.mkdir()
+
+    with patch('utils.write_full', _corrupting_write_full), pytest.raises(ExportVerificationError):
+        AstroApi.export_save_to_steam(save, TEST_DATA, str(to_path), on_progress=lambda _: None)
+
+    assert os.listdir(to_path) == []
+    assert not manifest_path.exists()
+
+
+def test_corrupted_xbox_export_is_rolled_back(tmp_path, manifest_path):
+    source = tmp_path / 'SAVE$2020.06.14-17.40.07.savegame'
+    source.write_bytes(os.urandom(1000))
+    to_path = tmp_path / 'xbox'
+
+    with patch('utils.write_full', _corrupting_write_full), pytest.raises(ExportVerificationError):
+        AstroApi.export_save_to_xbox(AstroSave('SAVE$2020.06.14-17.40.07', []), str(source), str(to_path),
+                                     on_progress=lambda _: None)
+
+    assert os.listdir(to_path) == []
+
+
+def test_export_without_verification_writes_no_manifest(tmp_path):
+    save = AstroSave('SAVE_1$2020.06.14-17.40.07', ['A178B110FB374A539EC6A93E49F105DD'])
+
+    with patch('os.getcwd', return_value=str(tmp_path)):
+        AstroApi.export_save_to_steam(save, TEST_DATA, str(tmp_path), on_progress=lambda _: None)
+
+    assert os.listdir(tmp_path) == ['SAVE_1$2020.06.14-17.40.07.savegame']
@@ -0,0 +1,65 @@
+import os
+import shutil
+import sys
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import AstroBatchScenario as Batch
+from cogs.AstroConflictPolicy import AstroConflictPolicy
+from cogs.AstroConvType import AstroConvType
+from cogs.AstroSaveContainer import AstroSaveContainer as Container
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'test_data')
+CONVERTIBLE_SAVES = ['AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAB$2020.06.18-00.01.48.savegame',
+                     'SAVE_1$2020.06.14-17.40.07.savegame']
+
+
+def _steam_folder(tmp_path):
+    steam_path = tmp_path / 'steam'
+    with patch('cogs.AstroLogging.logPrint'):
+        Batch.run_batch_conversion(AstroConvType.WIN2STEAM, TEST_DATA, str(steam_path),
+                                   2, AstroConflictPolicy.SKIP)
+    return steam_path
+
+
+def test_batch_win2steam_reports_failures(tmp_path):
+    with patch('cogs.AstroLogging.logPrint'):
+        converted, failures = Batch.run_batch_conversion(
+            AstroConvType.WIN2STEAM, TEST_DATA, str(tmp_path), 4, AstroConflictPolicy.SKIP)
+
+    # Only some chunks of test_data are available
+    assert (converted, failures) == (2, 2)
+    assert sorted(os.listdir(tmp_path)) == CONVERTIBLE_SAVES
+
+
+def test_plan_steam_export_conflicts(tmp_path):
+    (tmp_path / CONVERTIBLE_SAVES[1]).write_bytes(b'')
+
+    with patch('cogs.AstroLogging.logPrint'):
+        skipped = Batch.plan_steam_export(TEST_DATA, str(tmp_path), AstroConflictPolicy.SKIP)
+        renamed = Batch.plan_steam_export(TEST_DATA, str(tmp_path), AstroConflictPolicy.RENAME)
+        overwritten = Batch.plan_steam_export(TEST_DATA, str(tmp_path), AstroConflictPolicy.OVERWRITE)
+
+    assert len(skipped) == 3
+    assert [task.save.name for task in renamed][2] == 'SAVE11$2020.06.14-17.40.07'
+    assert [task.save.get_file_name() for task in overwritten][2] == CONVERTIBLE_SAVES[1]
+
+
+def test_batch_steam2win_overwrite(tmp_path):
+    steam_path = _steam_folder(tmp_path)
+    xbox_path = tmp_path / 'xbox'
+    shutil.copytree(TEST_DATA, xbox_path)
+
+    with patch('cogs.AstroLogging.logPrint'), patch('cogs.AstroQuiescence.wait_for_quiescence'), \
+            patch('AstroBatchScenario.os.getcwd', return_value=str(tmp_path)):
+        converted, failures = Batch.run_batch_conversion(
+            AstroConvType.STEAM2WIN, str(steam_path), str(xbox_path), 2, AstroConflictPolicy.OVERWRITE)
+
+    assert (converted, failures) == (2, 0)
+    saves = Container(str(xbox_path / 'container.32')).save_list
+    assert sorted(save.name for save in saves) == sorted(
+        ['HICKNUS$2020.07.22-21.27.17', 'SAVE_2$c2020.06.15-01.36.26'] +
+        [name[:-len('.savegame')] for name in CONVERTIBLE_SAVES])
+    # Chunks of the replaced saves are removed
+    assert not (xbox_path / 'A178B110FB374A539EC6A93E49F105DD').exists()
+    assert not (xbox_path / '3AD334FFF956470E9A432FA17EA38E5C').exists()
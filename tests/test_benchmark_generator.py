@@ -0,0 +1,41 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+from benchmarks import generator
+from cogs import AstroMicrosoftSaveFolder
+from cogs.AstroSaveContainer import AstroSaveContainer as Container
+
+
+def test_generated_folder_is_parsed_back(tmp_path):
+    folder = str(tmp_path / 'saves')
+    saves = generator.write_microsoft_save_folder(folder, save_count=5, save_size=10 * 1024 + 1,
+                                                  container_count=2, chunk_size=1024)
+
+    for container_index in (1, 2):
+        container_path = os.path.join(folder, f'container.{container_index}')
+        expected = [(save.name, save.chunks_names) for path, save in saves if path == container_path]
+        parsed = Container(container_path)
+        assert [(save.name, save.chunks_names) for save in parsed.save_list] == expected
+        assert all(len(chunks_names) == 11 for _, chunks_names in expected)
+        assert parsed.get_chunks_sizes(0) == [1024] * 10 + [1]
+
+
+def test_generated_save_converts_to_its_steam_file(tmp_path):
+    folder = str(tmp_path / 'saves')
+    (_, save), = generator.write_microsoft_save_folder(folder, 1, 5000, chunk_size=2048, seed=3)
+    steam_path = generator.write_steam_save_folder(str(tmp_path / 'steam'), 1, 5000, seed=3)[0]
+
+    target = str(tmp_path / save.get_file_name())
+    save.convert_to_steam_file(folder, target)
+
+    assert os.path.getsize(target) == 5000
+    assert os.path.basename(steam_path) == save.get_file_name()
+
+
+def test_generated_wgs_folder_is_discovered(tmp_path):
+    wgs_path = str(tmp_path / 'wgs')
+    save_folders = generator.write_wgs_folder(wgs_path, user_count=2, folders_per_user=3, save_count=2,
+                                              save_size=100)
+
+    assert sorted(AstroMicrosoftSaveFolder.get_save_folders_from_path(wgs_path)) == sorted(save_folders)
@@ -0,0 +1,71 @@
+import os
+import sys
+import tracemalloc
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import AstroApi
+from benchmarks import generator
+from cogs.AstroSave import AstroSave, XBOX_WRITE_WORKERS
+from cogs.AstroSaveContainer import AstroSaveContainer as Container
+from cogs.AstroSaveContainer import CHUNK_NAME_SIZE, encode_chunk_name
+
+# Same number of chunks as a 800 MB save, with smaller chunks
+CHUNK_SIZE = 64 * 1024
+CHUNK_COUNT = 50
+SAVE_SIZE = CHUNK_COUNT * CHUNK_SIZE - 7
+
+
+def test_encode_chunk_name_with_multi_digit_indexes():
+    encoded = encode_chunk_name('SAVE$2021.01.01-00.00.00', 123, 456)
+
+    assert Container.decode_chunk_name(encoded) == ('SAVE$2021.01.01-00.00.00', 333)
+    with pytest.raises(ValueError):
+        encode_chunk_name('A' * 40 + '$2021.01.01-00.00.00', 1, 2)
+    # A single chunk save has no suffix
+    assert len(encode_chunk_name('A' * 40 + '$2021.01.01-00.00.00', 0, 1)) <= CHUNK_NAME_SIZE
+
+
+def test_fifty_chunks_save_round_trip(tmp_path):
+    microsoft_path = str(tmp_path / 'microsoft')
+    (container_path, save), = generator.write_microsoft_save_folder(microsoft_path, 1, SAVE_SIZE,
+                                                                   chunk_size=CHUNK_SIZE)
+    assert Container(container_path).save_list[0].chunks_names == save.chunks_names
+    assert len(save.chunks_names) == CHUNK_COUNT
+
+    (tmp_path / 'steam').mkdir()
+    steam_path = AstroApi.export_save_to_steam(save, microsoft_path, str(tmp_path / 'steam'),
+                                               on_progress=lambda _: None)
+    with open(steam_path, 'rb') as steam_file:
+        content = steam_file.read()
+    assert content == b''.join(open(os.path.join(microsoft_path, chunk_name), 'rb').read()
+                               for chunk_name in save.chunks_names)
+
+    xbox_path = tmp_path / 'xbox'
+    exported = AstroSave(save.name, [])
+    tracemalloc.start()
+    try:
+        AstroApi.export_save_to_xbox(exported, steam_path, str(xbox_path), on_progress=lambda _: None,
+                                     chunk_size=CHUNK_SIZE)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # Bounded by the chunks being written, not by the save
+    assert peak < XBOX_WRITE_WORKERS * CHUNK_SIZE + 1024 * 1024
+    saves = Container(str(xbox_path / 'container.1')).save_list
+    assert [(save.name, len(save.chunks_names)) for save in saves] == [(save.name, CHUNK_COUNT)]
+    assert b''.join((xbox_path / chunk_name).read_bytes() for chunk_name in saves[0].chunks_names) == content
+
+
+def test_name_too_long_for_chunk_count(tmp_path):
+    source = tmp_path / 'save.savegame'
+    source.write_bytes(os.urandom(2 * CHUNK_SIZE))
+    save = AstroSave('A' * 40 + '$2021.01.01-00.00.00', [])
+
+    with pytest.raises(ValueError):
+        AstroApi.export_save_to_xbox(save, str(source), str(tmp_path / 'xbox'), on_progress=lambda _: None,
+                                     chunk_size=CHUNK_SIZE)
+
+    assert not (tmp_path / 'xbox').exists()
@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+# Cumulative import time of main, about 70 ms on a development machine,
+# the budget leaves room for slow or busy machines
+IMPORT_TIME_BUDGET_US = 500000
+# Imported by the code paths using them only: optional dependencies, costly
+# standard modules, and the scenarios of the batch and watch modes
+LAZY_MODULES = ('hexdump', 'winpath', 'ctypes', 'cProfile', 'hashlib', 'sqlite3', 'tarfile', 'zipfile',
+                'AstroBatchScenario', 'AstroWatchScenario')
+
+
+def _main_import_time():
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == 'main':
+            return int(fields[1])
+    raise AssertionError(f'main not found in:\n{result.stderr}')
+
+
+def _imported_modules(code):
+    """Return the modules imported by ``code`` run in a new interpreter."""
+    result = subprocess.run([sys.executable, '-c', f'{code}\nimport sys\nprint(*sys.modules)'],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    return set(result.stdout.split())
+
+
+def test_import_time_within_budget():
+    # Best of several runs, the first one may pay for cold disk caches
+    assert min(_main_import_time() for _ in range(3)) < IMPORT_TIME_BUDGET_US
+
+
+def test_optional_modules_not_imported_at_startup():
+    assert _imported_modules('import main') & set(LAZY_MODULES) == set()
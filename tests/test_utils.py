@@ -0,0 +1,99 @@
+import os
+import sys
+import threading
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import utils
+
+
+def _make_tree(folder):
+    (folder / 'sub').mkdir(parents=True)
+    contents = {
+        'container.1': os.urandom(168),
+        'A' * 32: os.urandom(utils.STREAM_BUFFER_SIZE + 3),
+        os.path.join('sub', 'B' * 32): b'',
+    }
+    for name, content in contents.items():
+        (folder / name).write_bytes(content)
+    os.utime(folder / 'container.1', (1000000000, 1000000000))
+    return contents
+
+
+def test_copy_files(tmp_path):
+    contents = _make_tree(tmp_path / 'source')
+    target = tmp_path / 'target'
+    target.mkdir()
+    (target / 'stale').write_bytes(b'')
+
+    methods = utils.copy_files(str(tmp_path / 'source'), str(target), workers=4)
+
+    assert {os.path.relpath(path, target) for path in methods} == set(contents)
+    assert set(methods.values()) <= {'reflink', 'copy_file_range', 'sendfile', 'buffered'}
+    for name, content in contents.items():
+        assert (target / name).read_bytes() == content
+    assert not (target / 'stale').exists()
+    assert (target / 'container.1').stat().st_mtime == 1000000000
+
+
+def test_copy_file_without_reflink_nor_kernel_copy(tmp_path):
+    contents = _make_tree(tmp_path / 'source')
+
+    with patch('utils._reflink', return_value=False), \
+            patch('utils._get_kernel_copy_functions', return_value=[]):
+        methods = utils.copy_files(str(tmp_path / 'source'), str(tmp_path / 'target'))
+
+    assert set(methods.values()) == {'buffered'}
+    for name, content in contents.items():
+        assert (tmp_path / 'target' / name).read_bytes() == content
+
+
+class _ProbedFile:
+    """File signalling its reads, and whose first write waits for the second read."""
+
+    def __init__(self, file, second_read):
+        self._file = file
+        self._second_read = second_read
+        self.reads = 0
+        self.overlapped = None
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def readinto(self, view):
+        self.reads += 1
+        if self.reads == 2:
+            self._second_read.set()
+        return self._file.readinto(view)
+
+    def write(self, view):
+        if self.overlapped is None:
+            self.overlapped = self._second_read.wait(5)
+        return self._file.write(view)
+
+
+def test_pipelined_copy_reads_while_writing(tmp_path):
+    content = os.urandom(3 * utils.STREAM_BUFFER_SIZE + 5)
+    (tmp_path / 'source').write_bytes(content)
+    second_read = threading.Event()
+
+    with open(tmp_path / 'source', 'rb', buffering=0) as source_file, \
+            open(tmp_path / 'target', 'wb', buffering=0) as target_file:
+        source = _ProbedFile(source_file, second_read)
+        target = _ProbedFile(target_file, second_read)
+        copied = utils.pipelined_copy([(source, None, None)], target)
+
+    assert target.overlapped
+    assert copied == len(content)
+    assert (tmp_path / 'target').read_bytes() == content
+
+
+def test_concatenate_files_read_error(tmp_path):
+    (tmp_path / 'first').write_bytes(os.urandom(utils.STREAM_BUFFER_SIZE * 2))
+
+    with patch('utils._get_kernel_copy_functions', return_value=[]), pytest.raises(FileNotFoundError):
+        utils.concatenate_files([str(tmp_path / 'first'), str(tmp_path / 'missing')], str(tmp_path / 'target'))
+
+    assert sorted(os.listdir(tmp_path)) == ['first']
@@ -0,0 +1,123 @@
+import os
+import sys
+import threading
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+import AstroApi
+from AstroWatchScenario import AstroSaveWatcher
+from benchmarks import generator
+from cogs import AstroFolderWatcher
+from cogs.AstroConflictPolicy import AstroConflictPolicy
+from cogs.AstroConvType import AstroConvType
+from cogs.AstroSaveContainer import AstroSaveContainer as Container
+
+SAVE_SIZE = 64 * 1024
+
+
+@pytest.fixture(autouse=True)
+def quiet(tmp_path):
+    with patch('cogs.AstroLogging.logPrint'), patch('cogs.AstroQuiescence.wait_for_quiescence'), \
+            patch('AstroBatchScenario.os.getcwd', return_value=str(tmp_path)):
+        yield
+
+
+def _rewrite(path, content):
+    path.write_bytes(content)
+    # Same size, a later date
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def test_watch_steam2win_converts_changed_saves_only(tmp_path):
+    steam_path = tmp_path / 'steam'
+    saves_paths = generator.write_steam_save_folder(str(steam_path), 2, SAVE_SIZE)
+    xbox_path = tmp_path / 'xbox'
+    watcher = AstroSaveWatcher(AstroConvType.STEAM2WIN, str(steam_path), str(xbox_path), 2)
+
+    assert len(watcher.convert_changes().exported) == 2
+    assert watcher.convert_changes() is None
+    save_name = os.path.basename(saves_paths[0])[:-len('.savegame')]
+    old_chunks, = [save.chunks_names for save in Container(str(xbox_path / 'container.1')).save_list
+                   if save.name == save_name]
+
+    content = os.urandom(SAVE_SIZE)
+    _rewrite(steam_path / os.path.basename(saves_paths[0]), content)
+    result = watcher.convert_changes()
+
+    assert [exported.name for exported in result.exported] == [save_name]
+    saves = {save.name: save for save in Container(str(xbox_path / 'container.1')).save_list}
+    assert len(saves) == 2
+    new_chunks = saves[result.exported[0].name].chunks_names
+    assert b''.join((xbox_path / chunk_name).read_bytes() for chunk_name in new_chunks) == content
+    assert not any((xbox_path / chunk_name).exists() for chunk_name in old_chunks)
+
+
+def test_watch_win2steam_updates_renamed_exports(tmp_path):
+    microsoft_path = tmp_path / 'microsoft'
+    (_, first_save), (_, second_save) = generator.write_microsoft_save_folder(str(microsoft_path), 2, SAVE_SIZE)
+    steam_path = tmp_path / 'steam'
+    steam_path.mkdir()
+    (steam_path / first_save.get_file_name()).write_bytes(b'kept')
+    watcher = AstroSaveWatcher(AstroConvType.WIN2STEAM, str(microsoft_path), str(steam_path),
+                               conflict_policy=AstroConflictPolicy.RENAME)
+
+    result = watcher.convert_changes()
+    renamed_path = steam_path / 'SAVE01$2021.01.01-00.00.00.savegame'
+    assert [exported.renamed_from for exported in result.exported] == [first_save.name, None]
+    assert renamed_path.exists()
+
+    # The game saves the first save to new chunks
+    updated_path = tmp_path / first_save.get_file_name()
+    updated_path.write_bytes(os.urandom(SAVE_SIZE))
+    AstroApi.export_to_xbox([str(updated_path)], str(microsoft_path), AstroConflictPolicy.OVERWRITE)
+    result = watcher.convert_changes()
+
+    assert [(exported.name, exported.renamed_from) for exported in result.exported] == \
+        [('SAVE01$2021.01.01-00.00.00', None)]
+    assert renamed_path.read_bytes() == updated_path.read_bytes()
+    assert (steam_path / first_save.get_file_name()).read_bytes() == b'kept'
+    assert sorted(os.listdir(steam_path)) == sorted([first_save.get_file_name(), second_save.get_file_name(),
+                                                     renamed_path.name])
+
+
+def test_watch_run_converts_on_change(tmp_path):
+    steam_path = tmp_path / 'steam'
+    generator.write_steam_save_folder(str(steam_path), 1, SAVE_SIZE)
+    xbox_path = tmp_path / 'xbox'
+    watcher = AstroSaveWatcher(AstroConvType.STEAM2WIN, str(steam_path), str(xbox_path))
+    stop_event = threading.Event()
+    thread = threading.Thread(target=watcher.run, args=(0.05, 'poll', 0.01, stop_event))
+    thread.start()
+    try:
+        (steam_path / 'NEW$2021.02.01-00.00.00.savegame').write_bytes(os.urandom(SAVE_SIZE))
+        for _ in range(500):
+            if (xbox_path / 'container.1').exists() and \
+                    len(Container(str(xbox_path / 'container.1')).save_list) == 2:
+                break
+            stop_event.wait(0.01)
+    finally:
+        stop_event.set()
+        thread.join()
+
+    assert sorted(save.name for save in Container(str(xbox_path / 'container.1')).save_list) == \
+        ['NEW$2021.02.01-00.00.00', generator.get_save_name(0)]
+
+
+@pytest.mark.parametrize('backend', ['poll', 'inotify'])
+def test_folder_watcher_reports_changes(tmp_path, backend):
+    try:
+        watcher = AstroFolderWatcher.create_watcher([str(tmp_path)], backend, 0.01)
+    except OSError:
+        pytest.skip('inotify not available')
+    try:
+        assert not watcher.wait_for_change(0.05)
+        (tmp_path / 'user').mkdir()
+        assert watcher.wait_for_change(1)
+        (tmp_path / 'user' / 'container.1').write_bytes(b'\x04\x00')
+        assert watcher.wait_for_change(1)
+        assert not watcher.wait_for_change(0.05)
+    finally:
+        watcher.close()
@@ -1,11 +1,47 @@
 """Miscellaneous utility helpers used across the project."""
 
 import os
+import queue
 import shutil
 import sys
-import winpath
-from io import StringIO
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from cogs import AstroProfiler
+
+STREAM_BUFFER_SIZE = 1024 * 1024  # Size of the fallback copy buffer
+KERNEL_COPY_MAX_SIZE = 1024 * 1024 * 1024  # Max bytes per kernel copy call
+PROGRESS_COPY_SIZE = 8 * 1024 * 1024  # Max bytes per kernel copy call when reporting progress
+COPY_WORKERS = 8  # Files copied at the same time by copy_files
+FICLONE = 0x40049409  # Linux ioctl sharing the data of a file with another (btrfs, XFS...)
+PIPELINE_DEPTH = 4  # Blocks a buffered copy reads ahead of the block being written
+MAX_READS = 8  # Blocks read at the same time by the buffered copies of the process
+MAX_WRITES = 8  # Blocks written at the same time by the buffered copies of the process
+# Temporary files of atomic_write, named so that no save file filter matches them
+TEMPORARY_FILE_PREFIX = '.astro-'
+TEMPORARY_FILE_SUFFIX = '.partial'
+
+_io_slots = {'read': threading.BoundedSemaphore(MAX_READS), 'write': threading.BoundedSemaphore(MAX_WRITES)}
+
+
+def configure_io(max_reads: int = MAX_READS, max_writes: int = MAX_WRITES) -> None:
+    """Limit the blocks read and written at the same time by the buffered copies from now on.
+
+    Args:
+        max_reads: Blocks read at the same time, e.g. lower for a source
+            disk slowed down by concurrent reads.
+        max_writes: Blocks written at the same time.
+
+    Raises:
+        ValueError: If a limit is lower than 1.
+    """
+    if max_reads < 1 or max_writes < 1:
+        raise ValueError(f'I/O limits must be at least 1 (reads: {max_reads}, writes: {max_writes})')
+    _io_slots['read'] = threading.BoundedSemaphore(max_reads)
+    _io_slots['write'] = threading.BoundedSemaphore(max_writes)
 
 
 def create_folder_name(prefix: str) -> str:
@@ -62,33 +98,437 @@ def join_paths(path1: str, path2: str) -> str:
     return os.path.join(path1, path2)
 
 
-def copy_files(source: str, target: str) -> None:
-    """Copy directory ``source`` to ``target``."""
+def _get_files_size(paths: Iterable[str]) -> int:
+    """Return the total size of the files of ``paths``."""
+    return sum(os.path.getsize(path) for path in paths)
+
+
+@AstroProfiler.timed('copy_files', count_bytes=_get_files_size)
+def copy_files(source: str, target: str, workers: int = COPY_WORKERS,
+               on_progress: Callable[[int], None] = None) -> Dict[str, str]:
+    """Copy directory ``source`` to ``target``, several files at a time.
+
+    Args:
+        source: Directory to copy.
+        target: Destination directory, replaced if it exists.
+        workers: Maximum number of files copied at the same time.
+        on_progress: Called with the number of bytes of each step of the copies.
+
+    Returns:
+        dict: Copy method used for each file (see ``copy_file``), by target path.
+    """
     if os.path.isdir(target):
         shutil.rmtree(target)
-    shutil.copytree(source, target)
+
+    copies = []
+    folders = []
+    for folder, _, file_names in os.walk(source):
+        target_folder = os.path.join(target, os.path.relpath(folder, source))
+        os.makedirs(target_folder, exist_ok=True)
+        folders.append((folder, target_folder))
+        copies.extend((os.path.join(folder, name), os.path.join(target_folder, name)) for name in file_names)
+
+    methods = copy_file_list(copies, workers, on_progress)
+    # Adding files changed the folders dates, they are copied last
+    for folder, target_folder in folders:
+        shutil.copystat(folder, target_folder)
+    return methods
+
+
+@AstroProfiler.timed('copy_file_list', count_bytes=_get_files_size)
+def copy_file_list(copies: List[Tuple[str, str]], workers: int = COPY_WORKERS,
+                   on_progress: Callable[[int], None] = None) -> Dict[str, str]:
+    """Copy files concurrently with ``copy_file``.
+
+    Args:
+        copies: ``(source, target)`` path of each file to copy.
+        workers: Maximum number of files copied at the same time.
+        on_progress: Called with the number of bytes of each step of the
+            copies, possibly from several threads at once.
+
+    Returns:
+        dict: Copy method used for each file, by target path.
+
+    Raises:
+        OSError: The first copy error, once every copy has ended.
+    """
+    if len(copies) <= 1 or workers <= 1:
+        return {target: copy_file(source, target, on_progress) for source, target in copies}
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(copies))) as executor:
+        futures = [(target, executor.submit(copy_file, source, target, on_progress)) for source, target in copies]
+    return {target: future.result() for target, future in futures}
+
+
+def copy_file(source: str, target: str, on_progress: Callable[[int], None] = None) -> str:
+    """Copy a file and its dates, with the fastest method the platform allows.
+
+    The data is shared with a reflink (``FICLONE``) on filesystems
+    supporting it, otherwise copied kernel-side or through a buffer (see
+    ``stream_file_into``). ``target`` only appears once complete.
+
+    Args:
+        source: Path of the file to copy.
+        target: Path of the copy, overwritten if it exists.
+        on_progress: Called with the number of bytes of each step of the copy.
+
+    Returns:
+        str: Method used: ``'reflink'``, ``'copy_file_range'``, ``'sendfile'`` or ``'buffered'``.
+    """
+    with open(source, "rb", buffering=0) as source_file, atomic_write(target) as target_file:
+        if _reflink(source_file, target_file):
+            method = "reflink"
+            if on_progress is not None:
+                on_progress(os.fstat(source_file.fileno()).st_size)
+        else:
+            method = _stream_file_into(source_file, target_file, None, on_progress)[1]
+    shutil.copystat(source, target)
+    return method
+
+
+def _reflink(source, target) -> bool:
+    """Make ``target`` share the data of ``source``, return ``False`` if not supported."""
+    if not sys.platform.startswith("linux"):
+        return False
+    import fcntl
+    try:
+        fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+    except OSError:
+        return False
+    return True
 
 
 def get_windows_desktop_path() -> str:
     """Return the current user's desktop path."""
+    # Only needed when the user picks the desktop, not worth its import at startup
+    import winpath
     return winpath.get_desktop()
 
 
+def set_console_title(title: str) -> bool:
+    """Set the title of the console window, without spawning a shell.
+
+    Returns:
+        bool: ``False`` if the platform has no console title to set.
+    """
+    if sys.platform != "win32":
+        return False
+    import ctypes
+    return bool(ctypes.windll.kernel32.SetConsoleTitleW(title))
+
+
 def rcontains(rgexp: str, string: str) -> bool:
     """Return ``True`` if ``string`` contains ``rgexp``."""
     return string.rfind(rgexp) != -1
 
 
-def write_buffer_to_file(target: str, buffer: StringIO) -> None:
-    """Write an in-memory buffer to disk."""
-    with open(target, "wb") as target_save:
-        target_save.write(buffer.getvalue())
+def is_a_temporary_file(path: str) -> bool:
+    """Return ``True`` if ``path`` is a file being written by ``atomic_write``."""
+    file_name = os.path.basename(path)
+    return file_name.startswith(TEMPORARY_FILE_PREFIX) and file_name.endswith(TEMPORARY_FILE_SUFFIX)
+
+
+@contextmanager
+def atomic_write(target: str):
+    """Open ``target`` for writing, making it appear only once complete.
+
+    Data is written to a uniquely named temporary file next to ``target``
+    (see ``is_a_temporary_file``), which replaces ``target`` when the
+    ``with`` block succeeds, and is removed if the block fails.
+
+    Args:
+        target: Path of the file to create (overwritten if it exists).
+
+    Yields:
+        Unbuffered binary file to write to.
+    """
+    temporary_target = join_paths(os.path.dirname(target),
+                                  TEMPORARY_FILE_PREFIX + os.urandom(8).hex() + TEMPORARY_FILE_SUFFIX)
+    try:
+        with open(temporary_target, "xb", buffering=0) as target_file:
+            yield target_file
+        os.replace(temporary_target, target)
+    except BaseException:
+        # Never leave a partial file behind
+        if os.path.exists(temporary_target):
+            os.remove(temporary_target)
+        raise
+
+
+def concatenate_files(sources: Iterable[str], target: str, on_progress: Callable[[int], None] = None,
+                      digests: list = None) -> int:
+    """Write the content of every file of ``sources`` one after the other
+    into ``target``, without loading them in memory.
+
+    Args:
+        sources: Paths of the files to concatenate, in order.
+        target: Path of the file to create (overwritten if it exists). It is
+            only replaced once every source has been copied.
+        on_progress: Called with the number of bytes of each step of the copy.
+        digests: One digest per source to verify the copy with, see
+            ``stream_file_into``. ``target`` is not replaced if one fails.
+
+    Returns:
+        int: Number of bytes written to ``target``.
+    """
+    sources = list(sources)
+    if digests is None:
+        digests = [None] * len(sources)
+    elif len(digests) != len(sources):
+        raise ValueError(f'{len(digests)} digests given for {len(sources)} files')
+
+    written = 0
+    with atomic_write(target) as target_file:
+        if any(digest is not None for digest in digests) or not _get_kernel_copy_functions():
+            # A single pipeline, the next file is read while the end of the current one is written
+            written = pipelined_copy(_open_segments(sources, digests), target_file, on_progress)
+        else:
+            for source in sources:
+                with open(source, "rb", buffering=0) as source_file:
+                    written += stream_file_into(source_file, target_file, None, on_progress)
+        for digest in digests:
+            if digest is not None:
+                digest.check()
+    return written
+
+
+def copy_file_slice(source: str, offset: int, length: int, target: str,
+                    on_progress: Callable[[int], None] = None, digest=None) -> int:
+    """Copy ``length`` bytes of ``source`` starting at ``offset`` into ``target``.
+
+    Each call uses its own file descriptors and buffer, so slices of the
+    same file can be copied concurrently.
+
+    Args:
+        source: Path of the file to read.
+        offset: Position of the first byte to copy.
+        length: Maximum number of bytes to copy.
+        target: Path of the file to create, replaced only once complete.
+        on_progress: Called with the number of bytes of each step of the copy.
+        digest: Digest to verify the copy with, see ``stream_file_into``.
+            ``target`` is not created if the verification fails.
+
+    Returns:
+        int: Number of bytes written to ``target``.
+    """
+    with open(source, "rb", buffering=0) as source_file, atomic_write(target) as target_file:
+        source_file.seek(offset)
+        copied = stream_file_into(source_file, target_file, length, on_progress, digest)
+        if digest is not None:
+            digest.check()
+    return copied
+
+
+def stream_file_into(source, target, length: int = None, on_progress: Callable[[int], None] = None,
+                     digest=None) -> int:
+    """Append what remains of ``source``, or its next ``length`` bytes, to ``target``.
+
+    The copy is done kernel-side with ``os.copy_file_range`` or
+    ``os.sendfile`` when the platform allows it, and falls back to a
+    ``pipelined_copy`` otherwise (a single buffer for a copy of at most one
+    block).
+
+    Args:
+        source: Unbuffered binary file opened for reading.
+        target: Unbuffered binary file opened for writing.
+        length: Maximum number of bytes to copy, everything left if ``None``.
+        on_progress: Called with the number of bytes of each step of the copy.
+        digest: If given, the copy goes through the buffer so that each block
+            is passed to ``digest.update_read`` once read and what each write
+            accepted to ``digest.update_written`` (see ``AstroVerify.AstroDigest``).
+
+    Returns:
+        int: Number of bytes copied.
+    """
+    return _stream_file_into(source, target, length, on_progress, digest)[0]
+
+
+def _stream_file_into(source, target, length: int = None,
+                      on_progress: Callable[[int], None] = None, digest=None) -> Tuple[int, str]:
+    """Implementation of ``stream_file_into``, also returning the copy method used."""
+    remaining = os.fstat(source.fileno()).st_size - source.tell()
+    if length is not None:
+        remaining = min(remaining, length)
+    copied = 0
+    method = "buffered"
+    # Smaller kernel copies when reporting progress, so that it moves regularly
+    max_copy_size = KERNEL_COPY_MAX_SIZE if on_progress is None else PROGRESS_COPY_SIZE
+
+    # Kernel copies never bring the bytes in the process, they cannot be hashed
+    kernel_copy_functions = _get_kernel_copy_functions() if digest is None else []
+    for name, kernel_copy in kernel_copy_functions:
+        try:
+            while remaining > 0:
+                len_copied = kernel_copy(source.fileno(), target.fileno(),
+                                         min(remaining, max_copy_size))
+                if len_copied == 0:
+                    break
+                copied += len_copied
+                remaining -= len_copied
+                if on_progress is not None:
+                    on_progress(len_copied)
+            method = name
+            break
+        except OSError:
+            # Not supported for these files (filesystem, platform...), the
+            # file positions are still valid so the next method can resume
+            continue
+
+    if remaining > STREAM_BUFFER_SIZE:
+        copied += pipelined_copy([(source, remaining, digest)], target, on_progress)
+        return (copied, "buffered")
+
+    buffer = bytearray(max(remaining, 0))
+    view = memoryview(buffer)
+    while remaining > 0:
+        len_read = source.readinto(view[:remaining])
+        if not len_read:
+            break
+        if digest is None:
+            write_full(target, view[:len_read])
+        else:
+            digest.update_read(view[:len_read])
+            write_full(target, view[:len_read], digest.update_written)
+        copied += len_read
+        remaining -= len_read
+        method = "buffered"
+        if on_progress is not None:
+            on_progress(len_read)
+
+    return (copied, method)
+
+
+def pipelined_copy(segments: Iterable[Tuple[object, int, object]], target,
+                   on_progress: Callable[[int], None] = None) -> int:
+    """Copy parts of files one after the other into ``target``, reading ahead of the writes.
+
+    A reader thread fills up to ``PIPELINE_DEPTH`` buffers while the calling
+    thread writes them, so that the source is read while the target is
+    written. Each read and each write also waits for one of the slots set
+    by ``configure_io``, shared by every copy of the process.
+
+    Args:
+        segments: ``(source, length, digest)`` of each part to copy, in order,
+            iterated by the reader thread. ``source`` is an unbuffered binary
+            file positioned at the first byte to copy, ``length`` the maximum
+            number of bytes to copy (``None`` for the rest of the file) and
+            ``digest`` as in ``stream_file_into``.
+        target: Unbuffered binary file opened for writing.
+        on_progress: Called with the size of each block written.
 
+    Returns:
+        int: Number of bytes copied.
 
-def append_buffer_to_file(target: str, buffer: StringIO) -> None:
-    """Append an in-memory buffer to a file."""
-    with open(target, "ab") as target_save:
-        target_save.write(buffer.getvalue())
+    Raises:
+        OSError: The first error of the reads or writes, once the reader has stopped.
+    """
+    free_views = queue.SimpleQueue()
+    for _ in range(PIPELINE_DEPTH):
+        free_views.put(memoryview(bytearray(STREAM_BUFFER_SIZE)))
+    read_blocks = queue.SimpleQueue()
+    reader = threading.Thread(target=_read_segments, args=(segments, free_views, read_blocks),
+                              name='pipeline-reader', daemon=True)
+    reader.start()
+
+    write_slots = _io_slots['write']
+    copied = 0
+    try:
+        while True:
+            block = read_blocks.get()
+            if block is None:
+                break
+            if isinstance(block, BaseException):
+                raise block
+            view, len_read, digest = block
+            with write_slots:
+                write_full(target, view[:len_read], None if digest is None else digest.update_written)
+            free_views.put(view)
+            copied += len_read
+            if on_progress is not None:
+                on_progress(len_read)
+    finally:
+        # Stops the reader early if a write failed
+        free_views.put(None)
+        reader.join()
+    return copied
+
+
+def _read_segments(segments: Iterable[Tuple[object, int, object]], free_views: queue.SimpleQueue,
+                   read_blocks: queue.SimpleQueue) -> None:
+    """Reader thread of ``pipelined_copy``.
+
+    Fills the buffers taken from ``free_views`` and queues them as
+    ``(view, len_read, digest)`` in ``read_blocks``, followed by the error
+    that stopped the reads if any, then by ``None``.
+    """
+    read_slots = _io_slots['read']
+    try:
+        for source, length, digest in segments:
+            remaining = os.fstat(source.fileno()).st_size - source.tell()
+            if length is not None:
+                remaining = min(remaining, length)
+            while remaining > 0:
+                view = free_views.get()
+                if view is None:
+                    return
+                with read_slots:
+                    len_read = source.readinto(view[:remaining])
+                if not len_read:
+                    free_views.put(view)
+                    break
+                if digest is not None:
+                    digest.update_read(view[:len_read])
+                read_blocks.put((view, len_read, digest))
+                remaining -= len_read
+    except BaseException as e:
+        read_blocks.put(e)
+    finally:
+        if hasattr(segments, 'close'):
+            # Closes the files a generator of segments has left open
+            segments.close()
+        read_blocks.put(None)
+
+
+def _open_segments(paths: List[str], digests: list) -> Iterable[Tuple[object, int, object]]:
+    """Open each file of ``paths`` in turn as a ``pipelined_copy`` segment of ``digests``."""
+    for path, digest in zip(paths, digests):
+        with open(path, "rb", buffering=0) as source_file:
+            yield (source_file, None, digest)
+
+
+def write_full(target, view: memoryview, on_written: Callable[[memoryview], None] = None) -> None:
+    """Write the whole of ``view`` to ``target``.
+
+    Unbuffered files may perform partial writes, this keeps writing until
+    every byte of ``view`` has been written.
+
+    Args:
+        target: Binary file opened for writing.
+        view: Bytes to write.
+        on_written: Called with the part of ``view`` accepted by each write.
+    """
+    total_written = 0
+    while total_written < len(view):
+        len_written = target.write(view[total_written:])
+        if on_written is not None:
+            on_written(view[total_written:total_written + len_written])
+        total_written += len_written
+
+
+def _get_kernel_copy_functions() -> list:
+    """Return the kernel-side copy functions available on this platform.
+
+    Each function is returned with its name, takes ``(source_fd, target_fd, count)``
+    and copies from the current position of both file descriptors.
+    """
+    functions = []
+    if hasattr(os, "copy_file_range"):
+        functions.append(("copy_file_range", lambda source_fd, target_fd, count:
+                          os.copy_file_range(source_fd, target_fd, count)))
+    if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+        functions.append(("sendfile", lambda source_fd, target_fd, count:
+                          os.sendfile(target_fd, source_fd, None, count)))
+    return functions
 
 
 def wait_and_exit(code: int) -> None: